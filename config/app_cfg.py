@@ -14,6 +14,13 @@ class AppCfg:
     grpc_host: str = os.getenv("YTCOMMENTS_GRPC_HOST", "0.0.0.0")
     grpc_port: int = int(os.getenv("YTCOMMENTS_GRPC_PORT", "9093"))
 
+    # "sync": grpc.server on a thread pool; "async": grpc.aio on uvloop (acouchbase reads)
+    grpc_mode: str = os.getenv("YTCOMMENTS_GRPC_MODE", "sync").strip().lower()
+    grpc_max_workers: int = int(os.getenv("YTCOMMENTS_GRPC_MAX_WORKERS", "16"))
+    # async mode: cap on in-flight RPCs (0 = unlimited) and threads for the sync write path
+    grpc_max_concurrent_rpcs: int = int(os.getenv("YTCOMMENTS_GRPC_MAX_CONCURRENT_RPCS", "0"))
+    aio_db_workers: int = int(os.getenv("YTCOMMENTS_AIO_DB_WORKERS", "64"))
+
     # TLS (disabled for MVP)
     grpc_tls_enabled: bool = _getenv_bool("YTCOMMENTS_GRPC_TLS_ENABLED", False)
     grpc_tls_cert_path: str = os.getenv("YTCOMMENTS_GRPC_TLS_CERT", "").strip()
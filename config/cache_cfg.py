@@ -0,0 +1,24 @@
+import os
+from dataclasses import dataclass
+
+from config.app_cfg import _getenv_bool
+
+
+@dataclass(frozen=True)
+class CacheCfg:
+    # In-process read-through thread cache (db/couchbase_db.py)
+    thread_enabled: bool = _getenv_bool("YTCOMMENTS_THREAD_CACHE", True)
+    thread_max_entries: int = int(os.getenv("YTCOMMENTS_THREAD_CACHE_ENTRIES", "1024"))
+    thread_max_bytes: int = int(os.getenv("YTCOMMENTS_THREAD_CACHE_BYTES", str(256 * 1024 * 1024)))
+    thread_ttl_sec: float = float(os.getenv("YTCOMMENTS_THREAD_CACHE_TTL_SEC", "300"))
+    # Serve an entry without revalidating the thread CAS for this long (0 = always revalidate)
+    thread_fresh_sec: float = float(os.getenv("YTCOMMENTS_THREAD_CACHE_FRESH_SEC", "0"))
+
+    # Serialized ListTop/ListReplies responses per video and thread version
+    response_enabled: bool = _getenv_bool("YTCOMMENTS_RESPONSE_CACHE", True)
+    response_max_videos: int = int(os.getenv("YTCOMMENTS_RESPONSE_CACHE_VIDEOS", "1024"))
+    response_max_bytes: int = int(os.getenv("YTCOMMENTS_RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+    response_max_pages: int = int(os.getenv("YTCOMMENTS_RESPONSE_CACHE_PAGES", "64"))  # per video
+
+
+cache_cfg = CacheCfg()
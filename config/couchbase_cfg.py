@@ -12,5 +12,12 @@ class CouchbaseCfg:
     collection: str = os.getenv("CB_COLLECTION", "_default")
     kv_timeout_sec: float = float(os.getenv("CB_KV_TIMEOUT_SEC", "2.5"))
 
+    # Segmented thread layout: max ids per index segment doc
+    index_seg_size: int = int(os.getenv("CB_INDEX_SEG_SIZE", "500"))
+    # Bulk reads: max keys per get_multi round
+    multi_get_fanout: int = int(os.getenv("CB_MULTI_GET_FANOUT", "128"))
+    # Bulk sub-document lookups (no multi variant in the SDK): lookups in flight at once
+    multi_lookup_workers: int = int(os.getenv("CB_MULTI_LOOKUP_WORKERS", "16"))
+
 
 cb_cfg = CouchbaseCfg()
\ No newline at end of file
@@ -0,0 +1,16 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class HotCfg:
+    # HOT sort (db/couchbase_db.py): (likes - dislikes + prior) * 2 ** (-age / half_life)
+    half_life_sec: float = float(os.getenv("YTCOMMENTS_HOT_HALF_LIFE_SEC", str(6 * 3600)))
+    prior: float = float(os.getenv("YTCOMMENTS_HOT_PRIOR", "1"))
+    # Width of one hot index bucket, in half-lives of age at equal score
+    bucket_half_lives: float = float(os.getenv("YTCOMMENTS_HOT_BUCKET_HALF_LIVES", "0.25"))
+    # Background re-ranker: how often it rebuilds hot indexes built with other parameters (0 = off)
+    rerank_interval_sec: float = float(os.getenv("YTCOMMENTS_HOT_RERANK_SEC", "30"))
+
+
+hot_cfg = HotCfg()
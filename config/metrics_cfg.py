@@ -0,0 +1,18 @@
+import os
+from dataclasses import dataclass
+
+from config.app_cfg import _getenv_bool
+
+
+@dataclass(frozen=True)
+class MetricsCfg:
+    # RPC/KV counters and latency histograms (utils/metrics_ut.py), reported by Info.All
+    enabled: bool = _getenv_bool("YTCOMMENTS_METRICS", True)
+    # Percentiles cover the last one to two windows; counts are since start
+    window_sec: float = float(os.getenv("YTCOMMENTS_METRICS_WINDOW_SEC", "60"))
+    # Prometheus text endpoint (GET /metrics); 0 = off
+    prometheus_host: str = os.getenv("YTCOMMENTS_METRICS_HOST", "0.0.0.0")
+    prometheus_port: int = int(os.getenv("YTCOMMENTS_METRICS_PORT", "0"))
+
+
+metrics_cfg = MetricsCfg()
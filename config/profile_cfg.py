@@ -0,0 +1,21 @@
+import os
+from dataclasses import dataclass
+
+from config.app_cfg import _getenv_bool
+
+
+@dataclass(frozen=True)
+class ProfileCfg:
+    # Profiling interceptor (srv/profile_interceptor.py); off unless enabled at start
+    enabled: bool = _getenv_bool("YTCOMMENTS_PROFILE", False)
+    dir: str = os.getenv("YTCOMMENTS_PROFILE_DIR", "/tmp/ytcomments-profiles").strip()
+    # Reports kept in dir; older ones are deleted
+    max_reports: int = int(os.getenv("YTCOMMENTS_PROFILE_MAX_REPORTS", "200"))
+    # Initial values; <dir>/profile.json ({"sample_rate": .., "slow_ms": ..}) overrides them at runtime
+    sample_rate: float = float(os.getenv("YTCOMMENTS_PROFILE_SAMPLE_RATE", "0"))  # fraction of RPCs under cProfile
+    slow_ms: float = float(os.getenv("YTCOMMENTS_PROFILE_SLOW_MS", "0"))  # report RPCs slower than this (0 = off)
+    # Stack sampling interval for RPCs that may turn out slow
+    stack_interval_ms: float = float(os.getenv("YTCOMMENTS_PROFILE_STACK_MS", "5"))
+
+
+profile_cfg = ProfileCfg()
@@ -0,0 +1,20 @@
+import os
+from dataclasses import dataclass
+
+from config.app_cfg import _getenv_bool
+
+
+@dataclass(frozen=True)
+class RenderCfg:
+    # Render content_html when comments are written (utils/render_ut.py); off = stored empty
+    enabled: bool = _getenv_bool("YTCOMMENTS_RENDER", True)
+    # Where @mentions link to; {name} is replaced by the mentioned handle
+    mention_url: str = os.getenv("YTCOMMENTS_RENDER_MENTION_URL", "/@{name}")
+    # Rendered html by content hash, shared by identical texts
+    cache_entries: int = int(os.getenv("YTCOMMENTS_RENDER_CACHE", "65536"))
+    cache_bytes: int = int(os.getenv("YTCOMMENTS_RENDER_CACHE_BYTES", str(32 * 1024 * 1024)))
+    # tools.rerender_comments: videos re-rendered at once
+    rerender_workers: int = int(os.getenv("YTCOMMENTS_RERENDER_WORKERS", "8"))
+
+
+render_cfg = RenderCfg()
@@ -0,0 +1,17 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class StorageCfg:
+    # Backend of the comment store (db/storage.py): "couchbase" or "sqlite"
+    backend: str = os.getenv("YTCOMMENTS_STORAGE", "couchbase").strip().lower()
+    # sqlite: database file (WAL mode; the -wal/-shm files live next to it)
+    sqlite_path: str = os.getenv("YTCOMMENTS_SQLITE_PATH", "ytcomments.db").strip()
+    # sqlite: how long a writer waits for another process holding the write lock
+    sqlite_busy_timeout_ms: int = int(os.getenv("YTCOMMENTS_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    # sqlite: synchronous pragma; NORMAL is durable across process crashes in WAL mode, FULL across power loss
+    sqlite_synchronous: str = os.getenv("YTCOMMENTS_SQLITE_SYNCHRONOUS", "NORMAL").strip().upper()
+
+
+storage_cfg = StorageCfg()
@@ -0,0 +1,13 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class WatchCfg:
+    # WatchThread: events a watcher may have queued before it is dropped as too slow
+    queue_size: int = int(os.getenv("YTCOMMENTS_WATCH_QUEUE", "256"))
+    # Heartbeat on idle streams (0 = none)
+    heartbeat_sec: float = float(os.getenv("YTCOMMENTS_WATCH_HEARTBEAT_SEC", "30"))
+
+
+watch_cfg = WatchCfg()
@@ -0,0 +1,33 @@
+import os
+from dataclasses import dataclass
+
+from config.app_cfg import _getenv_bool
+
+
+@dataclass(frozen=True)
+class WriteCfg:
+    # Group commit of creates/edits/votes per video (db/couchbase_db.py)
+    coalesce_enabled: bool = _getenv_bool("YTCOMMENTS_WRITE_COALESCE", True)
+    # How long a batch leader waits for more writes to the same video
+    coalesce_window_ms: float = float(os.getenv("YTCOMMENTS_WRITE_COALESCE_WINDOW_MS", "2"))
+    coalesce_max_batch: int = int(os.getenv("YTCOMMENTS_WRITE_COALESCE_MAX_BATCH", "64"))
+
+    # CreateCommentRequest.idempotency_key: how long keys are remembered (idem:: doc TTL)
+    idempotency_ttl_sec: float = float(os.getenv("YTCOMMENTS_IDEMPOTENCY_TTL_SEC", "86400"))
+    idempotency_cache_entries: int = int(os.getenv("YTCOMMENTS_IDEMPOTENCY_CACHE", "65536"))
+    # A retry waits this long for the first request with its key to finish
+    idempotency_wait_sec: float = float(os.getenv("YTCOMMENTS_IDEMPOTENCY_WAIT_SEC", "5"))
+    # A key still pending after this long is taken over (its first request died)
+    idempotency_stale_sec: float = float(os.getenv("YTCOMMENTS_IDEMPOTENCY_STALE_SEC", "60"))
+
+    # CAS read-modify-write retries: capped exponential backoff with full jitter
+    cas_max_attempts: int = int(os.getenv("YTCOMMENTS_CAS_RETRIES", "30"))
+    cas_backoff_ms: float = float(os.getenv("YTCOMMENTS_CAS_BACKOFF_MS", "2"))
+    cas_backoff_max_ms: float = float(os.getenv("YTCOMMENTS_CAS_BACKOFF_MAX_MS", "100"))
+    # Give up after this long even without a request deadline (0 = attempts only)
+    cas_budget_sec: float = float(os.getenv("YTCOMMENTS_CAS_BUDGET_SEC", "5"))
+    # Per-video contention counters kept (most recently contended videos)
+    cas_contention_videos: int = int(os.getenv("YTCOMMENTS_CAS_CONTENTION_VIDEOS", "1024"))
+
+
+write_cfg = WriteCfg()
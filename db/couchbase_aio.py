@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, AsyncIterator, Optional
+
+from config.app_cfg import app_cfg
+from config.couchbase_cfg import cb_cfg
+from config.metrics_cfg import metrics_cfg
+from config.profile_cfg import profile_cfg
+from db import couchbase_db as cdb
+from utils.pubsub_ut import Subscription
+
+log = logging.getLogger("cb_aio")
+
+try:
+    import couchbase.subdocument as SD
+    from acouchbase.cluster import Cluster
+    from couchbase.auth import PasswordAuthenticator
+    from couchbase.options import ClusterOptions, ClusterTimeoutOptions
+    from couchbase.exceptions import (
+        CouchbaseException,
+        DocumentNotFoundException,
+    )
+except Exception as e:  # pragma: no cover
+    raise RuntimeError(
+        "Couchbase async SDK (acouchbase) is not available. "
+        "You must run this service on Python 3.10 with couchbase SDK installed."
+    ) from e
+
+
+# ---------------------------
+# Async mode (grpc.aio): read RPCs run db.couchbase_db's read steps on
+# acouchbase, sharing its thread cache. Writes keep the synchronous
+# implementation (group commit, migrations) and run on a bounded thread pool,
+# so the event loop never blocks on them.
+# ---------------------------
+
+@dataclass
+class AsyncCouchbaseCtx:
+    cluster: Any
+    bucket: Any
+    scope: Any
+    coll: Any
+
+
+_ctx: Optional[AsyncCouchbaseCtx] = None
+_connect_lock: Optional[asyncio.Lock] = None
+
+_db_pool = ThreadPoolExecutor(max_workers=max(int(app_cfg.aio_db_workers or 0), 1), thread_name_prefix="db")
+_db_jobs = cdb.metrics.gauge("executor.in_flight", pool="db")  # submitted by _in_pool, not finished yet
+
+
+async def connect() -> AsyncCouchbaseCtx:
+    global _ctx, _connect_lock
+    if _ctx is not None:
+        return _ctx
+    if _connect_lock is None:
+        _connect_lock = asyncio.Lock()
+
+    async with _connect_lock:
+        if _ctx is not None:
+            return _ctx
+
+        auth = PasswordAuthenticator(cb_cfg.username, cb_cfg.password)
+        opts = ClusterOptions(
+            auth,
+            timeout_options=ClusterTimeoutOptions(
+                kv_timeout=timedelta(seconds=float(cb_cfg.kv_timeout_sec)),
+            ),
+        )
+        if profile_cfg.enabled:
+            opts["transcoder"] = cdb.TracedTranscoder()
+        cluster = await Cluster.connect(cb_cfg.connstr, opts)
+        bucket = cluster.bucket(cb_cfg.bucket)
+        await bucket.on_connect()
+        scope = bucket.scope(cb_cfg.scope)
+        coll = scope.collection(cb_cfg.collection)
+        if metrics_cfg.enabled or profile_cfg.enabled:
+            coll = cdb.MeteredCollection(coll, is_async=True)
+
+        _ctx = AsyncCouchbaseCtx(cluster=cluster, bucket=bucket, scope=scope, coll=coll)
+        log.info(
+            "connected (async): connstr=%s bucket=%s scope=%s collection=%s",
+            cb_cfg.connstr,
+            cb_cfg.bucket,
+            cb_cfg.scope,
+            cb_cfg.collection,
+        )
+        return _ctx
+
+
+async def ping() -> bool:
+    try:
+        ctx = await connect()
+        await ctx.bucket.ping()
+        return True
+    except CouchbaseException as e:
+        log.error("ping failed: %s", e)
+        return False
+
+
+async def _in_pool(fn, *args, **kwargs) -> Any:
+    """Run fn on the db pool in a copy of the caller's context (its retry deadline included)."""
+    ctx = contextvars.copy_context()
+    fut = _db_pool.submit(ctx.run, functools.partial(fn, *args, **kwargs))
+    _db_jobs.inc()
+    fut.add_done_callback(lambda _: _db_jobs.dec())  # also when cancelled before it started
+    return await asyncio.wrap_future(fut)
+
+
+async def _get_many(keys: list[str], strict: bool = True) -> dict[str, dict]:
+    """Concurrent gets, at most cb_cfg.multi_get_fanout in flight; see couchbase_db.GetDocs."""
+    if not keys:
+        return {}
+    ctx = await connect()
+    sem = asyncio.Semaphore(max(int(cb_cfg.multi_get_fanout or 0), 1))
+
+    async def one(key: str) -> Optional[dict]:
+        async with sem:
+            try:
+                res = await ctx.coll.get(key)
+            except DocumentNotFoundException:
+                return None
+            except CouchbaseException:
+                if strict:
+                    raise
+                return None
+            return res.content_as[dict]
+
+    docs = await asyncio.gather(*(one(k) for k in keys))
+    return {k: d for k, d in zip(keys, docs) if d is not None}
+
+
+async def _lookup_many(keys: list[str], paths: tuple[str, ...]) -> list[Optional[tuple[int, list]]]:
+    """Concurrent sub-document gets, at most cb_cfg.multi_lookup_workers in flight; see couchbase_db.LookupIn."""
+    ctx = await connect()
+    sem = asyncio.Semaphore(max(int(cb_cfg.multi_lookup_workers or 0), 1))
+
+    async def one(key: str) -> Optional[tuple[int, list]]:
+        async with sem:
+            try:
+                res = await ctx.coll.lookup_in(key, [SD.get(p) for p in paths])
+            except DocumentNotFoundException:
+                return None
+            return res.cas, cdb.lookup_values(res, len(paths))
+
+    return list(await asyncio.gather(*(one(k) for k in keys)))
+
+
+async def _read(req: Any) -> Any:
+    if isinstance(req, cdb.GetDocs):
+        return await _get_many(req.keys, req.strict)
+    if isinstance(req, cdb.GetDoc):
+        ctx = await connect()
+        try:
+            res = await ctx.coll.get(req.key)
+        except DocumentNotFoundException:
+            return None
+        return res.content_as[dict], res.cas
+    if isinstance(req, cdb.LookupIn):
+        return await _lookup_many(req.keys, req.paths)
+    return await _in_pool(req.fn, *req.args)
+
+
+async def run_reads(steps: cdb.Reads) -> Any:
+    """couchbase_db.run_reads() on acouchbase: the same read steps, awaited."""
+    res: Any = None
+    while True:
+        try:
+            req = steps.send(res)
+        except StopIteration as stop:
+            return stop.value
+        res = await _read(req)
+
+
+async def iter_reads(steps: cdb.Reads) -> AsyncIterator[list]:
+    """couchbase_db.iter_reads() on acouchbase."""
+    res: Any = None
+    while True:
+        try:
+            req = steps.send(res)
+        except StopIteration:
+            return
+        if isinstance(req, cdb.Emit):
+            res = None
+            yield req.items
+        else:
+            res = await _read(req)
+
+
+# ---------------------------
+# Reads: couchbase_db's read steps (thread cache included)
+# ---------------------------
+
+async def list_top(
+    video_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    ver: Optional[int] = None,
+) -> tuple[list[dict], str, int]:
+    return await run_reads(cdb.list_top_reads(video_id, page_size, page_token, newest_first, include_deleted, rank, ver))
+
+
+async def list_replies(
+    video_id: str,
+    parent_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    ver: Optional[int] = None,
+) -> tuple[list[dict], str, int]:
+    return await run_reads(cdb.list_replies_reads(
+        video_id, parent_id, page_size, page_token, newest_first, include_deleted, rank, ver,
+    ))
+
+
+async def list_top_with_replies(
+    video_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    replies_per_comment: int = 3,
+    reply_newest_first: bool = False,
+    reply_rank: str = "",
+    user_uid: str = "",
+) -> tuple[list[tuple[dict, list[dict], str, int]], str, int, dict[str, int]]:
+    return await run_reads(cdb.list_top_with_replies_reads(
+        video_id, page_size, page_token, newest_first, include_deleted, rank,
+        replies_per_comment, reply_newest_first, reply_rank, user_uid,
+    ))
+
+
+def export_thread(video_id: str, include_deleted: bool, chunk_size: int = 500) -> AsyncIterator[list[dict]]:
+    return iter_reads(cdb.export_thread_reads(video_id, include_deleted, chunk_size))
+
+
+def watch_thread(video_id: str) -> Subscription:
+    """Subscribe to a video's events, read with aget() on the running loop."""
+    return cdb.watch_thread(video_id, asyncio.get_running_loop())
+
+
+async def thread_version(video_id: str) -> int:
+    return await run_reads(cdb.thread_version_reads(video_id))
+
+
+async def get_counts(video_id: str) -> tuple[int, int]:
+    return await run_reads(cdb.get_counts_reads(video_id))
+
+
+async def batch_get_counts(video_ids: list[str]) -> dict[str, tuple[int, int]]:
+    return await run_reads(cdb.batch_get_counts_reads(video_ids))
+
+
+async def get_my_votes(video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+    return await run_reads(cdb.get_my_votes_reads(video_id, user_uid, comment_ids))
+
+
+# ---------------------------
+# Writes: the sync implementation on the db pool
+# ---------------------------
+
+async def create_comment(
+    video_id: str,
+    parent_id: str,
+    comment_id: str,
+    content_raw: str,
+    user_uid: str,
+    username: str,
+    channel_id: str,
+    idempotency_key: str = "",
+) -> dict:
+    return await _in_pool(
+        cdb.create_comment, video_id, parent_id, comment_id, content_raw, user_uid, username, channel_id, idempotency_key
+    )
+
+
+async def edit_comment(video_id: str, comment_id: str, content_raw: str) -> dict:
+    return await _in_pool(cdb.edit_comment, video_id, comment_id, content_raw)
+
+
+async def delete_comment(video_id: str, comment_id: str, hard_delete: bool) -> dict:
+    return await _in_pool(cdb.delete_comment, video_id, comment_id, hard_delete)
+
+
+async def restore_comment(video_id: str, comment_id: str) -> dict:
+    return await _in_pool(cdb.restore_comment, video_id, comment_id)
+
+
+async def apply_vote(video_id: str, user_uid: str, comment_id: str, vote: int) -> tuple[int, int, int]:
+    return await _in_pool(cdb.apply_vote, video_id, user_uid, comment_id, vote)
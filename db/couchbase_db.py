@@ -1,23 +1,52 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+import threading
 import time
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import timedelta
-from typing import Any, Optional
+from typing import Any, Callable, Generator, Iterator, Optional, Union
 
+from config.cache_cfg import cache_cfg
 from config.couchbase_cfg import cb_cfg
+from config.hot_cfg import hot_cfg
+from config.metrics_cfg import metrics_cfg
+from config.profile_cfg import profile_cfg
+from config.watch_cfg import watch_cfg
+from config.write_cfg import write_cfg
+from db.storage import RANK_HOT, RANK_TOP, Storage
+from srv.response_cache import drop_responses
+from utils.coalesce_ut import Coalescer
+from utils.events_ut import EVENT_CREATED, EVENT_DELETED, EVENT_EDITED, EVENT_RESTORED, EVENT_VOTED
+from utils.events_ut import thread_event as _event
+from utils.hot_ut import HOT_SCALE as _HOT_SCALE
+from utils.hot_ut import hot_params, hot_value as _hot_value
+from utils.lru_ut import LruCache
+from utils.metrics_ut import SIZE_BYTES_BOUNDS, metrics
+from utils.page_token_ut import PageCursor, decode_page_token, encode_cursor
+from utils.profile_ut import current_trace, traced, traced_steps
+from utils.pubsub_ut import Hub, LocalBroker, Subscription
+from utils.render_ut import RENDERER_VERSION, render_content
+from utils.retry_ut import ContentionCounters, RetryPolicy
 
 log = logging.getLogger("cb_db")
 
 try:
+    import couchbase.subdocument as SD
     from couchbase.cluster import Cluster
     from couchbase.auth import PasswordAuthenticator
-    from couchbase.options import ClusterOptions, ClusterTimeoutOptions
+    from couchbase.options import ClusterOptions, ClusterTimeoutOptions, MutateInOptions, QueryOptions
+    from couchbase.transcoder import JSONTranscoder
     from couchbase.exceptions import (
         CouchbaseException,
         DocumentNotFoundException,
+        DocumentExistsException,
         CasMismatchException,
+        PathExistsException,
+        PathNotFoundException,
     )
 except Exception as e:  # pragma: no cover
     raise RuntimeError(
@@ -36,6 +65,101 @@ class CouchbaseCtx:
 
 _ctx: Optional[CouchbaseCtx] = None
 
+# Thread meta doc size, observed on every full read of it
+_thread_doc_bytes = metrics.histogram("thread.doc_bytes", SIZE_BYTES_BOUNDS)
+
+# Collection methods counted and timed as kv.ops/kv.errors/kv.latency_ms{op=...}
+_KV_OPS = frozenset({
+    "get", "get_multi", "insert", "insert_multi", "upsert", "upsert_multi", "replace",
+    "remove", "remove_multi", "touch", "exists", "lookup_in", "mutate_in",
+})
+
+
+def _kv_meter(name: str):
+    """Recorder of one KV op's latency and outcome: done(seconds, exception or None)."""
+    ops = metrics.counter("kv.ops", op=name)
+    hist = metrics.histogram("kv.latency_ms", op=name)
+    phase = "kv." + name
+
+    def done(dt: float, exc: Optional[BaseException]) -> None:
+        if exc is not None:
+            metrics.counter("kv.errors", op=name, error=type(exc).__name__).inc()
+        ops.inc()
+        hist.observe(dt * 1000.0)
+        tr = current_trace()
+        if tr is not None:
+            tr.add(phase, dt)
+
+    return done
+
+
+class MeteredCollection:
+    """
+    Collection proxy recording each KV operation's count, errors and latency,
+    and its time as phase kv.<op> of a profiled RPC (utils/profile_ut.py).
+    is_async: the collection is an acouchbase one (coroutine methods).
+    """
+
+    def __init__(self, coll: Any, is_async: bool = False):
+        self._coll = coll
+        self._async = is_async
+
+    def __getattr__(self, name: str) -> Any:
+        fn = getattr(self._coll, name)
+        if name not in _KV_OPS:
+            return fn
+        done = _kv_meter(name)
+
+        if self._async:
+            async def call(*args: Any, **kwargs: Any) -> Any:
+                t0 = time.perf_counter()
+                exc = None
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    exc = e
+                    raise
+                finally:
+                    done(time.perf_counter() - t0, exc)
+        else:
+            def call(*args: Any, **kwargs: Any) -> Any:
+                t0 = time.perf_counter()
+                exc = None
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    exc = e
+                    raise
+                finally:
+                    done(time.perf_counter() - t0, exc)
+
+        setattr(self, name, call)  # later lookups skip __getattr__
+        return call
+
+
+class TracedTranscoder(JSONTranscoder):
+    """JSONTranscoder timing (de)serialization as phases json.encode/json.decode of a profiled RPC."""
+
+    def encode_value(self, value: Any) -> Any:
+        tr = current_trace()
+        if tr is None:
+            return super().encode_value(value)
+        t0 = time.perf_counter()
+        try:
+            return super().encode_value(value)
+        finally:
+            tr.add("json.encode", time.perf_counter() - t0)
+
+    def decode_value(self, value: Any, flags: int) -> Any:
+        tr = current_trace()
+        if tr is None:
+            return super().decode_value(value, flags)
+        t0 = time.perf_counter()
+        try:
+            return super().decode_value(value, flags)
+        finally:
+            tr.add("json.decode", time.perf_counter() - t0)
+
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
@@ -62,6 +186,8 @@ def connect() -> CouchbaseCtx:
             kv_timeout=timedelta(seconds=float(cb_cfg.kv_timeout_sec)),
         ),
     )
+    if profile_cfg.enabled:
+        opts["transcoder"] = TracedTranscoder()
 
     cluster = Cluster(cb_cfg.connstr, opts)
 
@@ -73,6 +199,8 @@ def connect() -> CouchbaseCtx:
     bucket = cluster.bucket(cb_cfg.bucket)
     scope = bucket.scope(cb_cfg.scope)
     coll = scope.collection(cb_cfg.collection)
+    if metrics_cfg.enabled or profile_cfg.enabled:
+        coll = MeteredCollection(coll)
 
     _ctx = CouchbaseCtx(cluster=cluster, bucket=bucket, scope=scope, coll=coll)
     log.info(
@@ -96,381 +224,3040 @@ def ping() -> bool:
 
 
 # ---------------------------
-# Thread: one doc per video
+# Thread layout (v2):
+#   thread::{video}                - small meta doc: counts, next_seq, top index heads
+#   comment::{video}::{comment}    - one doc per comment (+ heads of its replies indexes)
+#   cidx::{video}::{key}::{n}      - index segment: [seq, comment_id] in creation order
+#   lidx::{video}::{key}::{n}      - live index segment: same, without deleted comments
+#   ridx::{video}::{key}::{bucket} - ranked index bucket: {comment_id: [score, seq, ver]}
+#   hidx::{video}::top::{bucket}   - hot index bucket: same, value decayed by age
+#   idem::{video}::{hash}          - create idempotency key -> comment id, with a TTL
+# An index head is a slot counter ("top_len"/"reply_len") plus per-segment counters
+# {"<n>": {"n": ids, "del": soft-deleted}}. Slot p lives in segment p // seg_size
+# of both indexes, so writers allocate with one counter op and readers locate a
+# page without reading the segments before it. Live counts ("counts.top_live",
+# "reply_live") make total_count O(1). Regular writes are sub-document mutations;
+# only soft delete/restore rewrite a live segment (CAS).
+# The ranked indexes ("rank_segs"/"hot_segs" heads) order by likes - dislikes,
+# plain or decayed by age, see below.
+# Legacy v1 threads (everything in thread::{video}) are migrated on first access.
 # ---------------------------
 
+THREAD_LAYOUT = 2
+
+
 def thread_doc_id(video_id: str) -> str:
     return f"thread::{video_id}"
 
 
+def comment_doc_id(video_id: str, comment_id: str) -> str:
+    return f"comment::{video_id}::{comment_id}"
+
+
+def index_seg_doc_id(video_id: str, parent_id: str, seg: int) -> str:
+    return f"cidx::{video_id}::{parent_id or 'top'}::{int(seg)}"
+
+
+def live_seg_doc_id(video_id: str, parent_id: str, seg: int) -> str:
+    return f"lidx::{video_id}::{parent_id or 'top'}::{int(seg)}"
+
+
+def rank_seg_doc_id(video_id: str, parent_id: str, key: str, rank: str = "top") -> str:
+    return f"{'hidx' if rank == 'hot' else 'ridx'}::{video_id}::{parent_id or 'top'}::{key}"
+
+
+def _seg_doc_id(video_id: str, parent_id: str, seg: int, live: bool) -> str:
+    return live_seg_doc_id(video_id, parent_id, seg) if live else index_seg_doc_id(video_id, parent_id, seg)
+
+
 def vote_doc_id(video_id: str, comment_id: str, user_uid: str) -> str:
     return f"cvote::{video_id}::{comment_id}::{user_uid}"
 
 
+def vote_digest_doc_id(video_id: str, user_uid: str) -> str:
+    return f"uvotes::{video_id}::{user_uid}"
+
+
+def counts_doc_id(video_id: str) -> str:
+    return f"ccount::{video_id}"
+
+
+def idem_doc_id(video_id: str, user_uid: str, key: str) -> str:
+    h = hashlib.sha1(f"{user_uid}\0{key}".encode("utf-8")).hexdigest()
+    return f"idem::{video_id}::{h}"
+
+
+def _seg_size() -> int:
+    return max(int(cb_cfg.index_seg_size or 0), 1)
+
+
 def _empty_thread(video_id: str) -> dict:
     now = _now_ms()
     return {
         "type": "comment_thread",
+        "layout": THREAD_LAYOUT,
         "video_id": video_id,
         "created_at": now,
         "updated_at": now,
+        "ver": 0,                # bumped by every write to the thread's docs
         "next_seq": 1,
-        "comments": {},          # comment_id -> comment object
-        "top_index": [],         # list[comment_id] (creation order)
-        "replies_index": {},     # parent_id -> list[comment_id] (creation order)
-        "counts": {"total": 0, "top": 0},
+        "counts": {"total": 0, "top": 0, "top_live": 0},
+        "top_len": 0,            # slots allocated in the top-level index
+        "top_segs": {},          # index head of top-level comments
+        "rank_segs": {},         # ranked index head of top-level comments
+        "hot_segs": {},          # hot index head
+        "hot_gen": 0,            # hot index generation (bucket key chunk)
+        "hot_cfg": _hot_params(),  # decay parameters the hot index was built with
+        "vote_digests": True,    # every vote of the video is in uvotes:: digests too
+    }
+
+
+def _empty_segment(video_id: str, parent_id: str, seg: int, live: bool = False) -> dict:
+    if live:
+        return {
+            "type": "comment_live_seg",
+            "video_id": video_id,
+            "parent_id": parent_id,
+            "seg": int(seg),
+            "items": [],         # list[[seq, comment_id]], live comments only
+        }
+    return {
+        "type": "comment_index_seg",
+        "video_id": video_id,
+        "parent_id": parent_id,
+        "seg": int(seg),
+        "items": [],             # list[[seq, comment_id]]
+        "del": {},               # comment_id -> True for soft-deleted
+        "gone": {},              # comment_id -> True for hard-deleted
+    }
+
+
+def _empty_rank_seg(video_id: str, parent_id: str, key: str) -> dict:
+    return {
+        "type": "comment_rank_seg",
+        "video_id": video_id,
+        "parent_id": parent_id,
+        "key": key,
+        "items": {},             # comment_id -> [score, seq, rank version]
+        "del": {},               # comment_id -> True for soft-deleted
+        "moved": {},             # comment_id -> rank version it left this bucket at
     }
 
 
+_MAX_SPECS = 16  # sub-document ops per mutate_in
+
+
+def _counter(path: str, delta: int):
+    if delta >= 0:
+        return SD.increment(path, delta, create_parents=True)
+    return SD.decrement(path, -delta, create_parents=True)
+
+
 def _get_or_create_thread(video_id: str) -> tuple[dict, int]:
     ctx = connect()
     did = thread_doc_id(video_id)
     try:
         res = ctx.coll.get(did)
-        return res.content_as[dict], res.cas
     except DocumentNotFoundException:
-        ctx.coll.upsert(did, _empty_thread(video_id))
+        try:
+            ctx.coll.insert(did, _empty_thread(video_id))
+        except DocumentExistsException:
+            pass
         res = ctx.coll.get(did)
-        return res.content_as[dict], res.cas
+    doc = res.content_as[dict]
+    if int(doc.get("layout", 1) or 1) < THREAD_LAYOUT:
+        return migrate_thread(video_id)
+    if metrics_cfg.enabled:
+        _thread_doc_bytes.observe(_doc_size(doc))
+    return doc, res.cas
 
 
 def _replace_thread(video_id: str, doc: dict, cas: int) -> int:
     ctx = connect()
     did = thread_doc_id(video_id)
     doc["updated_at"] = _now_ms()
+    doc["ver"] = int(doc.get("ver", 0) or 0) + 1
     res = ctx.coll.replace(did, doc, cas=cas)
+    _advance_cache(video_id, doc["ver"], res.cas, meta=doc)
     return res.cas
 
 
-def _retry_cas(op, retries: int = 30):
-    last = None
-    for _ in range(retries):
-        try:
-            return op()
-        except CasMismatchException as e:
-            last = e
-            continue
-    raise last or RuntimeError("CAS retry exhausted")
+def _mutate_thread(
+    video_id: str,
+    deltas: Optional[dict[str, int]] = None,
+    docs: Optional[dict] = None,
+    patches: Optional[dict] = None,
+    sets: Optional[dict] = None,
+) -> dict[str, int]:
+    """
+    Apply counter deltas (and plain field sets) to the thread doc and bump its
+    version in one sub-document mutation; returns the new counter values by path.
+    Writes call this after their comment/segment mutations, so other
+    processes' caches see a new CAS only once those docs are in place.
+    docs/patches describe those mutations for this process' cache entry.
+    """
+    paths = [p for p, d in (deltas or {}).items() if d]
+    vals: dict[str, int] = {}
+    # counters that do not fit next to the version bump go first
+    room = max(_MAX_SPECS - 2 - len(sets or {}), 0)
+    while paths and len(paths) > room:
+        part, paths = paths[:_MAX_SPECS], paths[_MAX_SPECS:]
+        res = connect().coll.mutate_in(thread_doc_id(video_id), [_counter(p, deltas[p]) for p in part])
+        vals.update({p: int(res.content_as[int](i)) for i, p in enumerate(part)})
 
+    now = _now_ms()
+    specs = [_counter(p, deltas[p]) for p in paths]
+    specs += [SD.increment("ver", 1), SD.upsert("updated_at", now)]
+    specs += [SD.upsert(p, v) for p, v in (sets or {}).items()]
+    res = connect().coll.mutate_in(thread_doc_id(video_id), specs)
+
+    vals.update({p: int(res.content_as[int](i)) for i, p in enumerate(paths)})
+    ver = int(res.content_as[int](len(paths)))
+    _advance_cache(
+        video_id,
+        ver,
+        res.cas,
+        meta_patch=dict(sets or {}, **vals, ver=ver, updated_at=now),
+        docs=docs,
+        patches=patches,
+    )
+    return vals
 
-def _parse_offset(page_token: str) -> int:
-    if not page_token:
-        return 0
-    try:
-        return max(int(page_token), 0)
-    except Exception:
-        return 0
 
+def _ensure_thread(video_id: str) -> None:
+    """Writers: make sure the thread doc exists in the current layout before mutating around it."""
+    if _thread_cache.peek(video_id) is None:
+        _thread_entry(video_id)
 
-def _sorted_ids(ids: list[str], newest_first: bool) -> list[str]:
-    if not newest_first:
-        return ids
-    return list(reversed(ids))
 
+_cas_contention = ContentionCounters(write_cfg.cas_contention_videos)
+_cas_policy = RetryPolicy(
+    max_attempts=write_cfg.cas_max_attempts,
+    base_delay_sec=write_cfg.cas_backoff_ms / 1000.0,
+    max_delay_sec=write_cfg.cas_backoff_max_ms / 1000.0,
+    budget_sec=write_cfg.cas_budget_sec,
+    counters=_cas_contention,
+)
 
-def create_comment(
-    video_id: str,
-    parent_id: str,
-    comment_id: str,
-    content_raw: str,
-    user_uid: str,
-    username: str,
-    channel_id: str,
-) -> dict:
-    parent_id = parent_id or ""
 
-    def op():
-        thread, cas = _get_or_create_thread(video_id)
+def _retry_cas(op, video_id: str):
+    """
+    Run a CAS read-modify-write of one of the video's docs until it does not
+    conflict, backing off between attempts (see RetryPolicy). Raises
+    RetryExhausted when the doc stays contended or the request deadline nears.
+    """
+    return _cas_policy.run(op, (CasMismatchException, DocumentExistsException), video_id)
 
-        if parent_id and parent_id not in thread["comments"]:
-            raise KeyError("parent_not_found")
 
-        now = _now_ms()
-        seq = int(thread.get("next_seq", 1) or 1)
-        thread["next_seq"] = seq + 1
+def cas_contention_stats() -> dict[str, float]:
+    return _cas_contention.totals()
 
-        c = {
-            "id": comment_id,
-            "video_id": video_id,
-            "parent_id": parent_id,
-            "content_raw": content_raw or "",
-            "content_html": "",
-            "is_deleted": False,
-            "edited": False,
-            "created_at": now,
-            "updated_at": now,
-            "user_uid": user_uid or "",
-            "username": username or "",
-            "channel_id": channel_id or "",
-            "reply_count": 0,
-            "seq": seq,
-            # votes counters
-            "likes": 0,
-            "dislikes": 0,
-        }
 
-        thread["comments"][comment_id] = c
+def contended_threads(n: int = 10) -> list[tuple[str, dict[str, float]]]:
+    """The n videos with the most CAS conflicts lately: [(video_id, counters)]."""
+    return _cas_contention.top(n)
+
 
-        if not parent_id:
-            thread["top_index"].append(comment_id)
-            thread["counts"]["top"] = int(thread["counts"].get("top", 0) or 0) + 1
+def _write_many(docs: dict[str, dict], chunk: int = 500, insert: bool = False) -> None:
+    ctx = connect()
+    keys = list(docs)
+    for i in range(0, len(keys), chunk):
+        part = {k: docs[k] for k in keys[i:i + chunk]}
+        if insert:
+            res = ctx.coll.insert_multi(part, return_exceptions=True)
         else:
-            arr = thread["replies_index"].setdefault(parent_id, [])
-            arr.append(comment_id)
-            thread["comments"][parent_id]["reply_count"] = int(thread["comments"][parent_id].get("reply_count", 0) or 0) + 1
+            res = ctx.coll.upsert_multi(part, return_exceptions=True)
+        if not res.all_ok:
+            raise next(iter(res.exceptions.values()))
 
-        thread["counts"]["total"] = int(thread["counts"].get("total", 0) or 0) + 1
 
-        _replace_thread(video_id, thread, cas)
-        return c
+def _get_many(keys: list[str], strict: bool = True) -> dict[str, dict]:
+    """
+    Bulk get, at most cb_cfg.multi_get_fanout keys in flight per round.
+    Missing keys are left out; other failures raise (strict) or are left out too.
+    """
+    ctx = connect()
+    fanout = max(int(cb_cfg.multi_get_fanout or 0), 1)
+    out: dict[str, dict] = {}
+    for i in range(0, len(keys), fanout):
+        res = ctx.coll.get_multi(keys[i:i + fanout], return_exceptions=True)
+        if strict:
+            for exc in res.exceptions.values():
+                if not isinstance(exc, DocumentNotFoundException):
+                    raise exc
+        for k, r in res.results.items():
+            out[k] = r.content_as[dict]
+    return out
 
-    return _retry_cas(op)
 
 
-def list_top(video_id: str, page_size: int, page_token: str, newest_first: bool, include_deleted: bool) -> tuple[list[dict], str, int]:
-    thread, _ = _get_or_create_thread(video_id)
-    ids = _sorted_ids(list(thread.get("top_index", []) or []), newest_first)
+# ---------------------------
+# Read steps. The read path (thread cache, page planning, counts, votes) is
+# written once, as generators that yield the KV reads they need and get the
+# results sent back; run_reads() performs the reads with the blocking SDK,
+# db/couchbase_aio.py's run_reads() with acouchbase. Only the I/O differs
+# between the two modes, so their caching cannot drift apart.
+# ---------------------------
 
-    if not include_deleted:
-        ids = [cid for cid in ids if not bool(thread["comments"].get(cid, {}).get("is_deleted", False))]
+class GetDocs:
+    """Bulk get of `keys`: {key: doc} of those that exist (see _get_many)."""
 
-    total = len(ids)
-    off = _parse_offset(page_token)
-    slice_ids = ids[off: off + page_size]
-    items = [thread["comments"][cid] for cid in slice_ids if cid in thread["comments"]]
+    __slots__ = ("keys", "strict")
 
-    next_off = off + len(slice_ids)
-    next_token = str(next_off) if next_off < total else ""
-    return items, next_token, total
+    def __init__(self, keys: list[str], strict: bool = True):
+        self.keys = keys
+        self.strict = strict
 
 
-def list_replies(video_id: str, parent_id: str, page_size: int, page_token: str, newest_first: bool, include_deleted: bool) -> tuple[list[dict], str, int]:
-    thread, _ = _get_or_create_thread(video_id)
-    parent_id = parent_id or ""
+class GetDoc:
+    """Get of one doc: (doc, cas), or None if it does not exist."""
 
-    ids = list((thread.get("replies_index", {}) or {}).get(parent_id, []) or [])
-    ids = _sorted_ids(ids, newest_first)
+    __slots__ = ("key",)
 
-    if not include_deleted:
-        ids = [cid for cid in ids if not bool(thread["comments"].get(cid, {}).get("is_deleted", False))]
+    def __init__(self, key: str):
+        self.key = key
 
-    total = len(ids)
-    off = _parse_offset(page_token)
-    slice_ids = ids[off: off + page_size]
-    items = [thread["comments"][cid] for cid in slice_ids if cid in thread["comments"]]
 
-    next_off = off + len(slice_ids)
-    next_token = str(next_off) if next_off < total else ""
-    return items, next_token, total
+class LookupIn:
+    """
+    Sub-document gets of `paths` in each of `keys`, cb_cfg.multi_lookup_workers
+    docs in flight: per key (cas, [value or None per path]), or None if the
+    doc does not exist.
+    """
 
+    __slots__ = ("keys", "paths")
 
-def edit_comment(video_id: str, comment_id: str, content_raw: str) -> dict:
-    def op():
-        thread, cas = _get_or_create_thread(video_id)
-        if comment_id not in thread["comments"]:
-            raise KeyError("not_found")
-        c = thread["comments"][comment_id]
-        c["content_raw"] = content_raw or ""
-        c["edited"] = True
-        c["updated_at"] = _now_ms()
-        _replace_thread(video_id, thread, cas)
-        return c
+    def __init__(self, keys: list[str], paths: tuple[str, ...]):
+        self.keys = keys
+        self.paths = paths
 
-    return _retry_cas(op)
 
+class Blocking:
+    """A call of the blocking implementation (thread creation, migration); async mode runs it on its db pool."""
 
-def delete_comment(video_id: str, comment_id: str, hard_delete: bool) -> dict:
-    def op():
-        thread, cas = _get_or_create_thread(video_id)
-        if comment_id not in thread["comments"]:
-            raise KeyError("not_found")
+    __slots__ = ("fn", "args")
 
-        c = thread["comments"][comment_id]
-        parent_id = c.get("parent_id", "") or ""
+    def __init__(self, fn: Callable, *args: Any):
+        self.fn = fn
+        self.args = args
 
-        if hard_delete:
-            if not parent_id:
-                if comment_id in thread["top_index"]:
-                    thread["top_index"].remove(comment_id)
-                    thread["counts"]["top"] = max(int(thread["counts"].get("top", 0) or 0) - 1, 0)
-            else:
-                arr = (thread.get("replies_index", {}) or {}).get(parent_id, [])
-                if comment_id in arr:
-                    arr.remove(comment_id)
-                if parent_id in thread["comments"]:
-                    thread["comments"][parent_id]["reply_count"] = max(
-                        int(thread["comments"][parent_id].get("reply_count", 0) or 0) - 1,
-                        0,
-                    )
 
-            del thread["comments"][comment_id]
-            thread["counts"]["total"] = max(int(thread["counts"].get("total", 0) or 0) - 1, 0)
+class Emit:
+    """A chunk of a streaming read, handed to the caller of iter_reads()."""
 
-            out = {
-                "id": comment_id,
-                "video_id": video_id,
-                "parent_id": parent_id,
-                "content_raw": "",
-                "content_html": "",
-                "is_deleted": True,
-                "edited": True,
-                "created_at": int(c.get("created_at", 0) or 0),
-                "updated_at": _now_ms(),
-                "user_uid": c.get("user_uid", "") or "",
-                "username": c.get("username", "") or "",
-                "channel_id": c.get("channel_id", "") or "",
-                "reply_count": int(c.get("reply_count", 0) or 0),
-                "likes": int(c.get("likes", 0) or 0),
-                "dislikes": int(c.get("dislikes", 0) or 0),
-            }
-        else:
-            c["is_deleted"] = True
-            c["content_raw"] = ""
-            c["content_html"] = ""
-            c["updated_at"] = _now_ms()
-            out = c
+    __slots__ = ("items",)
 
-        _replace_thread(video_id, thread, cas)
-        return out
+    def __init__(self, items: list):
+        self.items = items
 
-    return _retry_cas(op)
 
+Reads = Generator[Any, Any, Any]
 
-def restore_comment(video_id: str, comment_id: str) -> dict:
-    def op():
-        thread, cas = _get_or_create_thread(video_id)
-        if comment_id not in thread["comments"]:
-            raise KeyError("not_found")
-        c = thread["comments"][comment_id]
-        c["is_deleted"] = False
-        c["updated_at"] = _now_ms()
-        _replace_thread(video_id, thread, cas)
-        return c
+_lookup_pool = ThreadPoolExecutor(max_workers=max(int(cb_cfg.multi_lookup_workers or 0), 1), thread_name_prefix="kv")
 
-    return _retry_cas(op)
 
+def _as_is(v: Any) -> Any:
+    return v
 
-def get_counts(video_id: str) -> tuple[int, int]:
-    thread, _ = _get_or_create_thread(video_id)
-    top = int(thread.get("counts", {}).get("top", 0) or 0)
-    total = int(thread.get("counts", {}).get("total", 0) or 0)
-    return top, total
 
+def lookup_values(res: Any, n: int) -> list:
+    """The n path values of a LookupInResult, None for missing paths."""
+    return [res.content_as[_as_is](i) if res.exists(i) else None for i in range(n)]
 
-# ---------------------------
-# Votes
-# ---------------------------
 
-def _get_user_vote(video_id: str, comment_id: str, user_uid: str) -> int:
-    ctx = connect()
-    did = vote_doc_id(video_id, comment_id, user_uid)
+def _lookup(key: str, paths: tuple[str, ...]) -> Optional[tuple[int, list]]:
     try:
-        res = ctx.coll.get(did)
-        doc = res.content_as[dict]
-        return int(doc.get("vote", 0) or 0)
+        res = connect().coll.lookup_in(key, [SD.get(p) for p in paths])
     except DocumentNotFoundException:
-        return 0
-    except Exception:
-        return 0
+        return None
+    return res.cas, lookup_values(res, len(paths))
 
 
-def _set_user_vote(video_id: str, comment_id: str, user_uid: str, vote: int) -> None:
-    ctx = connect()
-    did = vote_doc_id(video_id, comment_id, user_uid)
-    ctx.coll.upsert(
-        did,
-        {
-            "type": "comment_vote",
-            "video_id": video_id,
-            "comment_id": comment_id,
-            "user_uid": user_uid,
-            "vote": int(vote),
-            "updated_at": _now_ms(),
-        },
-    )
+def _read(req: Any) -> Any:
+    if isinstance(req, GetDocs):
+        return _get_many(req.keys, req.strict)
+    if isinstance(req, GetDoc):
+        try:
+            res = connect().coll.get(req.key)
+        except DocumentNotFoundException:
+            return None
+        return res.content_as[dict], res.cas
+    if isinstance(req, LookupIn):
+        if len(req.keys) == 1:
+            return [_lookup(req.keys[0], req.paths)]
+        return list(_lookup_pool.map(lambda k: _lookup(k, req.paths), req.keys))
+    return req.fn(*req.args)
 
 
-def _delete_vote_doc(video_id: str, comment_id: str, user_uid: str) -> None:
-    ctx = connect()
-    did = vote_doc_id(video_id, comment_id, user_uid)
-    try:
-        ctx.coll.remove(did)
-    except Exception:
-        pass
+def run_reads(steps: Reads) -> Any:
+    """Drive read steps with blocking KV calls; returns their result."""
+    res: Any = None
+    while True:
+        try:
+            req = steps.send(res)
+        except StopIteration as stop:
+            return stop.value
+        res = _read(req)
 
 
-def get_my_votes(video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+def iter_reads(steps: Reads) -> Iterator[list]:
+    """run_reads() for streaming steps: yields the chunks they Emit."""
+    res: Any = None
+    while True:
+        try:
+            req = steps.send(res)
+        except StopIteration:
+            return
+        if isinstance(req, Emit):
+            res = None
+            yield req.items
+        else:
+            res = _read(req)
+
+
+def _build_index(
+    video_id: str, parent_id: str, kids: list[dict], thread: dict, docs: dict[str, dict],
+    owner: dict, len_key: str, segs_key: str,
+) -> int:
     """
-    Safe implementation: single gets (fast enough for <= few hundred ids).
-    Returns dict: comment_id -> vote (-1/0/1)
+    Index, live index and ranked indexes of one parent's children (comment docs
+    in slot order) into `docs`, the comments included; their heads into `owner`
+    (the thread doc or the parent comment). Returns the live children.
     """
-    video_id = (video_id or "").strip()
-    user_uid = (user_uid or "").strip()
-    if not video_id or not user_uid or not comment_ids:
-        return {}
+    seg_size = _seg_size()
+    n_live = 0
+    rank_heads: dict[str, dict] = {RANK_TOP: {}, RANK_HOT: {}}
+    owner[segs_key] = {}
+    for n, start in enumerate(range(0, len(kids), seg_size)):
+        seg = _empty_segment(video_id, parent_id, n)
+        live = _empty_segment(video_id, parent_id, n, live=True)
+        for c in kids[start:start + seg_size]:
+            c["seg"] = n
+            seq = int(c.get("seq", 0) or 0)
+            deleted = bool(c.get("is_deleted", False))
+            seg["items"].append([seq, c["id"]])
+            if deleted:
+                seg["del"][c["id"]] = True
+            else:
+                live["items"].append([seq, c["id"]])
+            for rank, key, value in _rank_entries(c, c["score"], thread):
+                did = rank_seg_doc_id(video_id, parent_id, key, rank)
+                doc = docs.setdefault(did, _empty_rank_seg(video_id, parent_id, key))
+                doc["items"][c["id"]] = [value, seq, int(c.get("rank_ver", 0) or 0)]
+                h = rank_heads[rank].setdefault(key, {"n": 0, "del": 0})
+                h["n"] += 1
+                if deleted:
+                    doc["del"][c["id"]] = True
+                    h["del"] += 1
+            docs[comment_doc_id(video_id, c["id"])] = c
+        docs[index_seg_doc_id(video_id, parent_id, n)] = seg
+        docs[live_seg_doc_id(video_id, parent_id, n)] = live
+        owner[segs_key][str(n)] = {"n": len(seg["items"]), "del": len(seg["del"])}
+        n_live += len(live["items"])
+    owner[len_key] = len(kids)
+    owner["rank_segs"] = rank_heads[RANK_TOP]
+    if not parent_id:
+        owner["hot_segs"] = rank_heads[RANK_HOT]
+    return n_live
+
+
+def _migrate_v1_thread(video_id: str, legacy: dict, cas: int) -> tuple[dict, int]:
+    """Split a v1 thread (everything in thread::{video}) into current-layout docs; meta last."""
+    did = thread_doc_id(video_id)
+
+    comments: dict[str, dict] = {}
+    for cid, c in (legacy.get("comments") or {}).items():
+        d = dict(c)
+        d.setdefault("id", cid)
+        d.setdefault("video_id", video_id)
+        d["type"] = "comment"
+        d["thread_id"] = did
+        d["score"] = _score(d)
+        comments[cid] = d
+
+    meta = _empty_thread(video_id)
+    meta["vote_digests"] = False  # votes so far only in cvote:: docs
+    meta["created_at"] = int(legacy.get("created_at", 0) or 0) or meta["created_at"]
+    meta["next_seq"] = int(legacy.get("next_seq", 1) or 1)
+    docs: dict[str, dict] = {}
+
+    def kids(ids: list) -> list[dict]:
+        return [comments[cid] for cid in ids or [] if cid in comments]
+
+    top_live = _build_index(video_id, "", kids(legacy.get("top_index")), meta, docs, meta, "top_len", "top_segs")
+    counts = legacy.get("counts") or {}
+    meta["counts"] = {
+        "total": int(counts.get("total", 0) or 0),
+        "top": int(counts.get("top", 0) or 0),
+        "top_live": top_live,
+    }
+    for pid, ids in (legacy.get("replies_index", {}) or {}).items():
+        if pid in comments:
+            c = comments[pid]
+            c["reply_live"] = _build_index(video_id, pid, kids(ids), meta, docs, c, "reply_len", "reply_segs")
+
+    for cid, c in comments.items():
+        docs[comment_doc_id(video_id, cid)] = c
+
+    _write_many(docs)
+    cas = _replace_thread(video_id, meta, cas)
+    log.info("migrated thread %s: comments=%d docs=%d", video_id, len(comments), len(docs))
+    return meta, cas
+
+
+# ---------------------------
+# Bulk import: a whole thread built in memory in the current layout and
+# written with bulk upserts, instead of replaying every comment and vote
+# through the write path.
+# ---------------------------
 
-    out: dict[str, int] = {}
-    seen = set()
-    for cid in comment_ids:
-        cid = (cid or "").strip()
-        if not cid or cid in seen:
+def build_thread_docs(video_id: str, comments: list[dict], votes: list[dict]) -> dict[str, dict]:
+    """
+    Every doc of a thread in the current layout, thread doc included:
+    comments, index/live/ranked/hot segments, cvote:: docs and complete
+    uvotes:: digests. `comments` carry the comment fields (id, parent_id,
+    content_raw, created_at, ...); `votes` are {comment_id, user_uid, vote}.
+    Comments are ordered by (created_at, id); replies to comments that are not
+    in `comments` are left out. likes/dislikes are tallied from `votes` for
+    comments that have any, else taken from the comment.
+    """
+    now = _now_ms()
+    tid = thread_doc_id(video_id)
+    meta = _empty_thread(video_id)
+    docs: dict[str, dict] = {}
+
+    tally: dict[str, list[int]] = {}
+    by_user: dict[str, dict[str, int]] = {}
+    known = {str(c.get("id", "") or "") for c in comments}
+    for v in votes:
+        cid, uid, vote = v.get("comment_id", "") or "", v.get("user_uid", "") or "", _norm_vote(v.get("vote", 0))
+        if cid not in known or not uid:
+            continue
+        prev = by_user.setdefault(uid, {}).get(cid, 0)
+        by_user[uid][cid] = vote
+        t = tally.setdefault(cid, [0, 0])
+        t[0] += int(vote == 1) - int(prev == 1)
+        t[1] += int(vote == -1) - int(prev == -1)
+
+    children: dict[str, list[dict]] = {}
+    for seq, src in enumerate(sorted(comments, key=lambda x: (int(x.get("created_at", 0) or 0), str(x.get("id", "")))), 1):
+        cid = str(src.get("id", "") or "")
+        if not cid:
+            continue
+        created = int(src.get("created_at", 0) or 0) or now
+        likes, dislikes = tally.get(cid) or (int(src.get("likes", 0) or 0), int(src.get("dislikes", 0) or 0))
+        content_html, render_ver = render_content(src.get("content_raw", "") or "")
+        if not render_ver:
+            content_html = src.get("content_html", "") or ""  # rendering off: keep what the source had
+        c = {
+            "type": "comment",
+            "thread_id": tid,
+            "id": cid,
+            "video_id": video_id,
+            "parent_id": src.get("parent_id", "") or "",
+            "content_raw": src.get("content_raw", "") or "",
+            "content_html": content_html,
+            "render_ver": render_ver,
+            "is_deleted": bool(src.get("is_deleted", False)),
+            "edited": bool(src.get("edited", False)),
+            "created_at": created,
+            "updated_at": int(src.get("updated_at", 0) or 0) or created,
+            "user_uid": src.get("user_uid", "") or "",
+            "username": src.get("username", "") or "",
+            "channel_id": src.get("channel_id", "") or "",
+            "reply_count": 0,
+            "seq": seq,
+            "seg": 0,
+            "likes": max(likes, 0),
+            "dislikes": max(dislikes, 0),
+            "score": max(likes, 0) - max(dislikes, 0),
+            "rank_ver": 0,
+        }
+        children.setdefault(c["parent_id"], []).append(c)
+        meta["next_seq"] = seq + 1
+
+    top_live = _build_index(video_id, "", children.get("", []), meta, docs, meta, "top_len", "top_segs")
+    pending = list(children.get("", []))
+    while pending:
+        c = pending.pop()
+        if c["id"] not in children:
             continue
-        seen.add(cid)
-        v = _get_user_vote(video_id, cid, user_uid)
-        if v not in (-1, 0, 1):
-            v = 0
-        out[cid] = int(v)
+        c["reply_live"] = _build_index(video_id, c["id"], children[c["id"]], meta, docs, c, "reply_len", "reply_segs")
+        c["reply_count"] = c["reply_len"]
+        pending.extend(children[c["id"]])
+
+    imported = [c for did, c in docs.items() if did.startswith("comment::")]
+    meta["counts"] = {"total": len(imported), "top": meta["top_len"], "top_live": top_live}
+    meta["created_at"] = min([c["created_at"] for c in imported], default=now)
+    meta["ver"] = 1
+
+    for uid, user_votes in by_user.items():
+        user_votes = {cid: v for cid, v in user_votes.items() if comment_doc_id(video_id, cid) in docs}
+        for cid, v in user_votes.items():
+            docs[vote_doc_id(video_id, cid, uid)] = {
+                "type": "comment_vote",
+                "video_id": video_id,
+                "comment_id": cid,
+                "user_uid": uid,
+                "vote": v,
+                "updated_at": now,
+            }
+        docs[vote_digest_doc_id(video_id, uid)] = {
+            "type": "user_votes",
+            "video_id": video_id,
+            "user_uid": uid,
+            "updated_at": now,
+            "complete": True,
+            "votes": user_votes,
+        }
+    docs[tid] = meta
+    return docs
+
+
+def import_thread(video_id: str, docs: dict[str, dict], replace: bool = False) -> bool:
+    """
+    Write docs built by build_thread_docs, the thread doc last (then its
+    ccount:: doc), so an interrupted import leaves no thread behind and can
+    be repeated. Without
+    `replace`, a video that already has a thread is left alone (False).
+    """
+    tid = thread_doc_id(video_id)
+    if not replace and _get_many([tid]):
+        return False
+    _write_many({did: doc for did, doc in docs.items() if did != tid})
+    if replace:
+        connect().coll.upsert(tid, docs[tid])
+    else:
+        try:
+            connect().coll.insert(tid, docs[tid])
+        except DocumentExistsException:
+            return False  # created meanwhile: import before the service serves the video
+    counts = docs[tid].get("counts", {}) or {}
+    connect().coll.upsert(counts_doc_id(video_id), _counts_doc(video_id, counts.get("top", 0), counts.get("total", 0)))
+    with _thread_cache_lock:
+        _thread_cache.pop(video_id)
+    drop_responses(video_id)
+    return True
+
+
+def migrate_thread(video_id: str) -> tuple[dict, int]:
+    """
+    Convert a v1 thread into the current layout.
+    Comment and segment docs are written first and the thread doc is swapped
+    for the meta doc last (CAS), so an interrupted run leaves the old doc
+    authoritative and can simply be repeated.
+    Returns (meta, cas).
+    """
+    ctx = connect()
+    did = thread_doc_id(video_id)
+
+    def op():
+        res = ctx.coll.get(did)
+        meta, cas = res.content_as[dict], res.cas
+        if int(meta.get("layout", 1) or 1) < THREAD_LAYOUT:
+            meta, cas = _migrate_v1_thread(video_id, meta, cas)
+        return meta, cas
+
+    return _retry_cas(op, video_id)
+
+
+def _ensure_migrated(video_id: str) -> bool:
+    """Migrate an older thread doc if there is one. True if a migration happened."""
+    ctx = connect()
+    try:
+        res = ctx.coll.get(thread_doc_id(video_id))
+    except DocumentNotFoundException:
+        return False
+    if int(res.content_as[dict].get("layout", 1) or 1) >= THREAD_LAYOUT:
+        return False
+    migrate_thread(video_id)
+    return True
+
+
+# ---------------------------
+# Thread cache: decoded meta + comment/segment docs per video, valid for one
+# thread CAS. Writes bump the thread doc after their doc writes, so a CAS match
+# on revalidation means nothing cached for the video is stale.
+# ---------------------------
+
+@dataclass
+class _CachedThread:
+    meta: dict
+    cas: int
+    checked_at: float
+    meta_size: int = 0
+    docs: dict = field(default_factory=dict)  # doc id -> (doc, size)
+
+    @property
+    def size(self) -> int:
+        return self.meta_size + sum(sz for _, sz in self.docs.values())
+
+
+_thread_cache = LruCache(
+    cache_cfg.thread_max_entries if cache_cfg.thread_enabled else 0,
+    cache_cfg.thread_max_bytes,
+    cache_cfg.thread_ttl_sec,
+)
+_thread_cache_lock = threading.Lock()
+
+
+class _Append:
+    """Patch value: append to the list at the path."""
+    __slots__ = ("values",)
+
+    def __init__(self, *values: Any):
+        self.values = values
+
+
+_REMOVED = object()  # patch value: remove the path
+
+
+def thread_cache_stats() -> dict[str, float]:
+    return _thread_cache.stats()
+
+
+def _doc_size(doc: dict) -> int:
+    return len(json.dumps(doc, separators=(",", ":")))
+
+
+def _apply_patch(doc: dict, patch: dict) -> dict:
+    """Copy of doc with dotted paths set; only the dicts along each path are copied."""
+    out = dict(doc)
+    for path, value in patch.items():
+        parts = path.split(".")
+        cur = out
+        for p in parts[:-1]:
+            nxt = cur.get(p)
+            cur[p] = dict(nxt) if isinstance(nxt, dict) else {}
+            cur = cur[p]
+        last = parts[-1]
+        if value is _REMOVED:
+            cur.pop(last, None)
+        elif isinstance(value, _Append):
+            cur[last] = list(cur.get(last, []) or []) + list(value.values)
+        else:
+            cur[last] = value
     return out
 
 
-def apply_vote(video_id: str, user_uid: str, comment_id: str, vote: int) -> tuple[int, int, int]:
+@traced_steps("thread.entry", profile_cfg.enabled)
+def _thread_entry_reads(video_id: str, ver: Optional[int] = None) -> Reads:
+    """Read steps of _thread_entry()."""
+    if cache_cfg.thread_enabled:
+        e = _thread_cache.lookup(video_id)
+        if e is not None:
+            now = time.monotonic()
+            valid = (ver is not None and int(e.meta.get("ver", 0) or 0) == ver) or (
+                now - e.checked_at < cache_cfg.thread_fresh_sec
+            )
+            if not valid:
+                got = (yield LookupIn([thread_doc_id(video_id)], ("updated_at",)))[0]
+                valid = got is not None and got[0] == e.cas
+                if valid:
+                    e.checked_at = now
+            _thread_cache.settle(video_id, e, valid)
+            if valid:
+                with _thread_cache_lock:
+                    return e.meta, e, e.cas
+
+    got = yield GetDoc(thread_doc_id(video_id))
+    if got is None or int(got[0].get("layout", 1) or 1) < THREAD_LAYOUT:
+        got = yield Blocking(_get_or_create_thread, video_id)  # creation / migration
+    elif metrics_cfg.enabled:
+        _thread_doc_bytes.observe(_doc_size(got[0]))
+    meta, cas = got
+    return meta, _cache_thread(video_id, meta, cas), cas
+
+
+def _thread_entry(video_id: str, ver: Optional[int] = None) -> tuple[dict, Optional[_CachedThread], int]:
     """
-    vote: -1,0,1
-    Returns: (likes, dislikes, my_vote)
+    Read path: thread meta through the cache. Returns (meta, entry, cas); entry
+    is None with the cache disabled. Pass entry/cas on to the cached readers.
+    `ver`: a thread_version() the caller just read (which revalidated the
+    entry); an entry still at that version is served without checking again.
     """
-    if vote not in (-1, 0, 1):
-        raise ValueError("invalid vote")
+    return run_reads(_thread_entry_reads(video_id, ver))
 
-    # First: ensure comment exists in this video's thread (prevents orphan cvote docs)
-    thread, _ = _get_or_create_thread(video_id)
-    if comment_id not in (thread.get("comments") or {}):
-        # cleanup if exists
-        _delete_vote_doc(video_id, comment_id, user_uid)
-        raise KeyError("not_found")
 
-    old_vote = _get_user_vote(video_id, comment_id, user_uid)
-    new_vote = vote
+def _cache_thread(video_id: str, meta: dict, cas: int) -> Optional[_CachedThread]:
+    """Start a cache entry for a freshly read thread meta (None with the cache disabled)."""
+    if not cache_cfg.thread_enabled:
+        return None
+    e = _CachedThread(meta=meta, cas=cas, checked_at=time.monotonic(), meta_size=_doc_size(meta))
+    _thread_cache.put(video_id, e, e.size)
+    return e
 
-    if old_vote == new_vote:
-        c = (thread.get("comments") or {}).get(comment_id) or {}
-        return int(c.get("likes", 0) or 0), int(c.get("dislikes", 0) or 0), int(old_vote)
 
-    def op():
-        thread2, cas = _get_or_create_thread(video_id)
-        if comment_id not in thread2["comments"]:
-            raise KeyError("not_found")
+def _remember(video_id: str, e: Optional[_CachedThread], cas: int, docs: dict) -> None:
+    """Add docs read under thread CAS `cas` to the entry, unless it moved on meanwhile."""
+    if e is None or not docs:
+        return
+    with _thread_cache_lock:
+        if e.cas != cas or _thread_cache.peek(video_id) is not e:
+            return
+        for did, doc in docs.items():
+            e.docs[did] = (doc, _doc_size(doc))
+        _thread_cache.resize(video_id, e.size)
+
+
+def _advance_cache(
+    video_id: str,
+    ver: int,
+    cas: int,
+    meta: Optional[dict] = None,
+    meta_patch: Optional[dict] = None,
+    docs: Optional[dict] = None,
+    patches: Optional[dict] = None,
+) -> None:
+    """
+    Apply this process' own write (which produced thread version `ver`) to the
+    cached entry: a new meta or a meta patch, whole docs (None drops one) and
+    path patches for docs that are cached. If the entry is not exactly one
+    version behind, someone else wrote in between and it is dropped instead.
+    """
+    drop_responses(video_id)
+    with _thread_cache_lock:
+        e = _thread_cache.peek(video_id)
+        if e is None:
+            return
+        if int(e.meta.get("ver", 0) or 0) != ver - 1:
+            _thread_cache.pop(video_id)
+            return
+        if meta is None:
+            meta = _apply_patch(e.meta, meta_patch or {"ver": ver})
+        e.meta = meta
+        e.meta_size = _doc_size(meta)
+        e.cas = cas
+        e.checked_at = time.monotonic()
+        for did, doc in (docs or {}).items():
+            if doc is None:
+                e.docs.pop(did, None)
+            else:
+                e.docs[did] = (doc, _doc_size(doc))
+        for did, patch in (patches or {}).items():
+            hit = e.docs.get(did)
+            if hit is not None:
+                doc = _apply_patch(hit[0], patch)
+                e.docs[did] = (doc, _doc_size(doc))
+        _thread_cache.resize(video_id, e.size)
+
+
+def thread_version_reads(video_id: str) -> Reads:
+    thread, _, _ = yield from _thread_entry_reads(video_id)
+    return int(thread.get("ver", 0) or 0)
 
-        c = thread2["comments"][comment_id]
-        likes = int(c.get("likes", 0) or 0)
-        dislikes = int(c.get("dislikes", 0) or 0)
 
-        if old_vote == 1:
-            likes = max(likes - 1, 0)
-        elif old_vote == -1:
-            dislikes = max(dislikes - 1, 0)
+def thread_version(video_id: str) -> int:
+    """Current version of a thread, through the thread cache."""
+    return run_reads(thread_version_reads(video_id))
 
-        if new_vote == 1:
-            likes += 1
-        elif new_vote == -1:
-            dislikes += 1
 
-        c["likes"] = likes
-        c["dislikes"] = dislikes
-        c["updated_at"] = _now_ms()
+# ---------------------------
+# Comment docs and index segments
+# ---------------------------
+
+def _get_comment(video_id: str, comment_id: str) -> tuple[dict, int]:
+    ctx = connect()
+    did = comment_doc_id(video_id, comment_id)
+    try:
+        res = ctx.coll.get(did)
+    except DocumentNotFoundException:
+        if not _ensure_migrated(video_id):
+            raise KeyError("not_found")
+        try:
+            res = ctx.coll.get(did)
+        except DocumentNotFoundException:
+            raise KeyError("not_found")
+    return res.content_as[dict], res.cas
+
+
+def _mutate_comment(video_id: str, comment_id: str, specs: list):
+    """Sub-document mutation of one comment doc; KeyError("not_found") if it does not exist."""
+    try:
+        return connect().coll.mutate_in(comment_doc_id(video_id, comment_id), specs)
+    except DocumentNotFoundException:
+        raise KeyError("not_found")
+
+
+def _mutate_comment_counters(video_id: str, comment_id: str, deltas: dict[str, int]) -> dict[str, int]:
+    """Counter deltas on one comment doc, _MAX_SPECS per mutation. Returns the new values by path."""
+    paths = [p for p, d in deltas.items() if d]
+    vals: dict[str, int] = {}
+    for i in range(0, len(paths), _MAX_SPECS):
+        part = paths[i:i + _MAX_SPECS]
+        res = _mutate_comment(video_id, comment_id, [_counter(p, deltas[p]) for p in part])
+        vals.update({p: int(res.content_as[int](j)) for j, p in enumerate(part)})
+    return vals
+
+
+def _cached_docs(e: Optional[_CachedThread], dids: list[str]) -> dict[str, dict]:
+    """The docs of `dids` the cache entry has."""
+    found: dict[str, dict] = {}
+    if e is not None:
+        for did in dids:
+            hit = e.docs.get(did)
+            if hit is not None:
+                found[did] = hit[0]
+    return found
+
+
+def _fill_docs(video_id: str, dids: list[str], e: Optional[_CachedThread], cas: int, found: dict) -> Reads:
+    """Add the docs of `dids` not in `found` yet, from one multi-get, to it and to the cache entry."""
+    missing = [did for did in dict.fromkeys(dids) if did not in found]
+    if missing:
+        fetched = yield GetDocs(missing)
+        _remember(video_id, e, cas, fetched)
+        found.update(fetched)
+
+
+def _docs_reads(video_id: str, dids: list[str], e: Optional[_CachedThread], cas: int) -> Reads:
+    """Any docs of the thread: from the cache entry, the rest in one multi-get. Missing docs are left out."""
+    found = _cached_docs(e, dids)
+    if len(found) < len(dids):
+        yield from _fill_docs(video_id, dids, e, cas, found)
+    return found
+
+
+def _comments_reads(
+    video_id: str,
+    comment_ids: list[str],
+    e: Optional[_CachedThread] = None,
+    cas: int = 0,
+) -> Reads:
+    """Comment docs through the cache entry; keeps input order, skips missing ones."""
+    keys = [comment_doc_id(video_id, cid) for cid in comment_ids]
+    found = _cached_docs(e, keys)
+    if len(found) < len(keys):
+        yield from _fill_docs(video_id, keys, e, cas, found)
+    return [found[k] for k in keys if k in found]
+
+
+def _get_comments(
+    video_id: str,
+    comment_ids: list[str],
+    e: Optional[_CachedThread] = None,
+    cas: int = 0,
+) -> list[dict]:
+    return run_reads(_comments_reads(video_id, comment_ids, e, cas))
+
+
+def _segments_reads(
+    video_id: str,
+    parent_id: str,
+    segs: list[int],
+    e: Optional[_CachedThread],
+    cas: int,
+    live: bool = False,
+) -> Reads:
+    """Index segments through the cache entry; empty ones for segments not written yet."""
+    keys = [_seg_doc_id(video_id, parent_id, n, live) for n in segs]
+    found = _cached_docs(e, keys)
+    if len(found) < len(keys):
+        yield from _fill_docs(video_id, keys, e, cas, found)
+    return [found.get(k) or _empty_segment(video_id, parent_id, n, live) for k, n in zip(keys, segs)]
+
+
+def _get_segment(video_id: str, parent_id: str, seg: int, live: bool = False) -> tuple[dict, int]:
+    ctx = connect()
+    try:
+        res = ctx.coll.get(_seg_doc_id(video_id, parent_id, seg, live))
+        return res.content_as[dict], res.cas
+    except DocumentNotFoundException:
+        return _empty_segment(video_id, parent_id, seg, live), 0
+
+
+def _append_to_segment(video_id: str, parent_id: str, seg: int, items: list[list], live: bool = False) -> None:
+    ctx = connect()
+    did = _seg_doc_id(video_id, parent_id, seg, live)
+    try:
+        ctx.coll.mutate_in(did, [SD.array_append("items", *items)])
+        return
+    except DocumentNotFoundException:
+        pass
+    doc = _empty_segment(video_id, parent_id, seg, live)
+    doc["items"].extend(items)
+    try:
+        ctx.coll.insert(did, doc)
+    except DocumentExistsException:
+        ctx.coll.mutate_in(did, [SD.array_append("items", *items)])
+
+
+def _rewrite_live_segment(video_id: str, parent_id: str, seg: int, fn) -> Optional[dict]:
+    """
+    CAS read-modify-write of a live segment; fn(items) returns the new items,
+    or None when there is nothing to change. Returns the stored doc or None.
+    """
+    ctx = connect()
+    did = live_seg_doc_id(video_id, parent_id, seg)
+
+    def op():
+        doc, cas = _get_segment(video_id, parent_id, seg, live=True)
+        items = fn(list(doc.get("items", []) or []))
+        if items is None:
+            return None
+        doc["items"] = items
+        if cas:
+            ctx.coll.replace(did, doc, cas=cas)
+        else:
+            ctx.coll.insert(did, doc)
+        return doc
+
+    return _retry_cas(op, video_id)
+
+
+def _live_remove(video_id: str, parent_id: str, seg: int, comment_id: str) -> Optional[dict]:
+    def fn(items: list) -> Optional[list]:
+        kept = [it for it in items if it[1] != comment_id]
+        return kept if len(kept) != len(items) else None
+
+    return _rewrite_live_segment(video_id, parent_id, seg, fn)
+
+
+def _live_insert(video_id: str, parent_id: str, seg: int, seq: int, comment_id: str) -> Optional[dict]:
+    def fn(items: list) -> Optional[list]:
+        if any(it[1] == comment_id for it in items):
+            return None
+        return sorted(items + [[int(seq), comment_id]], key=lambda it: int(it[0]))
+
+    return _rewrite_live_segment(video_id, parent_id, seg, fn)
+
+
+def _head_path(parent_id: str, seg: int, field_name: str) -> str:
+    return f"{'reply_segs' if parent_id else 'top_segs'}.{int(seg)}.{field_name}"
+
+
+def _head_sizes(heads: dict) -> list[tuple[int, int]]:
+    """Index head -> [(ids, soft-deleted)] per segment number."""
+    if not heads:
+        return []
+    out = [(0, 0)] * (max(int(k) for k in heads) + 1)
+    for k, h in heads.items():
+        out[int(k)] = (int(h.get("n", 0) or 0), int(h.get("del", 0) or 0))
+    return out
+
+
+@traced("filter.segment", profile_cfg.enabled)
+def _segment_items(seg: dict, newest_first: bool, include_deleted: bool) -> list[tuple[int, str]]:
+    items = sorted(seg.get("items", []) or [], key=lambda x: int(x[0]), reverse=newest_first)
+    deleted = seg.get("del", {}) or {}
+    gone = seg.get("gone", {}) or {}
+    return [
+        (int(seq), cid) for seq, cid in items
+        if cid not in gone and (include_deleted or cid not in deleted)
+    ]
+
+
+def _visible_sizes(heads: dict, include_deleted: bool) -> list[int]:
+    return [max(n - (0 if include_deleted else d), 0) for n, d in _head_sizes(heads)]
+
+
+def _page_plan(
+    heads: dict,
+    offset: int,
+    page_size: int,
+    newest_first: bool,
+    include_deleted: bool,
+) -> tuple[list[tuple[int, int]], int]:
+    """
+    Which segments one page of an index spans, from the head counters alone:
+    ([(segment, ids to skip in it)] in page order, index total).
+    """
+    sizes = list(enumerate(_visible_sizes(heads, include_deleted)))
+    if newest_first:
+        sizes.reverse()
+    return _span_plan(sizes, offset, page_size), sum(sz for _, sz in sizes)
+
+
+def _span_plan(sizes: list[tuple[Any, int]], offset: int, page_size: int) -> list[tuple[Any, int]]:
+    """[(doc key, visible ids)] in page order -> [(doc key, ids to skip in it)] for one page."""
+    plan: list[tuple[Any, int]] = []
+    skip = offset
+    want = page_size
+    for key, size in sizes:
+        if want <= 0:
+            break
+        if skip >= size:
+            skip -= size
+            continue
+        plan.append((key, skip))
+        want -= size - skip
+        skip = 0
+    return plan
+
+
+def _page_items(plan: list[tuple[int, int]], segs: list[dict], page_size: int, newest_first: bool, include_deleted: bool) -> list[tuple[int, int, str]]:
+    """One page as [(segment, seq, comment_id)]."""
+    out: list[tuple[int, int, str]] = []
+    for (n, skip), seg in zip(plan, segs):
+        if len(out) >= page_size:
+            break
+        for seq, cid in _segment_items(seg, newest_first, include_deleted)[skip: skip + page_size - len(out)]:
+            out.append((n, seq, cid))
+    return out
+
+
+# Page tokens are cursors: (segment, seq) of the last item served. The index
+# order is (segment, seq), so the next page starts right after that key no
+# matter what was inserted or hard-deleted meanwhile; locating it reads only
+# the cursor's segment. Numeric offset tokens are still accepted.
+
+def _cursor_segment(tok: Union[PageCursor, int], newest_first: bool) -> Optional[int]:
+    """Segment a page token needs read to be resolved; None for offsets and unusable cursors."""
+    if isinstance(tok, PageCursor) and not tok.rank and tok.newest_first == newest_first and len(tok.key) == 2:
+        return int(tok.key[0])
+    return None
+
+
+def _page_offset(
+    tok: Union[PageCursor, int],
+    heads: dict,
+    seg: Optional[dict],
+    newest_first: bool,
+    include_deleted: bool,
+) -> int:
+    """Offset of the first item after the token; `seg` is the doc of _cursor_segment(tok)."""
+    n = _cursor_segment(tok, newest_first)
+    if n is None:
+        # legacy offset; a cursor of the other sort order starts over
+        return tok if isinstance(tok, int) else 0
+
+    seq = int(tok.key[1])
+    sizes = _visible_sizes(heads, include_deleted)
+    before = sum(sz for m, sz in enumerate(sizes) if (m > n if newest_first else m < n))
+    if n >= len(sizes):
+        return before
+    within = sum(
+        1 for s, _ in _segment_items(seg or {}, newest_first, include_deleted)
+        if (s >= seq if newest_first else s <= seq)
+    )
+    return before + min(within, sizes[n])
+
+
+def _next_token(items: list[tuple[int, int, str]], offset: int, total: int, newest_first: bool, ver: int) -> str:
+    if not items or offset + len(items) >= total:
+        return ""
+    n, seq, _ = items[-1]
+    return encode_cursor(PageCursor(newest_first=newest_first, key=(n, seq), ver=int(ver)))
+
+
+def _index_page_reads(
+    video_id: str,
+    parent_id: str,
+    heads: dict,
+    page_token: str,
+    page_size: int,
+    newest_first: bool,
+    include_deleted: bool,
+    ver: int,
+    e: Optional[_CachedThread] = None,
+    cas: int = 0,
+) -> Reads:
+    """
+    Resolve one page of an index to comment ids. Segments before the page are
+    skipped by their head counters; only the segments the page spans are read,
+    from the live index unless deleted comments are wanted.
+    Returns (ids, next_token, total).
+    """
+    live = not include_deleted
+    tok = decode_page_token(page_token)
+    n = _cursor_segment(tok, newest_first)
+    seg = (yield from _segments_reads(video_id, parent_id, [n], e, cas, live))[0] if n is not None else None
+    offset = _page_offset(tok, heads, seg, newest_first, include_deleted)
+
+    plan, total = _page_plan(heads, offset, page_size, newest_first, include_deleted)
+    segs = yield from _segments_reads(video_id, parent_id, [m for m, _ in plan], e, cas, live)
+    items = _page_items(plan, segs, page_size, newest_first, include_deleted)
+    return [cid for _, _, cid in items], _next_token(items, offset, total, newest_first, ver), total
+
+
+# ---------------------------
+# Ranked indexes. TOP_RATED ("rank_segs" heads, ridx:: buckets) orders
+# comments by score = likes - dislikes, best first, ties newest first. Scores
+# within +-_RANK_EXACT get a bucket each, split by index segment so no bucket
+# outgrows a segment; past that, buckets double in width and are not split
+# (few comments get there). A bucket doc maps comment_id -> [value, seq, ver],
+# so a vote moves one entry with two sub-document ops and creates only add
+# entries. The head (of the meta or the parent comment) counts ids per bucket
+# like a segment head, so a page reads only the buckets it spans. Order and
+# cursor key: (band, chunk, value, seq), all descending.
+#
+# HOT ("hot_segs" heads of the meta, hidx:: buckets; top-level comments only)
+# orders by (score + prior) * 2 ** (-age / half_life). Decay never reorders
+# two comments: at any time, comparing them compares
+# +-(log2 |score + prior| + created_at / half_life), so that (fixed point) is
+# the stored value and only votes and creates move entries. Buckets are value
+# ranges bucket_half_lives wide; the chunk is the index generation, bumped by
+# rerank_hot() when it rebuilds the index under new decay parameters
+# (meta "hot_cfg"). Readers ignore head keys of other generations.
+# ---------------------------
+
+_RANK_EXACT = 8
+
+
+def _hot_params() -> list[float]:
+    """Decay parameters for indexes built now, as stored in the meta doc ("hot_cfg")."""
+    return hot_params(hot_cfg.half_life_sec, hot_cfg.prior, hot_cfg.bucket_half_lives)
+
+
+def _score(c: dict) -> int:
+    """likes - dislikes; kept as its own counter so a vote knows the exact score it moved from."""
+    if "score" in c:
+        return int(c.get("score", 0) or 0)
+    return int(c.get("likes", 0) or 0) - int(c.get("dislikes", 0) or 0)
+
+
+def _rank_band(score: int) -> int:
+    a = abs(int(score))
+    if a <= _RANK_EXACT:
+        return int(score)
+    band = _RANK_EXACT + ((a - 1) // _RANK_EXACT).bit_length()
+    return band if score > 0 else -band
+
+
+def _rank_key(score: int, seg: int) -> str:
+    band = _rank_band(score)
+    return f"{band}_{int(seg) if abs(band) <= _RANK_EXACT else 0}"
+
+
+def _hot_entry(c: dict, score: int, hot: dict) -> tuple[str, int]:
+    """(bucket key, value) of a top-level comment in the hot index described by hot_gen/hot_cfg."""
+    params = hot["hot_cfg"]
+    value = _hot_value(score, int(c.get("created_at", 0) or 0), params)
+    width = max(int(float(params[2]) * _HOT_SCALE), 1)
+    return f"{value // width}_{int(hot.get('hot_gen', 0) or 0)}", value
+
+
+def _hot_index(video_id: str) -> dict:
+    """
+    hot_gen/hot_cfg of the thread for writers, read fresh: a cached meta may
+    still name a generation the re-ranker has replaced.
+    """
+    try:
+        res = connect().coll.lookup_in(thread_doc_id(video_id), [SD.get("hot_gen"), SD.get("hot_cfg")])
+        return {"hot_gen": int(res.content_as[int](0)), "hot_cfg": list(res.content_as[list](1))}
+    except (DocumentNotFoundException, PathNotFoundException):
+        return {}
+
+
+def _rank_entries(c: dict, score: int, hot: Optional[dict] = None) -> list[tuple[str, str, int]]:
+    """
+    Where a comment with this score sits in each ranked index: [(rank, bucket key, value)].
+    The hot index is left out for replies and without `hot` (hot_gen/hot_cfg of the thread).
+    """
+    out = [(RANK_TOP, _rank_key(score, int(c.get("seg", 0) or 0)), int(score))]
+    if hot and hot.get("hot_cfg") and not (c.get("parent_id", "") or ""):
+        out.append((RANK_HOT,) + _hot_entry(c, score, hot))
+    return out
+
+
+def _rank_key_order(key: str) -> tuple[int, int]:
+    band, chunk = key.split("_")
+    return int(band), int(chunk)
+
+
+def _rank_head_path(key: str, field_name: str, rank: str = RANK_TOP) -> str:
+    return f"{'hot_segs' if rank == RANK_HOT else 'rank_segs'}.{key}.{field_name}"
+
+
+def _rank_sizes(heads: dict, include_deleted: bool, gen: Optional[int] = None) -> list[tuple[str, int]]:
+    """Rank head -> [(bucket key, visible ids)], best bucket first; only chunk `gen` if given."""
+    out = []
+    for key in sorted(heads or {}, key=_rank_key_order, reverse=True):
+        if gen is not None and _rank_key_order(key)[1] != gen:
+            continue
+        h = heads[key]
+        n = int(h.get("n", 0) or 0) - (0 if include_deleted else int(h.get("del", 0) or 0))
+        out.append((key, max(n, 0)))
+    return out
+
+
+@traced("filter.rank", profile_cfg.enabled)
+def _rank_items(doc: dict, include_deleted: bool) -> list[tuple[int, int, str]]:
+    deleted = doc.get("del", {}) or {}
+    items = [
+        (int(v[0]), int(v[1]), cid) for cid, v in (doc.get("items", {}) or {}).items()
+        if include_deleted or cid not in deleted
+    ]
+    items.sort(reverse=True)
+    return items
+
+
+def _rank_cursor_key(tok: Union[PageCursor, int], rank: str = RANK_TOP, gen: int = 0) -> Optional[str]:
+    """Bucket a rank page token needs read to be resolved; None for offsets and other cursors."""
+    if not (isinstance(tok, PageCursor) and tok.rank == rank and len(tok.key) == 4):
+        return None
+    # a hot cursor resumes in the current generation
+    chunk = int(gen) if rank == RANK_HOT else int(tok.key[1])
+    return f"{int(tok.key[0])}_{chunk}"
+
+
+def _rank_offset(
+    tok: Union[PageCursor, int],
+    heads: dict,
+    doc: Optional[dict],
+    include_deleted: bool,
+    rank: str = RANK_TOP,
+    gen: Optional[int] = None,
+) -> int:
+    """Offset of the first item after the token; `doc` is the bucket of _rank_cursor_key(tok)."""
+    key = _rank_cursor_key(tok, rank, gen or 0)
+    if key is None:
+        return tok if isinstance(tok, int) else 0
+
+    order = _rank_key_order(key)
+    value, seq = int(tok.key[2]), int(tok.key[3])
+    sizes = _rank_sizes(heads, include_deleted, gen)
+    before = sum(sz for k, sz in sizes if _rank_key_order(k) > order)
+    size = next((sz for k, sz in sizes if k == key), 0)
+    within = sum(1 for v, q, _ in _rank_items(doc or {}, include_deleted) if (v, q) >= (value, seq))
+    return before + min(within, size)
+
+
+def _rank_page_items(
+    plan: list[tuple[str, int]],
+    docs: list[dict],
+    page_size: int,
+    include_deleted: bool,
+) -> list[tuple[str, int, int, str]]:
+    """One page as [(bucket key, value, seq, comment_id)]."""
+    out: list[tuple[str, int, int, str]] = []
+    for (key, skip), doc in zip(plan, docs):
+        if len(out) >= page_size:
+            break
+        for value, seq, cid in _rank_items(doc, include_deleted)[skip: skip + page_size - len(out)]:
+            out.append((key, value, seq, cid))
+    return out
+
+
+def _rank_next_token(
+    items: list[tuple[str, int, int, str]],
+    offset: int,
+    total: int,
+    ver: int,
+    rank: str = RANK_TOP,
+) -> str:
+    if not items or offset + len(items) >= total:
+        return ""
+    key, value, seq, _ = items[-1]
+    band, chunk = _rank_key_order(key)
+    return encode_cursor(PageCursor(newest_first=True, key=(band, chunk, value, seq), ver=int(ver), rank=rank))
+
+
+def _rank_segs_reads(
+    video_id: str,
+    parent_id: str,
+    keys: list[str],
+    e: Optional[_CachedThread] = None,
+    cas: int = 0,
+    rank: str = RANK_TOP,
+) -> Reads:
+    dids = [rank_seg_doc_id(video_id, parent_id, k, rank) for k in keys]
+    found = _cached_docs(e, dids)
+    if len(found) < len(dids):
+        yield from _fill_docs(video_id, dids, e, cas, found)
+    return [found.get(did) or _empty_rank_seg(video_id, parent_id, k) for did, k in zip(dids, keys)]
+
+
+def _rank_page_reads(
+    video_id: str,
+    parent_id: str,
+    heads: dict,
+    page_token: str,
+    page_size: int,
+    include_deleted: bool,
+    ver: int,
+    e: Optional[_CachedThread] = None,
+    cas: int = 0,
+    rank: str = RANK_TOP,
+    gen: Optional[int] = None,
+) -> Reads:
+    """_index_page_reads for a ranked index (hot: pass the generation). Returns (ids, next_token)."""
+    tok = decode_page_token(page_token)
+    key = _rank_cursor_key(tok, rank, gen or 0)
+    doc = (yield from _rank_segs_reads(video_id, parent_id, [key], e, cas, rank))[0] if key is not None else None
+    offset = _rank_offset(tok, heads, doc, include_deleted, rank, gen)
+
+    sizes = _rank_sizes(heads, include_deleted, gen)
+    plan = _span_plan(sizes, offset, page_size)
+    docs = yield from _rank_segs_reads(video_id, parent_id, [k for k, _ in plan], e, cas, rank)
+    items = _rank_page_items(plan, docs, page_size, include_deleted)
+    total = sum(sz for _, sz in sizes)
+    return [cid for _, _, _, cid in items], _rank_next_token(items, offset, total, ver, rank)
+
+
+def _rank_add(video_id: str, parent_id: str, key: str, entries: dict[str, list], rank: str = RANK_TOP) -> None:
+    """
+    Entries of new comments (comment_id -> [value, seq, 0]).
+    Runs before the comment docs exist, so no vote can have moved them yet.
+    """
+    ctx = connect()
+    did = rank_seg_doc_id(video_id, parent_id, key, rank)
+    cids = list(entries)
+    for i in range(0, len(cids), _MAX_SPECS):
+        specs = [SD.upsert(f"items.{cid}", entries[cid]) for cid in cids[i:i + _MAX_SPECS]]
+        try:
+            ctx.coll.mutate_in(did, specs)
+            continue
+        except DocumentNotFoundException:
+            pass
+        try:
+            ctx.coll.insert(did, _empty_rank_seg(video_id, parent_id, key))
+        except DocumentExistsException:
+            pass
+        ctx.coll.mutate_in(did, specs)
+
+
+def _rewrite_rank_seg(video_id: str, parent_id: str, key: str, fn, rank: str = RANK_TOP) -> tuple[dict, dict]:
+    """
+    CAS read-modify-write of a bucket; fn(doc) edits it in place and returns
+    its head deltas, or None when there is nothing to change.
+    Returns (head deltas by path, cache docs to drop). Rewritten buckets are
+    dropped from the cache: writers that are not group-committed may publish
+    them out of order.
+    """
+    ctx = connect()
+    did = rank_seg_doc_id(video_id, parent_id, key, rank)
+
+    def op():
+        try:
+            res = ctx.coll.get(did)
+            doc, cas = res.content_as[dict], res.cas
+        except DocumentNotFoundException:
+            doc, cas = _empty_rank_seg(video_id, parent_id, key), 0
+        doc.setdefault("items", {})
+        doc.setdefault("del", {})
+        doc.setdefault("moved", {})
+        deltas = fn(doc)
+        if deltas is None:
+            return {}, {}
+        if cas:
+            ctx.coll.replace(did, doc, cas=cas)
+        else:
+            ctx.coll.insert(did, doc)
+        return {_rank_head_path(key, f, rank): d for f, d in deltas.items() if d}, {did: None}
+
+    return _retry_cas(op, video_id)
+
+
+def _rank_seen(doc: dict, comment_id: str) -> int:
+    """Newest rank version of the comment this bucket has applied, -1 if none."""
+    cur = (doc.get("items", {}) or {}).get(comment_id)
+    seen = -1 if cur is None else int(cur[2]) if len(cur) > 2 else 0
+    return max(seen, int((doc.get("moved", {}) or {}).get(comment_id, -1)))
+
+
+def _rank_shift(
+    video_id: str,
+    parent_id: str,
+    rank: str,
+    comment_id: str,
+    seq: int,
+    src: str,
+    dst: str,
+    value: int,
+    ver: int,
+    deleted: bool,
+) -> tuple[dict, dict]:
+    """
+    Move one entry from bucket src to bucket dst with its new value, as rank
+    version `ver`. A bucket ignores versions older than what it has seen and
+    remembers departures in "moved", so concurrent or reordered moves still
+    leave exactly one entry, in the bucket of the newest value.
+    Returns (head deltas by path, cache docs to drop).
+    """
+    flag = [deleted]
+
+    def leave(doc: dict) -> Optional[dict]:
+        if _rank_seen(doc, comment_id) >= ver:
+            return None
+        doc["moved"][comment_id] = ver
+        gone = doc["items"].pop(comment_id, None) is not None
+        was_del = doc["del"].pop(comment_id, None) is not None
+        flag[0] = flag[0] or was_del
+        return {"n": -int(gone), "del": -int(was_del)}
+
+    def enter(doc: dict) -> Optional[dict]:
+        if _rank_seen(doc, comment_id) >= ver:
+            return None
+        doc["moved"].pop(comment_id, None)
+        added = comment_id not in doc["items"]
+        doc["items"][comment_id] = [int(value), int(seq), int(ver)]
+        mark = flag[0] and comment_id not in doc["del"]
+        if mark:
+            doc["del"][comment_id] = True
+        return {"n": int(added), "del": int(mark)}
+
+    deltas: dict[str, int] = {}
+    docs: dict[str, None] = {}
+    for key, fn in (((src, leave),) if src != dst else ()) + ((dst, enter),):
+        d, dropped = _rewrite_rank_seg(video_id, parent_id, key, fn, rank)
+        docs.update(dropped)
+        for p, n in d.items():
+            deltas[p] = deltas.get(p, 0) + n
+    return deltas, docs
+
+
+def _rank_flag(video_id: str, parent_id: str, rank: str, key: str, comment_id: str, deleted: bool) -> tuple[dict, dict]:
+    """Set an entry's soft-delete flag. Returns (head deltas, cache docs to drop)."""
+    def fn(doc: dict) -> Optional[dict]:
+        if comment_id not in doc["items"] or (comment_id in doc["del"]) == deleted:
+            return None
+        if deleted:
+            doc["del"][comment_id] = True
+        else:
+            doc["del"].pop(comment_id)
+        return {"del": 1 if deleted else -1}
+
+    return _rewrite_rank_seg(video_id, parent_id, key, fn, rank)
+
+
+def _rank_drop(video_id: str, parent_id: str, rank: str, key: str, comment_id: str) -> tuple[dict, dict]:
+    """Remove an entry. Returns (head deltas, cache docs to drop)."""
+    def fn(doc: dict) -> Optional[dict]:
+        if comment_id not in doc["items"]:
+            return None
+        doc["items"].pop(comment_id)
+        return {"n": -1, "del": -int(doc["del"].pop(comment_id, None) is not None)}
+
+    return _rewrite_rank_seg(video_id, parent_id, key, fn, rank)
+
+
+def _merge_rank(acc: tuple[dict, dict], res: tuple[dict, dict]) -> tuple[dict, dict]:
+    """Accumulate (head deltas, cache docs to drop) results."""
+    for p, n in res[0].items():
+        acc[0][p] = acc[0].get(p, 0) + n
+    acc[1].update(res[1])
+    return acc
+
+
+def _rank_move(
+    video_id: str,
+    c: dict,
+    old_score: int,
+    new_score: int,
+    ver: int,
+    hot: Optional[dict] = None,
+) -> tuple[dict, dict]:
+    """
+    Re-rank a comment in every ranked index after its score counter moved
+    from old_score to new_score as rank version `ver` (bumped by the same
+    mutation). Returns (head deltas by path, cache docs to drop).
+    """
+    parent_id = c.get("parent_id", "") or ""
+    seq = int(c.get("seq", 0) or 0)
+    deleted = bool(c.get("is_deleted", False))
+    acc: tuple[dict, dict] = ({}, {})
+    for (rank, src, _), (_, dst, value) in zip(_rank_entries(c, old_score, hot), _rank_entries(c, new_score, hot)):
+        _merge_rank(acc, _rank_shift(video_id, parent_id, rank, c["id"], seq, src, dst, value, ver, deleted))
+    return acc
+
+
+def _rank_set_deleted(video_id: str, c: dict, deleted: bool, hot: Optional[dict] = None) -> tuple[dict, dict]:
+    """Mirror the soft-delete flag into the ranked indexes. Returns (head deltas, cache docs to drop)."""
+    parent_id = c.get("parent_id", "") or ""
+    acc: tuple[dict, dict] = ({}, {})
+    for rank, key, _ in _rank_entries(c, _score(c), hot):
+        _merge_rank(acc, _rank_flag(video_id, parent_id, rank, key, c["id"], deleted))
+    return acc
+
+
+def _rank_remove(video_id: str, c: dict, hot: Optional[dict] = None) -> tuple[dict, dict]:
+    """Drop a hard-deleted comment from the ranked indexes. Returns (head deltas, cache docs to drop)."""
+    parent_id = c.get("parent_id", "") or ""
+    acc: tuple[dict, dict] = ({}, {})
+    for rank, key, _ in _rank_entries(c, _score(c), hot):
+        _merge_rank(acc, _rank_drop(video_id, parent_id, rank, key, c["id"]))
+    return acc
+
+
+def _index_slots(video_id: str, parent_id: str, heads: dict) -> list[tuple[int, int, str]]:
+    """Every comment of an index, soft-deleted ones too: [(segment, seq, comment_id)] in creation order."""
+    seg_nums = sorted(int(k) for k in heads or {})
+    segs = _get_many([index_seg_doc_id(video_id, parent_id, n) for n in seg_nums])
+    return [
+        (n, seq, cid)
+        for n in seg_nums
+        for seq, cid in _segment_items(segs.get(index_seg_doc_id(video_id, parent_id, n)) or {}, False, True)
+    ]
+
+
+def _build_hot(video_id: str, thread: dict) -> tuple[dict, dict]:
+    """
+    Write the hot index generation thread["hot_gen"] under thread["hot_cfg"]
+    from the top-level index and the comment docs.
+    Returns (head, {comment_id: (bucket key, rank version, deleted)}).
+    """
+    ctx = connect()
+    slots = _index_slots(video_id, "", thread.get("top_segs", {}) or {})
+    comments = _get_many([comment_doc_id(video_id, cid) for _, _, cid in slots])
+    buckets: dict[str, dict] = {}
+    built: dict[str, tuple[str, int, bool]] = {}
+    for _, seq, cid in slots:
+        c = comments.get(comment_doc_id(video_id, cid))
+        if c is None:
+            continue
+        key, value = _hot_entry(c, _score(c), thread)
+        ver = int(c.get("rank_ver", 0) or 0)
+        deleted = bool(c.get("is_deleted", False))
+        doc = buckets.setdefault(key, _empty_rank_seg(video_id, "", key))
+        doc["items"][cid] = [value, seq, ver]
+        if deleted:
+            doc["del"][cid] = True
+        built[cid] = (key, ver, deleted)
+
+    for key, doc in buckets.items():
+        ctx.coll.upsert(rank_seg_doc_id(video_id, "", key, RANK_HOT), doc)
+    head = {key: {"n": len(doc["items"]), "del": len(doc["del"])} for key, doc in buckets.items()}
+    return head, built
+
+
+def rerank_hot(video_id: str) -> bool:
+    """
+    Rebuild a thread's hot index under the configured decay parameters as a
+    new generation, swapped in by one meta mutation. Writes that raced the
+    build (they went to the old generation) are replayed onto the new one
+    from the comment docs, then the old generation's buckets are removed.
+    False when the index was already built with these parameters.
+    """
+    ctx = connect()
+    meta, _, _ = _thread_entry(video_id)
+    params = _hot_params()
+    if meta.get("hot_cfg") == params:
+        return False
+    gen = int(meta.get("hot_gen", 0) or 0) + 1
+    old_keys = list(meta.get("hot_segs", {}) or {})
+    hot = {"hot_gen": gen, "hot_cfg": params}
+
+    head, built = _build_hot(video_id, dict(meta, **hot))
+    _mutate_thread(
+        video_id,
+        sets=dict(hot, hot_segs=head),
+        docs={rank_seg_doc_id(video_id, "", k, RANK_HOT): None for k in head},
+    )
+
+    meta, _, _ = _thread_entry(video_id)
+    slots = _index_slots(video_id, "", meta.get("top_segs", {}) or {})
+    comments = _get_many([comment_doc_id(video_id, cid) for _, _, cid in slots])
+    acc: tuple[dict, dict] = ({}, {})
+    for _, seq, cid in slots:
+        c = comments.get(comment_doc_id(video_id, cid))
+        if c is None:
+            continue
+        key, value = _hot_entry(c, _score(c), hot)
+        ver = int(c.get("rank_ver", 0) or 0)
+        deleted = bool(c.get("is_deleted", False))
+        was = built.get(cid)
+        if was is None or ver > was[1]:
+            _merge_rank(acc, _rank_shift(video_id, "", RANK_HOT, cid, seq, was[0] if was else key, key, value, ver, deleted))
+        elif deleted != was[2]:
+            _merge_rank(acc, _rank_flag(video_id, "", RANK_HOT, key, cid, deleted))
+    for cid, (key, _, _) in built.items():
+        if comment_doc_id(video_id, cid) not in comments:
+            _merge_rank(acc, _rank_drop(video_id, "", RANK_HOT, key, cid))
+    if acc[0] or acc[1]:
+        _mutate_thread(video_id, acc[0], docs=acc[1])
+
+    for key in old_keys:
+        if _rank_key_order(key)[1] != gen:
+            try:
+                ctx.coll.remove(rank_seg_doc_id(video_id, "", key, RANK_HOT))
+            except DocumentNotFoundException:
+                pass
+    log.info("re-ranked hot index of %s: generation %d, %d comments", video_id, gen, len(built))
+    return True
+
+
+_hot_stale: set[str] = set()
+_hot_stale_lock = threading.Lock()
+
+
+def _check_hot(video_id: str, thread: dict) -> None:
+    """HOT reads: queue the thread for the re-ranker if its index has other decay parameters."""
+    if thread.get("hot_cfg") != _hot_params():
+        with _hot_stale_lock:
+            _hot_stale.add(video_id)
+
+
+def run_hot_reranker(stop: threading.Event) -> None:
+    """Every rerank_interval_sec until `stop` is set: re-rank the hot indexes reads found stale."""
+    interval = max(float(hot_cfg.rerank_interval_sec or 0), 0.1)
+    while not stop.wait(interval):
+        with _hot_stale_lock:
+            pending = sorted(_hot_stale)
+            _hot_stale.clear()
+        for video_id in pending:
+            try:
+                rerank_hot(video_id)
+            except Exception as e:
+                log.warning("hot re-rank of %s failed: %s", video_id, e)
+
+
+def start_hot_reranker(stop: threading.Event) -> Optional[threading.Thread]:
+    if float(hot_cfg.rerank_interval_sec or 0) <= 0:
+        return None
+    t = threading.Thread(target=run_hot_reranker, args=(stop,), name="hot-reranker", daemon=True)
+    t.start()
+    return t
+
+
+def _top_total(thread: dict, include_deleted: bool) -> int:
+    counts = thread.get("counts", {}) or {}
+    return max(int(counts.get("top" if include_deleted else "top_live", 0) or 0), 0)
+
+
+def _replies_total(parent: dict, include_deleted: bool) -> int:
+    return max(int(parent.get("reply_count" if include_deleted else "reply_live", 0) or 0), 0)
+
+
+# ---------------------------
+# Thread events. Writes publish what they changed to thread_events (topic =
+# video id) once the thread doc is bumped; WatchThread streams subscribe to it.
+# All watchers of a video in this process share one delivery per event batch;
+# the hub's broker decides which other processes see the events.
+# ---------------------------
+
+thread_events = Hub(LocalBroker(), watch_cfg.queue_size)
+
+
+def _publish(video_id: str, events: list[dict]) -> None:
+    """The writes are done by now: a failing broker is logged, not raised to the writer."""
+    try:
+        thread_events.publish(video_id, events)
+    except Exception:
+        log.exception("publishing %d events of %s failed", len(events), video_id)
+
+
+def _write_events(video_id: str, ops: list[tuple[str, Any]], out: list) -> list[dict]:
+    """Events of a write batch; votes collapse to the final tally per comment."""
+    events = []
+    tallies: dict[str, tuple[int, int, int]] = {}
+    for (kind, args), r in zip(ops, out):
+        if r is None or isinstance(r, Exception):
+            continue
+        if kind == "create":
+            events.append(_event(EVENT_CREATED, video_id, r))
+        elif kind == "edit":
+            events.append(_event(EVENT_EDITED, video_id, r))
+        elif kind == "vote":
+            tallies[args[1]] = r
+    for comment_id, (likes, dislikes, _) in tallies.items():
+        events.append(_event(EVENT_VOTED, video_id, comment_id=comment_id, likes=likes, dislikes=dislikes))
+    return events
+
+
+def watch_thread(video_id: str, loop: Optional[Any] = None) -> Subscription:
+    """Subscribe to a video's events; pass the event loop when reading with aget()."""
+    return thread_events.subscribe(video_id, loop)
+
+
+def watch_stats() -> dict[str, float]:
+    return thread_events.stats()
+
+
+def create_comment(
+    video_id: str,
+    parent_id: str,
+    comment_id: str,
+    content_raw: str,
+    user_uid: str,
+    username: str,
+    channel_id: str,
+    idempotency_key: str = "",
+) -> dict:
+    """
+    With an idempotency_key only the first request for it (per video and user)
+    creates the comment; repeats return that comment as it is now, see _create_once.
+    """
+    fields = {
+        "parent_id": parent_id or "",
+        "comment_id": comment_id,
+        "content_raw": content_raw,
+        "user_uid": user_uid,
+        "username": username,
+        "channel_id": channel_id,
+    }
+    if idempotency_key:
+        return _create_once(video_id, idempotency_key, fields)
+    return _submit_write(video_id, "create", fields)
+
+
+# ---------------------------
+# Idempotent creates. The first request for a key inserts its idem:: doc
+# (pending, with the comment id it is about to create) and marks it done once
+# the comment exists; later requests for the key read it instead of writing.
+# Finished keys are also kept in a local LRU, so a retry landing on the same
+# process costs one comment get. The doc stores a fingerprint of the request,
+# so a key reused for a different comment is refused instead of answered
+# with the wrong one.
+# ---------------------------
+
+_idem_cache = LruCache(
+    max_entries=write_cfg.idempotency_cache_entries,
+    ttl_sec=write_cfg.idempotency_ttl_sec,
+)
+
+
+def _idem_fingerprint(fields: dict) -> str:
+    return hashlib.sha1(f"{fields['parent_id']}\0{fields['content_raw']}".encode("utf-8")).hexdigest()[:16]
+
+
+def _idem_replay(video_id: str, comment_id: str, fp: str, want: str) -> dict:
+    if fp != want:
+        raise ValueError("idempotency_key_reused")
+    c, _ = _get_comment(video_id, comment_id)  # KeyError("not_found") if hard-deleted since
+    return c
+
+
+def _create_once(video_id: str, key: str, fields: dict) -> dict:
+    ctx = connect()
+    did = idem_doc_id(video_id, fields["user_uid"], key)
+    fp = _idem_fingerprint(fields)
+    hit = _idem_cache.get(did)
+    if hit is not None:
+        return _idem_replay(video_id, hit[0], hit[1], fp)
+
+    ttl = timedelta(seconds=max(float(write_cfg.idempotency_ttl_sec), 1.0))
+    rec = {
+        "type": "idempotency",
+        "video_id": video_id,
+        "user_uid": fields["user_uid"],
+        "comment_id": fields["comment_id"],
+        "fp": fp,
+        "done": False,
+        "created_at": _now_ms(),
+    }
+    deadline = time.monotonic() + max(float(write_cfg.idempotency_wait_sec), 0.0)
+    delay = 0.01
+    while True:
+        try:
+            ctx.coll.insert(did, rec, expiry=ttl)
+            break
+        except DocumentExistsException:
+            pass
+        try:
+            res = ctx.coll.get(did)
+        except DocumentNotFoundException:
+            continue  # the first request failed and released the key
+        other = res.content_as[dict]
+        if other.get("done"):
+            _idem_cache.put(did, (other["comment_id"], other.get("fp", "")))
+            return _idem_replay(video_id, other["comment_id"], other.get("fp", ""), fp)
+        if other.get("fp", "") != fp:
+            raise ValueError("idempotency_key_reused")
+        if _now_ms() - int(other.get("created_at", 0) or 0) >= write_cfg.idempotency_stale_sec * 1000:
+            try:
+                c, _ = _get_comment(video_id, other["comment_id"])
+            except KeyError:
+                c = None
+            if c is not None:  # created, died before marking the key done
+                ctx.coll.upsert(did, dict(other, done=True), expiry=ttl)
+                _idem_cache.put(did, (other["comment_id"], fp))
+                return c
+            try:
+                ctx.coll.replace(did, rec, cas=res.cas, expiry=ttl)
+                break
+            except (CasMismatchException, DocumentNotFoundException):
+                continue
+        if time.monotonic() >= deadline:
+            raise TimeoutError("idempotency_key_in_flight")
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+
+    try:
+        c = _submit_write(video_id, "create", fields)
+    except Exception:
+        try:
+            ctx.coll.remove(did)
+        except CouchbaseException:
+            pass  # expires with its TTL
+        raise
+    ctx.coll.upsert(did, dict(rec, done=True), expiry=ttl)
+    _idem_cache.put(did, (fields["comment_id"], fp))
+    return c
+
+
+def _top_page_reads(
+    video_id: str,
+    thread: dict,
+    page_token: str,
+    page_size: int,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str,
+    e: Optional[_CachedThread],
+    cas: int,
+) -> Reads:
+    """One page of top-level comment ids from the index `rank` selects. Returns (ids, next_token)."""
+    ver = int(thread.get("ver", 0) or 0)
+    if rank == RANK_TOP:
+        return (yield from _rank_page_reads(
+            video_id, "", thread.get("rank_segs", {}) or {}, page_token, page_size, include_deleted, ver, e, cas,
+        ))
+    if rank == RANK_HOT:
+        _check_hot(video_id, thread)
+        return (yield from _rank_page_reads(
+            video_id, "", thread.get("hot_segs", {}) or {}, page_token, page_size, include_deleted, ver, e, cas,
+            RANK_HOT, int(thread.get("hot_gen", 0) or 0),
+        ))
+    ids, next_token, _ = yield from _index_page_reads(
+        video_id, "", thread.get("top_segs", {}) or {}, page_token, page_size,
+        newest_first, include_deleted, ver, e, cas,
+    )
+    return ids, next_token
+
+
+def list_top_reads(
+    video_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    ver: Optional[int] = None,
+) -> Reads:
+    thread, e, cas = yield from _thread_entry_reads(video_id, ver)
+    ids, next_token = yield from _top_page_reads(
+        video_id, thread, page_token, page_size, newest_first, include_deleted, rank, e, cas,
+    )
+    comments = yield from _comments_reads(video_id, ids, e, cas)
+    return comments, next_token, _top_total(thread, include_deleted)
+
+
+def list_top(
+    video_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    ver: Optional[int] = None,
+) -> tuple[list[dict], str, int]:
+    """rank: "" for creation order (newest_first), RANK_TOP or RANK_HOT for a ranked index."""
+    return run_reads(list_top_reads(video_id, page_size, page_token, newest_first, include_deleted, rank, ver))
+
+
+def list_replies_reads(
+    video_id: str,
+    parent_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    ver: Optional[int] = None,
+) -> Reads:
+    parent_id = parent_id or ""
+    thread, e, cas = yield from _thread_entry_reads(video_id, ver)
+    parents = yield from _comments_reads(video_id, [parent_id], e, cas)
+    if not parents:
+        return [], "", 0
+    parent = parents[0]
+
+    ver = int(thread.get("ver", 0) or 0)
+    if rank in (RANK_TOP, RANK_HOT):
+        ids, next_token = yield from _rank_page_reads(
+            video_id, parent_id, parent.get("rank_segs", {}) or {}, page_token, page_size, include_deleted, ver, e, cas,
+        )
+    else:
+        ids, next_token, _ = yield from _index_page_reads(
+            video_id, parent_id, parent.get("reply_segs", {}) or {}, page_token, page_size,
+            newest_first, include_deleted, ver, e, cas,
+        )
+    replies = yield from _comments_reads(video_id, ids, e, cas)
+    return replies, next_token, _replies_total(parent, include_deleted)
+
+
+def list_replies(
+    video_id: str,
+    parent_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    ver: Optional[int] = None,
+) -> tuple[list[dict], str, int]:
+    """Replies have no hot index: RANK_HOT lists them like RANK_TOP."""
+    return run_reads(list_replies_reads(
+        video_id, parent_id, page_size, page_token, newest_first, include_deleted, rank, ver,
+    ))
+
+
+def _preview_plans(
+    video_id: str,
+    parents: list[dict],
+    page_size: int,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str,
+) -> dict[str, tuple[list[tuple[Any, int]], int, list[str]]]:
+    """
+    First reply page of each parent, planned from the heads in its doc:
+    {parent_id: (plan, total, index doc ids the page spans)}.
+    """
+    live = not include_deleted
+    out = {}
+    for p in parents:
+        pid = p["id"]
+        if rank:
+            sizes = _rank_sizes(p.get("rank_segs", {}) or {}, include_deleted)
+            plan = _span_plan(sizes, 0, page_size)
+            total = sum(sz for _, sz in sizes)
+            dids = [rank_seg_doc_id(video_id, pid, k) for k, _ in plan]
+        else:
+            plan, total = _page_plan(p.get("reply_segs", {}) or {}, 0, page_size, newest_first, include_deleted)
+            dids = [_seg_doc_id(video_id, pid, n, live) for n, _ in plan]
+        out[pid] = (plan, total, dids)
+    return out
+
+
+def _preview_pages(
+    plans: dict[str, tuple[list[tuple[Any, int]], int, list[str]]],
+    docs: dict[str, dict],
+    page_size: int,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str,
+    ver: int,
+) -> dict[str, tuple[list[str], str]]:
+    """Resolve _preview_plans with the index docs read for them: {parent_id: (reply ids, next_token)}."""
+    out = {}
+    for pid, (plan, total, dids) in plans.items():
+        segs = [docs.get(did) or {} for did in dids]
+        if rank:
+            items = _rank_page_items(plan, segs, page_size, include_deleted)
+            out[pid] = ([cid for _, _, _, cid in items], _rank_next_token(items, 0, total, ver))
+        else:
+            items = _page_items(plan, segs, page_size, newest_first, include_deleted)
+            out[pid] = ([cid for _, _, cid in items], _next_token(items, 0, total, newest_first, ver))
+    return out
+
+
+def list_top_with_replies_reads(
+    video_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    replies_per_comment: int = 3,
+    reply_newest_first: bool = False,
+    reply_rank: str = "",
+    user_uid: str = "",
+) -> Reads:
+    thread, e, cas = yield from _thread_entry_reads(video_id)
+    ids, next_token = yield from _top_page_reads(
+        video_id, thread, page_token, page_size, newest_first, include_deleted, rank, e, cas,
+    )
+    tops = yield from _comments_reads(video_id, ids, e, cas)
+
+    ver = int(thread.get("ver", 0) or 0)
+    parents = [c for c in tops if _replies_total(c, include_deleted)] if replies_per_comment > 0 else []
+    plans = _preview_plans(video_id, parents, replies_per_comment, reply_newest_first, include_deleted, reply_rank)
+    docs = yield from _docs_reads(video_id, [did for _, _, dids in plans.values() for did in dids], e, cas)
+    pages = _preview_pages(plans, docs, replies_per_comment, reply_newest_first, include_deleted, reply_rank, ver)
+    rids = [cid for rids, _ in pages.values() for cid in rids]
+    replies = {c["id"]: c for c in (yield from _comments_reads(video_id, rids, e, cas))}
+
+    items = []
+    for c in tops:
+        rids, reply_token = pages.get(c["id"], ([], ""))
+        items.append((c, [replies[r] for r in rids if r in replies], reply_token, _replies_total(c, include_deleted)))
+    votes: dict[str, int] = {}
+    if user_uid:
+        votes = yield from _user_votes_reads(video_id, user_uid, list(dict.fromkeys(ids + list(replies))))
+    return items, next_token, _top_total(thread, include_deleted), votes
+
+
+def list_top_with_replies(
+    video_id: str,
+    page_size: int,
+    page_token: str,
+    newest_first: bool,
+    include_deleted: bool,
+    rank: str = "",
+    replies_per_comment: int = 3,
+    reply_newest_first: bool = False,
+    reply_rank: str = "",
+    user_uid: str = "",
+) -> tuple[list[tuple[dict, list[dict], str, int]], str, int, dict[str, int]]:
+    """
+    A list_top page plus the first replies_per_comment replies of every
+    comment on it, from one thread meta read: the reply index docs of all
+    comments come in one bulk get and the replies in another. With user_uid,
+    also that user's votes on every returned comment.
+    Returns ([(comment, replies, replies next_token, replies total)], next_token, total, votes).
+    """
+    return run_reads(list_top_with_replies_reads(
+        video_id, page_size, page_token, newest_first, include_deleted, rank,
+        replies_per_comment, reply_newest_first, reply_rank, user_uid,
+    ))
+
+
+def _export_index_reads(
+    video_id: str, parent_id: str, heads: dict, include_deleted: bool, n: int, out: list[dict],
+) -> Reads:
+    """
+    Comments of an index in creation order into `out`, top-level ones each
+    followed by its replies; Emits `out` whenever it holds n. Reads one
+    segment and n comments at a time.
+    """
+    live = not include_deleted
+    for seg, size in enumerate(_visible_sizes(heads, include_deleted)):
+        if size <= 0:
+            continue
+        doc = (yield from _segments_reads(video_id, parent_id, [seg], None, 0, live))[0]
+        ids = [cid for _, cid in _segment_items(doc, False, include_deleted)]
+        for i in range(0, len(ids), n):
+            for c in (yield from _comments_reads(video_id, ids[i:i + n])):
+                out.append(c)
+                if len(out) >= n:
+                    yield Emit(out[:])
+                    out.clear()
+                if not parent_id and _replies_total(c, include_deleted):
+                    yield from _export_index_reads(
+                        video_id, c["id"], c.get("reply_segs", {}) or {}, include_deleted, n, out,
+                    )
+
+
+def export_thread_reads(video_id: str, include_deleted: bool, chunk_size: int = 500) -> Reads:
+    chunk_size = max(int(chunk_size or 0), 1)
+    thread, _, _ = yield from _thread_entry_reads(video_id)
+    out: list[dict] = []
+    yield from _export_index_reads(video_id, "", thread.get("top_segs", {}) or {}, include_deleted, chunk_size, out)
+    if out:
+        yield Emit(out)
+
+
+def export_thread(video_id: str, include_deleted: bool, chunk_size: int = 500) -> Iterator[list[dict]]:
+    """
+    Every comment of a video in chunks of chunk_size: top-level comments in
+    creation order, each followed by its replies. Indexes are walked one
+    segment at a time and comments read one chunk at a time, bypassing the
+    thread cache, so memory stays bounded however large the thread is. Not a
+    snapshot: comments written meanwhile may or may not be included.
+    """
+    return iter_reads(export_thread_reads(video_id, include_deleted, chunk_size))
+
+
+def edit_comment(video_id: str, comment_id: str, content_raw: str) -> dict:
+    return _submit_write(video_id, "edit", (comment_id, content_raw))
+
+
+def _rerender_comment(video_id: str, comment_id: str) -> bool:
+    did = comment_doc_id(video_id, comment_id)
+
+    def op() -> bool:
+        try:
+            c, cas = _get_comment(video_id, comment_id)
+        except KeyError:
+            return False
+        if c.get("is_deleted") or int(c.get("render_ver", 0) or 0) == RENDERER_VERSION:
+            return False
+        content_html, render_ver = render_content(c.get("content_raw", "") or "")
+        try:
+            connect().coll.mutate_in(
+                did,
+                [SD.upsert("content_html", content_html), SD.upsert("render_ver", render_ver)],
+                MutateInOptions(cas=cas),
+            )
+        except DocumentNotFoundException:
+            return False
+        return True
+
+    return _retry_cas(op, video_id)
+
+
+def rerender_thread(video_id: str) -> int:
+    """
+    Re-render content_html of the video's comments rendered by another
+    renderer version (or imported unrendered). Each comment is rewritten with
+    CAS, so an edit landing meanwhile wins; the thread version is bumped once
+    at the end so cached pages drop the old html. Returns comments rewritten.
+    """
+    changed = []
+    for chunk in export_thread(video_id, include_deleted=False):
+        for c in chunk:
+            if int(c.get("render_ver", 0) or 0) != RENDERER_VERSION and _rerender_comment(video_id, c["id"]):
+                changed.append(c["id"])
+    if changed:
+        _mutate_thread(video_id, docs={comment_doc_id(video_id, cid): None for cid in changed})
+    return len(changed)
+
+
+def stale_render_video_ids() -> list[str]:
+    """Videos with live comments rendered by another renderer version (N1QL)."""
+    q = (
+        f"SELECT DISTINCT RAW c.video_id FROM `{cb_cfg.bucket}`.`{cb_cfg.scope}`.`{cb_cfg.collection}` c "
+        "WHERE c.type = 'comment' AND c.is_deleted = false "
+        "AND (c.render_ver IS MISSING OR c.render_ver != $ver)"
+    )
+    res = connect().cluster.query(q, QueryOptions(named_parameters={"ver": RENDERER_VERSION}))
+    return [str(v) for v in res.rows() if v]
+
+
+def _set_index_deleted(video_id: str, c: dict, deleted: bool) -> tuple[dict, dict, dict]:
+    """
+    Mirror a comment's soft-delete flag into its index segment, the live
+    index and the ranked indexes. Inserting or removing del.<id> fails when the flag is already in
+    that state, so the live index and counters only move on a real transition.
+    Returns (thread deltas, cache docs, cache patches).
+    """
+    comment_id = c["id"]
+    parent_id = c.get("parent_id", "") or ""
+    seg = int(c.get("seg", 0) or 0)
+    seg_did = index_seg_doc_id(video_id, parent_id, seg)
+    flag = f"del.{comment_id}"
+
+    try:
+        if deleted:
+            connect().coll.mutate_in(seg_did, [SD.insert(flag, True, create_parents=True)])
+        else:
+            connect().coll.mutate_in(seg_did, [SD.remove(flag)])
+    except (PathExistsException, PathNotFoundException, DocumentNotFoundException):
+        return {}, {}, {}
+
+    if deleted:
+        live_doc = _live_remove(video_id, parent_id, seg, comment_id)
+    else:
+        live_doc = _live_insert(video_id, parent_id, seg, int(c.get("seq", 0) or 0), comment_id)
+    # the rewritten segment is dropped from the cache, not cached: deletes and
+    # restores are not group-committed and may publish out of order
+    docs = {live_seg_doc_id(video_id, parent_id, seg): None} if live_doc is not None else {}
+
+    delta = 1 if deleted else -1
+    heads, rank_docs = _rank_set_deleted(video_id, c, deleted, None if parent_id else _hot_index(video_id))
+    docs.update(rank_docs)
+    patches: dict[str, dict] = {seg_did: {flag: True if deleted else _REMOVED}}
+    heads[_head_path(parent_id, seg, "del")] = delta
+    if not parent_id:
+        heads["counts.top_live"] = -delta
+        return heads, docs, patches
+    heads["reply_live"] = -delta
+    try:
+        res = _mutate_comment(video_id, parent_id, [_counter(p, d) for p, d in heads.items()])
+        patches[comment_doc_id(video_id, parent_id)] = {
+            p: int(res.content_as[int](i)) for i, p in enumerate(heads)
+        }
+    except KeyError:
+        pass  # parent was hard-deleted
+    return {}, docs, patches
+
+
+def delete_comment(video_id: str, comment_id: str, hard_delete: bool) -> dict:
+    ctx = connect()
+    _ensure_thread(video_id)
+
+    if not hard_delete:
+        _mutate_comment(video_id, comment_id, [
+            SD.upsert("is_deleted", True),
+            SD.upsert("content_raw", ""),
+            SD.upsert("content_html", ""),
+            SD.upsert("updated_at", _now_ms()),
+        ])
+        c, _ = _get_comment(video_id, comment_id)
+        deltas, docs, patches = _set_index_deleted(video_id, c, True)
+        docs[comment_doc_id(video_id, comment_id)] = c
+        _mutate_thread(video_id, deltas, docs=docs, patches=patches)
+        _publish(video_id, [_event(EVENT_DELETED, video_id, c, hard=False)])
+        return c
+
+    c, _ = _get_comment(video_id, comment_id)
+    try:
+        ctx.coll.remove(comment_doc_id(video_id, comment_id))
+    except DocumentNotFoundException:
+        raise KeyError("not_found")
+    parent_id = c.get("parent_id", "") or ""
+    seg = int(c.get("seg", 0) or 0)
+    was_deleted = bool(c.get("is_deleted", False))
+    seg_did = index_seg_doc_id(video_id, parent_id, seg)
+
+    # tombstone instead of removing from items[]: no read, no CAS
+    specs = [SD.upsert(f"gone.{comment_id}", True, create_parents=True)]
+    if was_deleted:
+        specs.append(SD.remove(f"del.{comment_id}"))
+    try:
+        ctx.coll.mutate_in(seg_did, specs)
+    except PathNotFoundException:
+        ctx.coll.mutate_in(seg_did, specs[:1])
+        was_deleted = False
+    except DocumentNotFoundException:
+        pass
+    patches: dict[str, dict] = {seg_did: {f"gone.{comment_id}": True, f"del.{comment_id}": _REMOVED}}
+    docs: dict[str, Optional[dict]] = {comment_doc_id(video_id, comment_id): None}
+
+    head, rank_docs = _rank_remove(video_id, c, None if parent_id else _hot_index(video_id))
+    docs.update(rank_docs)
+    head[_head_path(parent_id, seg, "n")] = -1
+    if was_deleted:
+        head[_head_path(parent_id, seg, "del")] = -1
+    else:
+        if _live_remove(video_id, parent_id, seg, comment_id) is not None:
+            docs[live_seg_doc_id(video_id, parent_id, seg)] = None  # see _set_index_deleted
+        head["reply_live" if parent_id else "counts.top_live"] = -1
+    deltas = {"counts.total": -1}
+    if parent_id:
+        paths = ["reply_count"] + list(head)
+        try:
+            res = _mutate_comment(video_id, parent_id, [_counter(p, head.get(p, -1)) for p in paths])
+            patches[comment_doc_id(video_id, parent_id)] = {
+                p: max(int(res.content_as[int](i)), 0) for i, p in enumerate(paths)
+            }
+        except KeyError:
+            pass  # parent was hard-deleted
+    else:
+        deltas["counts.top"] = -1
+        deltas.update(head)
+    _mutate_thread(video_id, deltas, docs=docs, patches=patches)
+    _bump_counts(video_id, deltas.get("counts.top", 0), -1)
+
+    gone = {
+        "id": comment_id,
+        "video_id": video_id,
+        "parent_id": parent_id,
+        "content_raw": "",
+        "content_html": "",
+        "is_deleted": True,
+        "edited": True,
+        "created_at": int(c.get("created_at", 0) or 0),
+        "updated_at": _now_ms(),
+        "user_uid": c.get("user_uid", "") or "",
+        "username": c.get("username", "") or "",
+        "channel_id": c.get("channel_id", "") or "",
+        "reply_count": int(c.get("reply_count", 0) or 0),
+        "likes": int(c.get("likes", 0) or 0),
+        "dislikes": int(c.get("dislikes", 0) or 0),
+    }
+    _publish(video_id, [_event(EVENT_DELETED, video_id, gone, hard=True)])
+    return gone
+
+
+def restore_comment(video_id: str, comment_id: str) -> dict:
+    _ensure_thread(video_id)
+    _mutate_comment(video_id, comment_id, [
+        SD.upsert("is_deleted", False),
+        SD.upsert("updated_at", _now_ms()),
+    ])
+    c, _ = _get_comment(video_id, comment_id)
+    deltas, docs, patches = _set_index_deleted(video_id, c, False)
+    docs[comment_doc_id(video_id, comment_id)] = c
+    _mutate_thread(video_id, deltas, docs=docs, patches=patches)
+    _publish(video_id, [_event(EVENT_RESTORED, video_id, c)])
+    return c
+
+
+# ---------------------------
+# Counters. ccount::{video} holds copies of the thread's counts.top and
+# counts.total, bumped with counter ops by the create and hard-delete paths
+# right after the thread doc's, so GetCounts is one small get instead of a
+# thread read. Threads written before the counters existed get theirs from
+# tools/reconcile_counts.py or their next create/delete; until then reads
+# fall back to a sub-document lookup of the thread doc's counters (a v1 doc
+# has them at the same paths, so it is not migrated for this). Reads never write.
+# ---------------------------
+
+def _counts_doc(video_id: str, top: int, total: int) -> dict:
+    return {"type": "comment_counts", "video_id": video_id, "top": int(top), "total": int(total)}
+
+
+def _counts_of(doc: dict) -> tuple[int, int]:
+    return max(int(doc.get("top", 0) or 0), 0), max(int(doc.get("total", 0) or 0), 0)
+
+
+def _bump_counts(video_id: str, top: int, total: int) -> None:
+    """
+    Apply counter deltas to ccount::. A video without one yet is seeded from
+    its thread doc, which already has this write's deltas.
+    """
+    specs = [_counter(p, d) for p, d in (("top", top), ("total", total)) if d]
+    if not specs:
+        return
+    ctx = connect()
+    did = counts_doc_id(video_id)
+    try:
+        ctx.coll.mutate_in(did, specs)
+        return
+    except DocumentNotFoundException:
+        pass
+    try:
+        ctx.coll.insert(did, _counts_doc(video_id, *_thread_counts(video_id)))
+    except DocumentExistsException:
+        ctx.coll.mutate_in(did, specs)  # seeded meanwhile
+
+
+# v1 thread docs keep their counts at the same paths, so they are read as they are
+_COUNT_PATHS = ("counts.top", "counts.total")
+
+
+def _thread_counts_reads(video_ids: list[str]) -> Reads:
+    """(top, total) of each video from a sub-document lookup of its thread doc, in any layout; (0, 0) for unknown videos."""
+    if not video_ids:
+        return []
+    got = yield LookupIn([thread_doc_id(v) for v in video_ids], _COUNT_PATHS)
+    return [(0, 0) if g is None else (int(g[1][0] or 0), int(g[1][1] or 0)) for g in got]
+
+
+def _thread_counts(video_id: str) -> tuple[int, int]:
+    return run_reads(_thread_counts_reads([video_id]))[0]
+
+
+def get_counts_reads(video_id: str) -> Reads:
+    got = yield GetDoc(counts_doc_id(video_id))
+    if got is None:
+        return (yield from _thread_counts_reads([video_id]))[0]
+    return _counts_of(got[0])
+
+
+def get_counts(video_id: str) -> tuple[int, int]:
+    return run_reads(get_counts_reads(video_id))
+
+
+def batch_get_counts_reads(video_ids: list[str]) -> Reads:
+    ids = list(dict.fromkeys(video_ids))
+    docs = yield GetDocs([counts_doc_id(v) for v in ids])
+    out = {v: _counts_of(docs[counts_doc_id(v)]) for v in ids if counts_doc_id(v) in docs}
+    missing = [v for v in ids if v not in out]
+    out.update(zip(missing, (yield from _thread_counts_reads(missing))))
+    return {v: out[v] for v in ids}
+
+
+def batch_get_counts(video_ids: list[str]) -> dict[str, tuple[int, int]]:
+    """
+    get_counts of many videos: bulk gets of their ccount:: docs. Videos
+    without one are looked up in their thread docs (cb_cfg.multi_lookup_workers
+    in flight); unknown videos get (0, 0).
+    """
+    return run_reads(batch_get_counts_reads(video_ids))
+
+
+def reconcile_counts(video_id: str) -> tuple[int, int]:
+    """
+    Rewrite the video's ccount:: doc from its thread doc (CAS, so counter ops
+    landing meanwhile make it start over); returns the counts. A write whose
+    thread mutation is done but whose counter op is not yet can still leave
+    it off by that write: reconcile while writes are quiet, or twice.
+    """
+    ctx = connect()
+    did = counts_doc_id(video_id)
+
+    def op():
+        try:
+            cas = ctx.coll.get(did).cas
+        except DocumentNotFoundException:
+            cas = None
+        counts = _thread_counts(video_id)
+        if cas is not None:
+            ctx.coll.replace(did, _counts_doc(video_id, *counts), cas=cas)
+        elif counts != (0, 0):
+            ctx.coll.insert(did, _counts_doc(video_id, *counts))
+        return counts
+
+    return _retry_cas(op, video_id)
+
+
+# ---------------------------
+# Votes
+# ---------------------------
+
+def _get_user_vote(video_id: str, comment_id: str, user_uid: str) -> int:
+    ctx = connect()
+    did = vote_doc_id(video_id, comment_id, user_uid)
+    try:
+        res = ctx.coll.get(did)
+        doc = res.content_as[dict]
+        return int(doc.get("vote", 0) or 0)
+    except DocumentNotFoundException:
+        return 0
+    except Exception:
+        return 0
+
+
+def _set_user_vote(video_id: str, comment_id: str, user_uid: str, vote: int) -> None:
+    ctx = connect()
+    did = vote_doc_id(video_id, comment_id, user_uid)
+    ctx.coll.upsert(
+        did,
+        {
+            "type": "comment_vote",
+            "video_id": video_id,
+            "comment_id": comment_id,
+            "user_uid": user_uid,
+            "vote": int(vote),
+            "updated_at": _now_ms(),
+        },
+    )
+
+
+def _delete_vote_doc(video_id: str, comment_id: str, user_uid: str) -> None:
+    ctx = connect()
+    did = vote_doc_id(video_id, comment_id, user_uid)
+    try:
+        ctx.coll.remove(did)
+    except Exception:
+        pass
+
+
+def _norm_vote(v: Any) -> int:
+    try:
+        v = int(v or 0)
+    except Exception:
+        return 0
+    return v if v in (-1, 0, 1) else 0
+
+
+def _digests_complete_reads(video_id: str) -> Reads:
+    """
+    True if every vote of the video is also in its uvotes:: digests (threads
+    created with digests, or backfilled). The flag never goes back to False,
+    so a cached meta saying so needs no revalidation.
+    """
+    e = _thread_cache.peek(video_id)
+    if e is not None and e.meta.get("vote_digests"):
+        return True
+    got = (yield LookupIn([thread_doc_id(video_id)], ("vote_digests",)))[0]
+    if got is None:
+        return True  # no thread, no votes
+    return bool(got[1][0])
+
+
+def _user_votes_reads(video_id: str, user_uid: str, comment_ids: list[str]) -> Reads:
+    """One user's votes: from the digest once it is complete, else from the cvote:: docs."""
+    got = yield GetDoc(vote_digest_doc_id(video_id, user_uid))
+    digest = got[0] if got is not None else {}
+    if digest.get("complete") or (yield from _digests_complete_reads(video_id)):
+        votes = digest.get("votes", {}) or {}
+        return {cid: _norm_vote(votes.get(cid, 0)) for cid in comment_ids}
+
+    docs = yield GetDocs([vote_doc_id(video_id, cid, user_uid) for cid in comment_ids], strict=False)
+    return {
+        cid: _norm_vote((docs.get(vote_doc_id(video_id, cid, user_uid)) or {}).get("vote", 0))
+        for cid in comment_ids
+    }
+
+
+def _user_votes(video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+    return run_reads(_user_votes_reads(video_id, user_uid, comment_ids))
+
+
+def _set_user_votes(video_id: str, user_uid: str, votes: dict[str, int], complete: bool) -> None:
+    """Record votes in the user's digest (one sub-document mutation) and in the cvote:: docs."""
+    now = _now_ms()
+    specs = [
+        SD.upsert("type", "user_votes"),
+        SD.upsert("video_id", video_id),
+        SD.upsert("user_uid", user_uid),
+        SD.upsert("updated_at", now),
+    ]
+    if complete:
+        specs.append(SD.upsert("complete", True))
+    # 0 is stored too, so a backfill never resurrects an older vote
+    specs += [SD.upsert(f"votes.{cid}", int(v), create_parents=True) for cid, v in votes.items()]
+    connect().coll.mutate_in(
+        vote_digest_doc_id(video_id, user_uid),
+        specs,
+        MutateInOptions(store_semantics=SD.StoreSemantics.UPSERT),
+    )
+    for cid, v in votes.items():
+        _set_user_vote(video_id, cid, user_uid, v)
+
+
+def backfill_vote_digests(video_id: str, votes: list[dict]) -> int:
+    """
+    Build the video's digests from its cvote:: docs (`votes`: their contents),
+    then mark the thread as fully digested. Entries already in a digest are
+    newer than any cvote:: doc read before and are kept. Returns digests written.
+    """
+    ctx = connect()
+    by_user: dict[str, dict[str, int]] = {}
+    for v in votes:
+        uid = v.get("user_uid", "") or ""
+        cid = v.get("comment_id", "") or ""
+        if uid and cid:
+            by_user.setdefault(uid, {})[cid] = _norm_vote(v.get("vote", 0))
+
+    for uid, user_votes in by_user.items():
+        did = vote_digest_doc_id(video_id, uid)
+
+        def op():
+            try:
+                res = ctx.coll.get(did)
+            except DocumentNotFoundException:
+                ctx.coll.insert(did, {
+                    "type": "user_votes",
+                    "video_id": video_id,
+                    "user_uid": uid,
+                    "updated_at": _now_ms(),
+                    "complete": True,
+                    "votes": dict(user_votes),
+                })
+                return
+            doc = res.content_as[dict]
+            merged = dict(user_votes)
+            merged.update(doc.get("votes", {}) or {})
+            doc["votes"] = merged
+            doc["complete"] = True
+            ctx.coll.replace(did, doc, cas=res.cas)
+
+        _retry_cas(op, video_id)
+
+    _ensure_thread(video_id)
+    _mutate_thread(video_id, sets={"vote_digests": True})
+    return len(by_user)
+
+
+def get_my_votes_reads(video_id: str, user_uid: str, comment_ids: list[str]) -> Reads:
+    video_id = (video_id or "").strip()
+    user_uid = (user_uid or "").strip()
+    if not video_id or not user_uid or not comment_ids:
+        return {}
+
+    ids = list(dict.fromkeys(cid for cid in ((c or "").strip() for c in comment_ids) if cid))
+    return (yield from _user_votes_reads(video_id, user_uid, ids))
+
+
+def get_my_votes(video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+    """
+    One get of the user's vote digest; threads not backfilled yet fall back
+    to a bulk get of the cvote:: docs.
+    Returns dict: comment_id -> vote (-1/0/1)
+    """
+    return run_reads(get_my_votes_reads(video_id, user_uid, comment_ids))
+
+
+def apply_vote(video_id: str, user_uid: str, comment_id: str, vote: int) -> tuple[int, int, int]:
+    """
+    vote: -1,0,1
+    Returns: (likes, dislikes, my_vote)
+    """
+    if vote not in (-1, 0, 1):
+        raise ValueError("invalid vote")
+    return _submit_write(video_id, "vote", (user_uid, comment_id, int(vote)))
+
+
+# ---------------------------
+# Write batches: creates, edits and votes for one video are applied together.
+# A batch allocates sequence numbers/slots with one thread doc mutation and
+# publishes with one more, instead of two per write; comment, segment and
+# parent docs touched by several writes get one mutation each.
+# ---------------------------
+
+@dataclass
+class _ThreadWrite:
+    """What a batch changed: thread counter deltas and cache docs/patches for the publishing mutation."""
+    deltas: dict = field(default_factory=dict)
+    docs: dict = field(default_factory=dict)
+    patches: dict = field(default_factory=dict)
+    after: list = field(default_factory=list)  # callables run once the batch is published
+
+    def delta(self, path: str, n: int) -> None:
+        self.deltas[path] = self.deltas.get(path, 0) + int(n)
+
+    def patch(self, did: str, values: dict) -> None:
+        self.patches.setdefault(did, {}).update(values)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(any(self.deltas.values()) or self.docs or self.patches)
+
+
+def _create_many(video_id: str, reqs: list[dict], tw: _ThreadWrite) -> list:
+    out: list = [None] * len(reqs)
+    seg_size = _seg_size()
+
+    # reserve reply slots: one mutation per parent
+    pos: dict[int, int] = {}
+    by_parent: dict[str, list[int]] = {}
+    for i, r in enumerate(reqs):
+        if r["parent_id"]:
+            by_parent.setdefault(r["parent_id"], []).append(i)
+    for pid, idxs in by_parent.items():
+        k = len(idxs)
+        try:
+            res = _mutate_comment(video_id, pid, [
+                SD.increment("reply_count", k),
+                SD.increment("reply_len", k, create_parents=True),
+            ])
+        except KeyError:
+            for i in idxs:
+                out[i] = KeyError("parent_not_found")
+            continue
+        end = int(res.content_as[int](1))
+        for j, i in enumerate(idxs):
+            pos[i] = end - k + j
+        tw.patch(comment_doc_id(video_id, pid), {"reply_count": int(res.content_as[int](0)), "reply_len": end})
+
+    live = [i for i in range(len(reqs)) if out[i] is None]
+    if not live:
+        return out
+    tops = [i for i in live if not reqs[i]["parent_id"]]
+    vals = _mutate_thread(
+        video_id,
+        {"next_seq": len(live), "counts.total": len(live), "counts.top": len(tops), "top_len": len(tops)},
+        patches=tw.patches,
+    )
+    tw.patches = {}
+    _bump_counts(video_id, len(tops), len(live))
+    seq0 = vals["next_seq"] - len(live)
+    if tops:
+        top0 = vals["top_len"] - len(tops)
+        for j, i in enumerate(tops):
+            pos[i] = top0 + j
+
+    now = _now_ms()
+    docs: dict[str, dict] = {}
+    appends: dict[tuple[str, int], list] = {}
+    for j, i in enumerate(live):
+        r = reqs[i]
+        seq = seq0 + j
+        seg = pos[i] // seg_size
+        content_html, render_ver = render_content(r["content_raw"] or "")
+        c = {
+            "type": "comment",
+            "thread_id": thread_doc_id(video_id),
+            "id": r["comment_id"],
+            "video_id": video_id,
+            "parent_id": r["parent_id"],
+            "content_raw": r["content_raw"] or "",
+            "content_html": content_html,
+            "render_ver": render_ver,
+            "is_deleted": False,
+            "edited": False,
+            "created_at": now,
+            "updated_at": now,
+            "user_uid": r["user_uid"] or "",
+            "username": r["username"] or "",
+            "channel_id": r["channel_id"] or "",
+            "reply_count": 0,
+            "seq": seq,
+            "seg": seg,
+            # votes counters
+            "likes": 0,
+            "dislikes": 0,
+            "score": 0,
+            "rank_ver": 0,
+        }
+        docs[comment_doc_id(video_id, c["id"])] = c
+        appends.setdefault((r["parent_id"], seg), []).append([seq, c["id"]])
+        out[i] = c
+
+    hot = _hot_index(video_id) if tops else None
+    ranked: dict[tuple[str, str, str], dict[str, list]] = {}
+    for c in docs.values():
+        for rank, key, value in _rank_entries(c, 0, hot):
+            ranked.setdefault((rank, c["parent_id"], key), {})[c["id"]] = [value, c["seq"], 0]
+    for (rank, pid, key), entries in ranked.items():
+        _rank_add(video_id, pid, key, entries, rank)
+        tw.patch(rank_seg_doc_id(video_id, pid, key, rank), {f"items.{cid}": v for cid, v in entries.items()})
+
+    _write_many(docs, insert=True)
+    tw.docs.update(docs)
+
+    heads: dict[str, dict[str, int]] = {}  # parent id -> head deltas
+    for (pid, seg), items in appends.items():
+        for live in (False, True):
+            _append_to_segment(video_id, pid, seg, items, live)
+            tw.patch(_seg_doc_id(video_id, pid, seg, live), {"items": _Append(*items)})
+        h = heads.setdefault(pid, {})
+        h[_head_path(pid, seg, "n")] = len(items)
+        h["reply_live" if pid else "counts.top_live"] = h.get("reply_live" if pid else "counts.top_live", 0) + len(items)
+    for (rank, pid, key), entries in ranked.items():
+        heads[pid][_rank_head_path(key, "n", rank)] = len(entries)
+
+    for pid, h in heads.items():
+        if not pid:
+            for p, n in h.items():
+                tw.delta(p, n)
+            continue
+        try:
+            tw.patch(comment_doc_id(video_id, pid), _mutate_comment_counters(video_id, pid, h))
+        except KeyError:
+            pass  # parent hard-deleted meanwhile
+    return out
+
+
+def _edit_many(video_id: str, reqs: list[tuple[str, str]], tw: _ThreadWrite) -> list:
+    out: list = [None] * len(reqs)
+    for i, (comment_id, content_raw) in enumerate(reqs):
+        content_html, render_ver = render_content(content_raw or "")
+        try:
+            _mutate_comment(video_id, comment_id, [
+                SD.upsert("content_raw", content_raw or ""),
+                SD.upsert("content_html", content_html),
+                SD.upsert("render_ver", render_ver),
+                SD.upsert("edited", True),
+                SD.upsert("updated_at", _now_ms()),
+            ])
+        except KeyError as e:
+            out[i] = e
+
+    edited = [cid for i, (cid, _) in enumerate(reqs) if out[i] is None]
+    found = {c["id"]: c for c in _get_comments(video_id, list(dict.fromkeys(edited)))}
+    for i, (comment_id, _) in enumerate(reqs):
+        if out[i] is not None:
+            continue
+        c = found.get(comment_id)
+        if c is None:
+            out[i] = KeyError("not_found")
+            continue
+        out[i] = c
+        tw.docs[comment_doc_id(video_id, comment_id)] = c
+    return out
+
+
+def _vote_many(video_id: str, reqs: list[tuple[str, str, int]], tw: _ThreadWrite) -> list:
+    out: list = [None] * len(reqs)
+
+    # First: ensure comments exist in this video's thread (prevents orphan cvote docs)
+    meta, e, cas = _thread_entry(video_id)
+    comments = {c["id"]: c for c in _get_comments(video_id, list(dict.fromkeys(cid for _, cid, _ in reqs)), e, cas)}
+
+    # votes are applied in arrival order; later ones see earlier ones of the batch
+    wanted: dict[str, list[str]] = {}
+    for user_uid, comment_id, _ in reqs:
+        if comment_id in comments:
+            wanted.setdefault(user_uid, []).append(comment_id)
+    before = {uid: _user_votes(video_id, uid, list(dict.fromkeys(cids))) for uid, cids in wanted.items()}
+
+    cur: dict[tuple[str, str], int] = {}
+    first: dict[tuple[str, str], int] = {}
+    deltas: dict[str, list[int]] = {}
+    for i, (user_uid, comment_id, vote) in enumerate(reqs):
+        if comment_id not in comments:
+            # cleanup if exists
+            _delete_vote_doc(video_id, comment_id, user_uid)
+            out[i] = KeyError("not_found")
+            continue
+        key = (comment_id, user_uid)
+        if key not in cur:
+            cur[key] = first[key] = before[user_uid][comment_id]
+        old_vote, cur[key] = cur[key], vote
+        d = deltas.setdefault(comment_id, [0, 0])
+        d[0] += int(vote == 1) - int(old_vote == 1)
+        d[1] += int(vote == -1) - int(old_vote == -1)
+
+    counts: dict[str, tuple[int, int]] = {}
+    rank_heads: dict[str, dict[str, int]] = {}  # parent id -> ranked index head deltas
+    hot: Optional[dict] = None
+    for comment_id, c in comments.items():
+        likes = int(c.get("likes", 0) or 0)
+        dislikes = int(c.get("dislikes", 0) or 0)
+        d = deltas.get(comment_id, [0, 0])
+        paths = [p for p, n in (("likes", d[0]), ("dislikes", d[1])) if n]
+        if paths:
+            now = _now_ms()
+            moved = d[0] - d[1]
+            if moved:
+                paths += ["score", "rank_ver"]
+            step = {"likes": d[0], "dislikes": d[1], "score": moved, "rank_ver": 1}
+            res = _mutate_comment(
+                video_id,
+                comment_id,
+                [_counter(p, step[p]) for p in paths] + [SD.upsert("updated_at", now)],
+            )
+            vals = {p: int(res.content_as[int](j)) for j, p in enumerate(paths)}
+            likes = max(vals.get("likes", likes), 0)
+            dislikes = max(vals.get("dislikes", dislikes), 0)
+            patch = {"likes": likes, "dislikes": dislikes, "updated_at": now}
+            if moved:
+                score, rank_ver = vals["score"], vals["rank_ver"]
+                if hot is None and not (c.get("parent_id", "") or ""):
+                    hot = _hot_index(video_id)
+                heads, rank_docs = _rank_move(video_id, c, score - moved, score, rank_ver, hot)
+                tw.docs.update(rank_docs)
+                acc = rank_heads.setdefault(c.get("parent_id", "") or "", {})
+                for p, n in heads.items():
+                    acc[p] = acc.get(p, 0) + n
+                patch.update(score=score, rank_ver=rank_ver)
+            tw.patch(comment_doc_id(video_id, comment_id), patch)
+        counts[comment_id] = (likes, dislikes)
+
+    for pid, heads in rank_heads.items():
+        if not pid:
+            for p, n in heads.items():
+                tw.delta(p, n)
+            continue
+        try:
+            tw.patch(comment_doc_id(video_id, pid), _mutate_comment_counters(video_id, pid, heads))
+        except KeyError:
+            pass  # parent hard-deleted meanwhile
+
+    for i, (user_uid, comment_id, vote) in enumerate(reqs):
+        if out[i] is None:
+            likes, dislikes = counts[comment_id]
+            out[i] = (int(likes), int(dislikes), int(vote))
+    changed: dict[str, dict[str, int]] = {}
+    for (comment_id, user_uid), vote in cur.items():
+        if vote != first[(comment_id, user_uid)]:
+            changed.setdefault(user_uid, {})[comment_id] = vote
+    complete = bool(meta.get("vote_digests"))
+    for user_uid, votes in changed.items():
+        tw.after.append(lambda uid=user_uid, v=votes: _set_user_votes(video_id, uid, v, complete))
+    return out
+
+
+_WRITE_KINDS = {
+    "create": _create_many,
+    "edit": _edit_many,
+    "vote": _vote_many,
+}
+
+
+def apply_writes(video_id: str, ops: list[tuple[str, Any]]) -> list:
+    """
+    Apply a batch of writes to one video. ops are ("create", fields),
+    ("edit", (comment_id, content_raw)) or ("vote", (user_uid, comment_id, vote)).
+    Returns one entry per op, in order: what create_comment/edit_comment/apply_vote
+    return, or the exception that op failed with (KeyError("parent_not_found"), ...).
+    Errors that hit the batch as a whole are raised.
+    """
+    _ensure_thread(video_id)
+    tw = _ThreadWrite()
+    out: list = [None] * len(ops)
+
+    by_kind: dict[str, list[int]] = {}
+    for i, (kind, _) in enumerate(ops):
+        if kind in _WRITE_KINDS:
+            by_kind.setdefault(kind, []).append(i)
+        else:
+            out[i] = ValueError(f"unknown write: {kind}")
+    for kind, fn in _WRITE_KINDS.items():
+        idxs = by_kind.get(kind)
+        if idxs:
+            for i, r in zip(idxs, fn(video_id, [ops[i][1] for i in idxs], tw)):
+                out[i] = r
+
+    if tw.dirty:
+        _mutate_thread(video_id, tw.deltas, docs=tw.docs, patches=tw.patches)
+    for fn in tw.after:
+        fn()
+    _publish(video_id, _write_events(video_id, ops, out))
+    return out
+
+
+_write_coalescer = Coalescer(
+    apply_writes,
+    write_cfg.coalesce_window_ms / 1000.0,
+    write_cfg.coalesce_max_batch,
+) if write_cfg.coalesce_enabled else None
+
+
+def write_coalescer_stats() -> dict[str, float]:
+    return _write_coalescer.stats() if _write_coalescer is not None else {}
+
+
+def _submit_write(video_id: str, kind: str, args: Any) -> Any:
+    if _write_coalescer is not None:
+        return _write_coalescer.submit(video_id, (kind, args))
+    r = apply_writes(video_id, [(kind, args)])[0]
+    if isinstance(r, Exception):
+        raise r
+    return r
+
+
+class CouchbaseStorage(Storage):
+    """db.storage backend on the functions of this module (the process-wide connection)."""
+
+    name = "couchbase"
+
+    def ping(self) -> bool:
+        return ping()
+
+    def create_comment(
+        self,
+        video_id: str,
+        parent_id: str,
+        comment_id: str,
+        content_raw: str,
+        user_uid: str,
+        username: str,
+        channel_id: str,
+        idempotency_key: str = "",
+    ) -> dict:
+        return create_comment(
+            video_id, parent_id, comment_id, content_raw, user_uid, username, channel_id, idempotency_key,
+        )
+
+    def edit_comment(self, video_id: str, comment_id: str, content_raw: str) -> dict:
+        return edit_comment(video_id, comment_id, content_raw)
+
+    def delete_comment(self, video_id: str, comment_id: str, hard_delete: bool) -> dict:
+        return delete_comment(video_id, comment_id, hard_delete)
+
+    def restore_comment(self, video_id: str, comment_id: str) -> dict:
+        return restore_comment(video_id, comment_id)
+
+    def list_top(
+        self,
+        video_id: str,
+        page_size: int,
+        page_token: str,
+        newest_first: bool,
+        include_deleted: bool,
+        rank: str = "",
+        ver: Optional[int] = None,
+    ) -> tuple[list[dict], str, int]:
+        return list_top(video_id, page_size, page_token, newest_first, include_deleted, rank, ver)
+
+    def list_replies(
+        self,
+        video_id: str,
+        parent_id: str,
+        page_size: int,
+        page_token: str,
+        newest_first: bool,
+        include_deleted: bool,
+        rank: str = "",
+        ver: Optional[int] = None,
+    ) -> tuple[list[dict], str, int]:
+        return list_replies(video_id, parent_id, page_size, page_token, newest_first, include_deleted, rank, ver)
+
+    def list_top_with_replies(self, *args: Any, **kwargs: Any) -> tuple:
+        return list_top_with_replies(*args, **kwargs)  # bulk reads of the reply indexes, not the generic loop
+
+    def export_thread(self, video_id: str, include_deleted: bool, chunk_size: int = 500) -> Iterator[list[dict]]:
+        return export_thread(video_id, include_deleted, chunk_size)
+
+    def stale_render_video_ids(self) -> list[str]:
+        return stale_render_video_ids()
+
+    def rerender_thread(self, video_id: str) -> int:
+        return rerender_thread(video_id)
+
+    def get_counts(self, video_id: str) -> tuple[int, int]:
+        return get_counts(video_id)
+
+    def batch_get_counts(self, video_ids: list[str]) -> dict[str, tuple[int, int]]:
+        return batch_get_counts(video_ids)
+
+    def apply_vote(self, video_id: str, user_uid: str, comment_id: str, vote: int) -> tuple[int, int, int]:
+        return apply_vote(video_id, user_uid, comment_id, vote)
+
+    def get_my_votes(self, video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+        return get_my_votes(video_id, user_uid, comment_ids)
+
+    def thread_version(self, video_id: str) -> int:
+        return thread_version(video_id)
+
+    def watch_thread(self, video_id: str, loop: Optional[Any] = None) -> Subscription:
+        return watch_thread(video_id, loop)
+
+    def start_hot_reranker(self, stop: threading.Event) -> Optional[threading.Thread]:
+        return start_hot_reranker(stop)
+
+
+# ---------------------------
+# Metrics: the stats above, collected into `metrics` when Info.All asks
+# ---------------------------
+
+def _cas_metrics() -> dict[str, float]:
+    out = cas_contention_stats()
+    for video_id, c in contended_threads(10):
+        for k, v in c.items():
+            out[f"{k}{{video={video_id}}}"] = v
+    return out
 
-        _replace_thread(video_id, thread2, cas)
-        return likes, dislikes
 
-    likes, dislikes = _retry_cas(op)
-    _set_user_vote(video_id, comment_id, user_uid, new_vote)
-    return int(likes), int(dislikes), int(new_vote)
\ No newline at end of file
+metrics.collector("cas", _cas_metrics)
+metrics.collector("thread_cache", thread_cache_stats)
+metrics.collector("write_coalescer", write_coalescer_stats)
+metrics.collector("watch", watch_stats)
@@ -0,0 +1,475 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Iterable, Optional
+
+from couchbase.exceptions import (
+    CasMismatchException,
+    DocumentExistsException,
+    DocumentNotFoundException,
+    PathExistsException,
+    PathMismatchException,
+    PathNotFoundException,
+)
+from couchbase.subdocument import StoreSemantics, SubDocOp
+
+# ---------------------------
+# In-memory stand-in for the Couchbase collection API used by
+# db/couchbase_db.py and db/couchbase_aio.py, for benchmarks
+# (tools/bench_service.py) and local runs without a cluster:
+# get/insert/upsert/replace/remove/touch/exists, the *_multi variants,
+# lookup_in/mutate_in with the subdocument specs of couchbase.subdocument,
+# CAS checks, expiry, and an injectable per-operation latency.
+#
+# Docs are stored JSON-encoded, so every operation pays the (de)serialization
+# the SDK would and values must be JSON-serializable.
+# ---------------------------
+
+_PATH_RE = re.compile(r"([^.\[\]]+)|\[(-?\d+)\]")
+
+
+def _parse_path(path: str) -> list:
+    return [int(idx) if idx != "" else name for name, idx in _PATH_RE.findall(path)]
+
+
+def _opt(opts: tuple, kwargs: dict, name: str, default: Any = None) -> Any:
+    """Option `name` from keyword arguments or from *Options objects (dicts) passed positionally."""
+    v = kwargs.get(name)
+    if v is None:
+        v = default
+        for o in opts:
+            if isinstance(o, dict) and o.get(name) is not None:
+                v = o[name]
+    if hasattr(v, "value") and not isinstance(v, (int, float, str)):
+        v = v.value  # enums and SDK wrapper types
+    return v
+
+
+class _ContentAs:
+    def __init__(self, getter):
+        self._getter = getter
+
+    def __getitem__(self, typ):
+        return self._getter(typ)
+
+
+class GetResult:
+    def __init__(self, key: str, raw: bytes, cas: int):
+        self.key = key
+        self.cas = cas
+        self._raw = raw
+
+    @property
+    def value(self) -> Any:
+        return json.loads(self._raw)
+
+    @property
+    def content_as(self) -> _ContentAs:
+        return _ContentAs(lambda typ: json.loads(self._raw))
+
+
+class MutationResult:
+    def __init__(self, key: str, cas: int):
+        self.key = key
+        self.cas = cas
+
+
+class ExistsResult:
+    def __init__(self, key: str, exists: bool):
+        self.key = key
+        self.exists = exists
+
+
+class LookupInResult:
+    """Values (or PathNotFoundException) per spec, like couchbase.result.LookupInResult."""
+
+    def __init__(self, key: str, cas: int, values: list):
+        self.key = key
+        self.cas = cas
+        self._values = values
+
+    def _value(self, i: int) -> Any:
+        v = self._values[i]
+        if isinstance(v, Exception):
+            raise v
+        return v
+
+    @property
+    def content_as(self) -> _ContentAs:
+        return _ContentAs(lambda typ: self._value)
+
+    def exists(self, i: int) -> bool:
+        v = self._values[i]
+        if isinstance(v, PathNotFoundException):
+            return False
+        if isinstance(v, Exception):
+            raise v
+        return True
+
+
+MutateInResult = LookupInResult
+
+
+class MultiResult:
+    def __init__(self, results: dict):
+        self._results = results
+
+    @property
+    def results(self) -> dict:
+        return {k: v for k, v in self._results.items() if not isinstance(v, Exception)}
+
+    @property
+    def exceptions(self) -> dict:
+        return {k: v for k, v in self._results.items() if isinstance(v, Exception)}
+
+    @property
+    def all_ok(self) -> bool:
+        return not self.exceptions
+
+
+class _Store:
+    """Docs shared by the views of one MemoryCollection: key -> [json bytes, cas, expires_at or None]."""
+
+    def __init__(self):
+        self.docs: dict[str, list] = {}
+        self.lock = threading.RLock()
+        self.cas = itertools.count(1)
+        self.ops: dict[str, int] = {}
+
+
+class MemoryCollection:
+    """
+    Collection stand-in. Each operation first sleeps `latency_sec` plus
+    uniform(0, `jitter_sec`), the network round trip of a real cluster; the
+    operation itself is atomic (one lock per collection, held only for the
+    in-memory work).
+    """
+
+    def __init__(self, latency_sec: float = 0.0, jitter_sec: float = 0.0, store: Optional[_Store] = None, sleep: bool = True):
+        self.latency_sec = max(float(latency_sec or 0.0), 0.0)
+        self.jitter_sec = max(float(jitter_sec or 0.0), 0.0)
+        self._store = store or _Store()
+        self._sleep = sleep
+
+    def delay(self) -> float:
+        return self.latency_sec + (random.uniform(0.0, self.jitter_sec) if self.jitter_sec else 0.0)
+
+    def view(self, sleep: bool) -> "MemoryCollection":
+        """The same docs; with sleep=False the caller injects the latency itself (see AsyncMemoryCollection)."""
+        return MemoryCollection(self.latency_sec, self.jitter_sec, self._store, sleep)
+
+    @property
+    def ops(self) -> dict[str, int]:
+        """Operation counts since creation (multi operations count each key)."""
+        with self._store.lock:
+            return dict(self._store.ops)
+
+    def _tick(self, op: str) -> None:
+        with self._store.lock:
+            self._store.ops[op] = self._store.ops.get(op, 0) + 1
+        if self._sleep:
+            d = self.delay()
+            if d:
+                time.sleep(d)
+
+    def _live(self, key: str) -> Optional[list]:
+        d = self._store.docs.get(key)
+        if d is not None and d[2] is not None and d[2] <= time.time():
+            del self._store.docs[key]
+            return None
+        return d
+
+    def _found(self, key: str) -> list:
+        d = self._live(key)
+        if d is None:
+            raise DocumentNotFoundException(f"key={key}")
+        return d
+
+    @staticmethod
+    def _expiry(opts: tuple, kwargs: dict) -> Optional[float]:
+        exp = _opt(opts, kwargs, "expiry")
+        if exp is None:
+            return None
+        if isinstance(exp, timedelta):
+            exp = exp.total_seconds()
+        return time.time() + float(exp) if float(exp) > 0 else None
+
+    @staticmethod
+    def _check_cas(key: str, d: list, opts: tuple, kwargs: dict) -> None:
+        cas = _opt(opts, kwargs, "cas", 0) or 0
+        if cas and cas != d[1]:
+            raise CasMismatchException(f"key={key}")
+
+    def _put(self, key: str, value: Any, expires_at: Optional[float]) -> MutationResult:
+        cas = next(self._store.cas)
+        self._store.docs[key] = [json.dumps(value, separators=(",", ":")).encode("utf-8"), cas, expires_at]
+        return MutationResult(key, cas)
+
+    # --- documents ---
+
+    def get(self, key: str, *opts: Any, **kwargs: Any) -> GetResult:
+        self._tick("get")
+        with self._store.lock:
+            d = self._found(key)
+            return GetResult(key, d[0], d[1])
+
+    def exists(self, key: str, *opts: Any, **kwargs: Any) -> ExistsResult:
+        self._tick("exists")
+        with self._store.lock:
+            return ExistsResult(key, self._live(key) is not None)
+
+    def insert(self, key: str, value: Any, *opts: Any, **kwargs: Any) -> MutationResult:
+        self._tick("insert")
+        with self._store.lock:
+            if self._live(key) is not None:
+                raise DocumentExistsException(f"key={key}")
+            return self._put(key, value, self._expiry(opts, kwargs))
+
+    def upsert(self, key: str, value: Any, *opts: Any, **kwargs: Any) -> MutationResult:
+        self._tick("upsert")
+        with self._store.lock:
+            return self._put(key, value, self._expiry(opts, kwargs))
+
+    def replace(self, key: str, value: Any, *opts: Any, **kwargs: Any) -> MutationResult:
+        self._tick("replace")
+        with self._store.lock:
+            self._check_cas(key, self._found(key), opts, kwargs)
+            return self._put(key, value, self._expiry(opts, kwargs))
+
+    def remove(self, key: str, *opts: Any, **kwargs: Any) -> MutationResult:
+        self._tick("remove")
+        with self._store.lock:
+            self._check_cas(key, self._found(key), opts, kwargs)
+            del self._store.docs[key]
+            return MutationResult(key, next(self._store.cas))
+
+    def touch(self, key: str, expiry: Any, *opts: Any, **kwargs: Any) -> MutationResult:
+        self._tick("touch")
+        with self._store.lock:
+            d = self._found(key)
+            d[2] = self._expiry((), {"expiry": expiry})
+            return MutationResult(key, d[1])
+
+    # --- multi (one round trip per key, like the SDK's pipelined ops minus the overlap) ---
+
+    def _multi(self, fn, items: Iterable) -> MultiResult:
+        out = {}
+        for item in items:
+            key = item[0] if isinstance(item, tuple) else item
+            try:
+                out[key] = fn(*item) if isinstance(item, tuple) else fn(item)
+            except Exception as e:
+                out[key] = e
+        return MultiResult(out)
+
+    def get_multi(self, keys: Iterable[str], *opts: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(self.get, keys)
+
+    def insert_multi(self, docs: dict, *opts: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(lambda k, v: self.insert(k, v, *opts), docs.items())
+
+    def upsert_multi(self, docs: dict, *opts: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(lambda k, v: self.upsert(k, v, *opts), docs.items())
+
+    def remove_multi(self, keys: Iterable[str], *opts: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(self.remove, keys)
+
+    # --- sub-document ---
+
+    def lookup_in(self, key: str, spec: Iterable, *opts: Any, **kwargs: Any) -> LookupInResult:
+        self._tick("lookup_in")
+        with self._store.lock:
+            d = self._found(key)
+            body = json.loads(d[0])
+            vals: list = []
+            for s in spec:
+                op, path = s[0], s[1]
+                try:
+                    if op == SubDocOp.GET_DOC:
+                        vals.append(body)
+                        continue
+                    v = _read(*_walk(body, _parse_path(path), create=False))
+                    if op == SubDocOp.GET:
+                        vals.append(v)
+                    elif op == SubDocOp.EXISTS:
+                        vals.append(True)
+                    elif op == SubDocOp.GET_COUNT:
+                        vals.append(len(v))
+                    else:
+                        raise NotImplementedError(f"lookup_in op {op}")
+                except PathNotFoundException as e:
+                    vals.append(e)
+            return LookupInResult(key, d[1], vals)
+
+    def mutate_in(self, key: str, spec: Iterable, *opts: Any, **kwargs: Any) -> MutateInResult:
+        self._tick("mutate_in")
+        spec = list(spec)
+        if not 0 < len(spec) <= 16:
+            raise ValueError(f"mutate_in takes 1..16 specs, got {len(spec)}")
+        semantics = _opt(opts, kwargs, "store_semantics", StoreSemantics.REPLACE.value)
+        with self._store.lock:
+            d = self._live(key)
+            if d is None:
+                if semantics == StoreSemantics.REPLACE.value:
+                    raise DocumentNotFoundException(f"key={key}")
+                body: Any = {}
+                expires_at = self._expiry(opts, kwargs)
+            else:
+                if semantics == StoreSemantics.INSERT.value:
+                    raise DocumentExistsException(f"key={key}")
+                self._check_cas(key, d, opts, kwargs)
+                body = json.loads(d[0])
+                expires_at = d[2]
+            vals = [_mutate(body, s) for s in spec]  # all or nothing: body is a copy
+            res = self._put(key, body, expires_at)
+            return MutateInResult(key, res.cas, vals)
+
+
+def _walk(doc: Any, parts: list, create: bool) -> tuple[Any, Any]:
+    """(container, last path part) of a parsed path, creating missing dicts when `create`."""
+    cur = doc
+    for p in parts[:-1]:
+        if isinstance(p, int):
+            if not isinstance(cur, list):
+                raise PathMismatchException(str(p))
+            try:
+                cur = cur[p]
+            except IndexError:
+                raise PathNotFoundException(str(p))
+        else:
+            if not isinstance(cur, dict):
+                raise PathMismatchException(str(p))
+            if p not in cur:
+                if not create:
+                    raise PathNotFoundException(str(p))
+                cur[p] = {}
+            cur = cur[p]
+    return cur, parts[-1]
+
+
+def _read(parent: Any, last: Any) -> Any:
+    if isinstance(last, int):
+        if not isinstance(parent, list):
+            raise PathMismatchException(str(last))
+        try:
+            return parent[last]
+        except IndexError:
+            raise PathNotFoundException(str(last))
+    if not isinstance(parent, dict):
+        raise PathMismatchException(str(last))
+    if last not in parent:
+        raise PathNotFoundException(str(last))
+    return parent[last]
+
+
+def _mutate(body: Any, s: tuple) -> Any:
+    # spec tuples of couchbase.subdocument: (op, path, create_parents, xattr, expand_macros, value)
+    op, path = s[0], s[1]
+    create = bool(s[2]) if len(s) > 2 else False
+    value = s[5] if len(s) > 5 else None
+    parts = _parse_path(path)
+    if op == SubDocOp.COUNTER:
+        parent, last = _walk(body, parts, create=create)
+        cur = parent.get(last, 0) if isinstance(parent, dict) else _read(parent, last)
+        parent[last] = int(cur) + int(value)
+        return parent[last]
+    if op in (SubDocOp.DICT_UPSERT, SubDocOp.DICT_ADD, SubDocOp.REPLACE):
+        parent, last = _walk(body, parts, create=create)
+        if op == SubDocOp.DICT_ADD and isinstance(parent, dict) and last in parent:
+            raise PathExistsException(path)
+        if op == SubDocOp.REPLACE:
+            _read(parent, last)
+        parent[last] = json.loads(json.dumps(value))
+        return None
+    if op == SubDocOp.REMOVE:
+        parent, last = _walk(body, parts, create=False)
+        _read(parent, last)
+        del parent[last]
+        return None
+    if op in (SubDocOp.ARRAY_PUSH_LAST, SubDocOp.ARRAY_PUSH_FIRST, SubDocOp.ARRAY_ADD_UNIQUE):
+        values = json.loads(json.dumps(list(value)))
+        parent, last = _walk(body, parts, create=create)
+        if isinstance(parent, dict) and last not in parent:
+            if not create:
+                raise PathNotFoundException(path)
+            parent[last] = []
+        arr = _read(parent, last)
+        if not isinstance(arr, list):
+            raise PathMismatchException(path)
+        if op == SubDocOp.ARRAY_PUSH_LAST:
+            arr.extend(values)
+        elif op == SubDocOp.ARRAY_PUSH_FIRST:
+            arr[0:0] = values
+        else:
+            for v in values:
+                if v in arr:
+                    raise PathExistsException(path)
+                arr.append(v)
+        return None
+    if op == SubDocOp.ARRAY_INSERT:
+        parent, last = _walk(body, parts, create=False)
+        if not isinstance(parent, list) or not isinstance(last, int):
+            raise PathMismatchException(path)
+        parent[last:last] = json.loads(json.dumps(list(value)))
+        return None
+    raise NotImplementedError(f"mutate_in op {op}")
+
+
+class AsyncMemoryCollection:
+    """acouchbase-style view of a MemoryCollection: same docs, latency awaited instead of slept."""
+
+    def __init__(self, coll: MemoryCollection):
+        self._coll = coll.view(sleep=False)
+
+    def __getattr__(self, name: str) -> Any:
+        fn = getattr(self._coll, name)
+        if not callable(fn) or name.startswith("_") or name in ("delay", "view"):
+            return fn
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            d = self._coll.delay()
+            await asyncio.sleep(d)
+            return fn(*args, **kwargs)
+
+        setattr(self, name, call)
+        return call
+
+
+class _Bucket:
+    def ping(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+class _AsyncBucket:
+    async def ping(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+def install(latency_sec: float = 0.0, jitter_sec: float = 0.0) -> MemoryCollection:
+    """
+    Point db.couchbase_db (and db.couchbase_aio) at a new MemoryCollection
+    instead of a cluster; connect() then returns it, metered like a real
+    collection. Docs cached from a previous one are dropped. Queries
+    (ctx.cluster) are not available.
+    """
+    from db import couchbase_aio as cdb_aio
+    from db import couchbase_db as cdb
+
+    coll = MemoryCollection(latency_sec, jitter_sec)
+    sync_coll: Any = coll
+    async_coll: Any = AsyncMemoryCollection(coll)
+    if cdb.metrics_cfg.enabled or cdb.profile_cfg.enabled:
+        sync_coll = cdb.MeteredCollection(sync_coll)
+        async_coll = cdb.MeteredCollection(async_coll, is_async=True)
+    cdb._thread_cache.clear()
+    cdb._idem_cache.clear()
+    cdb._ctx = cdb.CouchbaseCtx(cluster=None, bucket=_Bucket(), scope=None, coll=sync_coll)
+    cdb_aio._ctx = cdb_aio.AsyncCouchbaseCtx(cluster=None, bucket=_AsyncBucket(), scope=None, coll=async_coll)
+    return coll
@@ -0,0 +1,700 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Union
+
+from config.hot_cfg import hot_cfg
+from config.storage_cfg import storage_cfg
+from config.watch_cfg import watch_cfg
+from config.write_cfg import write_cfg
+from db.storage import RANK_HOT, RANK_TOP, Storage
+from utils.events_ut import EVENT_CREATED, EVENT_DELETED, EVENT_EDITED, EVENT_RESTORED, EVENT_VOTED, thread_event
+from utils.hot_ut import hot_params, hot_value
+from utils.page_token_ut import PageCursor, decode_page_token, encode_cursor
+from utils.pubsub_ut import Hub, LocalBroker, Subscription
+from utils.render_ut import RENDERER_VERSION, render_content
+
+log = logging.getLogger("sqlite_db")
+
+# ---------------------------
+# SQLite backend: one database file in WAL mode, so readers never wait for the
+# writer and a write is one short transaction. Counters (threads.top_count,
+# comments.reply_count, ...) are kept in the same transaction as the rows they
+# count, which makes them exact, and threads.ver is bumped by every write (the
+# response cache key). Pages are keyset queries over the indexes below; the
+# page tokens are the same cursors the Couchbase backend hands out.
+# ---------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    video_id    TEXT PRIMARY KEY,
+    ver         INTEGER NOT NULL DEFAULT 0,
+    next_seq    INTEGER NOT NULL DEFAULT 0,
+    top_count   INTEGER NOT NULL DEFAULT 0,
+    top_live    INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    hot_cfg     TEXT NOT NULL DEFAULT '',
+    created_at  INTEGER NOT NULL,
+    updated_at  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    video_id     TEXT NOT NULL,
+    id           TEXT NOT NULL,
+    parent_id    TEXT NOT NULL DEFAULT '',
+    seq          INTEGER NOT NULL,
+    content_raw  TEXT NOT NULL DEFAULT '',
+    content_html TEXT NOT NULL DEFAULT '',
+    render_ver   INTEGER NOT NULL DEFAULT 0,
+    is_deleted   INTEGER NOT NULL DEFAULT 0,
+    edited       INTEGER NOT NULL DEFAULT 0,
+    created_at   INTEGER NOT NULL,
+    updated_at   INTEGER NOT NULL,
+    user_uid     TEXT NOT NULL DEFAULT '',
+    username     TEXT NOT NULL DEFAULT '',
+    channel_id   TEXT NOT NULL DEFAULT '',
+    reply_count  INTEGER NOT NULL DEFAULT 0,
+    reply_live   INTEGER NOT NULL DEFAULT 0,
+    likes        INTEGER NOT NULL DEFAULT 0,
+    dislikes     INTEGER NOT NULL DEFAULT 0,
+    score        INTEGER NOT NULL DEFAULT 0,
+    hot          INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (video_id, id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS comments_seq ON comments (video_id, parent_id, seq);
+CREATE INDEX IF NOT EXISTS comments_top ON comments (video_id, parent_id, score, seq);
+CREATE INDEX IF NOT EXISTS comments_hot ON comments (video_id, hot, seq) WHERE parent_id = '';
+CREATE TABLE IF NOT EXISTS votes (
+    user_uid   TEXT NOT NULL,
+    video_id   TEXT NOT NULL,
+    comment_id TEXT NOT NULL,
+    vote       INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (user_uid, video_id, comment_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS idempotency (
+    video_id   TEXT NOT NULL,
+    user_uid   TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    comment_id TEXT NOT NULL,
+    fp         TEXT NOT NULL,
+    expires_at INTEGER NOT NULL,
+    PRIMARY KEY (video_id, user_uid, key)
+);
+CREATE INDEX IF NOT EXISTS idempotency_expiry ON idempotency (expires_at);
+"""
+
+_COMMENT_COLS = (
+    "id, video_id, parent_id, seq, content_raw, content_html, render_ver, is_deleted, edited, created_at, updated_at, "
+    "user_uid, username, channel_id, reply_count, reply_live, likes, dislikes, score"
+)
+
+# get_my_votes/batch_get_counts: ids per IN (...) query, well below SQLITE_MAX_VARIABLE_NUMBER
+_IN_CHUNK = 500
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _comment(row: sqlite3.Row) -> dict:
+    c = dict(row)
+    c["is_deleted"] = bool(c["is_deleted"])
+    c["edited"] = bool(c["edited"])
+    return c
+
+
+def _hot_params() -> list[float]:
+    """Decay parameters for hot values computed now, as stored in threads.hot_cfg."""
+    return hot_params(hot_cfg.half_life_sec, hot_cfg.prior, hot_cfg.bucket_half_lives)
+
+
+def _idem_fingerprint(parent_id: str, content_raw: str) -> str:
+    # same fingerprint as the Couchbase backend's idem:: docs
+    return hashlib.sha1(f"{parent_id}\0{content_raw}".encode("utf-8")).hexdigest()[:16]
+
+
+class SqliteStorage(Storage):
+    """
+    db.storage backend on an SQLite database file. Each thread has its own
+    connection; writes of this process are serialized by a lock (SQLite has
+    one writer at a time anyway), other processes by the busy timeout.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, busy_timeout_ms: Optional[int] = None, synchronous: Optional[str] = None):
+        self.path = path
+        self.busy_timeout_ms = int(storage_cfg.sqlite_busy_timeout_ms if busy_timeout_ms is None else busy_timeout_ms)
+        self.synchronous = (synchronous or storage_cfg.sqlite_synchronous).upper()
+        if self.synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"invalid sqlite synchronous mode: {self.synchronous!r}")
+        self.events = Hub(LocalBroker(), watch_cfg.queue_size)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+
+    # ---- connections and transactions
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout_ms / 1000.0,
+                isolation_level=None,  # transactions are begun explicitly
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _read(self) -> Iterator[sqlite3.Connection]:
+        """A consistent snapshot for the queries of one call."""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """One write transaction, taking the database write lock up front."""
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _publish(self, video_id: str, events: list[dict]) -> None:
+        """Called once the write is committed: a failing broker is logged, not raised to the writer."""
+        try:
+            self.events.publish(video_id, events)
+        except Exception:
+            log.exception("publishing %d events of %s failed", len(events), video_id)
+
+    # ---- rows
+
+    @staticmethod
+    def _thread(conn: sqlite3.Connection, video_id: str) -> Optional[sqlite3.Row]:
+        return conn.execute("SELECT * FROM threads WHERE video_id = ?", (video_id,)).fetchone()
+
+    @staticmethod
+    def _ensure_thread(conn: sqlite3.Connection, video_id: str, now: int) -> None:
+        conn.execute(
+            "INSERT OR IGNORE INTO threads (video_id, hot_cfg, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (video_id, json.dumps(_hot_params()), now, now),
+        )
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, video_id: str, now: int, **deltas: int) -> None:
+        sets = "".join(f", {col} = {col} + {int(n)}" for col, n in deltas.items() if n)
+        conn.execute(f"UPDATE threads SET ver = ver + 1, updated_at = ?{sets} WHERE video_id = ?", (now, video_id))
+
+    @staticmethod
+    def _get(conn: sqlite3.Connection, video_id: str, comment_id: str) -> Optional[dict]:
+        row = conn.execute(
+            f"SELECT {_COMMENT_COLS} FROM comments WHERE video_id = ? AND id = ?", (video_id, comment_id),
+        ).fetchone()
+        return _comment(row) if row is not None else None
+
+    def _hot_of(self, conn: sqlite3.Connection, video_id: str, score: int, created_at: int) -> int:
+        row = conn.execute("SELECT hot_cfg FROM threads WHERE video_id = ?", (video_id,)).fetchone()
+        params = json.loads(row["hot_cfg"]) if row is not None and row["hot_cfg"] else _hot_params()
+        return hot_value(score, created_at, params)
+
+    # ---- Storage
+
+    def ping(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            log.warning("sqlite ping failed: %s", e)
+            return False
+
+    def create_comment(
+        self,
+        video_id: str,
+        parent_id: str,
+        comment_id: str,
+        content_raw: str,
+        user_uid: str,
+        username: str,
+        channel_id: str,
+        idempotency_key: str = "",
+    ) -> dict:
+        """
+        The idempotency row is written in the comment's transaction, so a key
+        is never seen half done and never raises TimeoutError here.
+        """
+        parent_id = parent_id or ""
+        fp = _idem_fingerprint(parent_id, content_raw)
+        now = _now_ms()
+        with self._write() as conn:
+            if idempotency_key:
+                conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+                row = conn.execute(
+                    "SELECT comment_id, fp FROM idempotency WHERE video_id = ? AND user_uid = ? AND key = ?",
+                    (video_id, user_uid, idempotency_key),
+                ).fetchone()
+                if row is not None:
+                    if row["fp"] != fp:
+                        raise ValueError("idempotency_key_reused")
+                    c = self._get(conn, video_id, row["comment_id"])
+                    if c is None:
+                        raise KeyError("not_found")  # hard-deleted since
+                    return c
+
+            self._ensure_thread(conn, video_id, now)
+            if parent_id:
+                cur = conn.execute(
+                    "UPDATE comments SET reply_count = reply_count + 1, reply_live = reply_live + 1 "
+                    "WHERE video_id = ? AND id = ?",
+                    (video_id, parent_id),
+                )
+                if cur.rowcount == 0:
+                    raise KeyError("parent_not_found")
+            seq = conn.execute(
+                "UPDATE threads SET next_seq = next_seq + 1 WHERE video_id = ? RETURNING next_seq - 1",
+                (video_id,),
+            ).fetchone()[0]
+            top = 0 if parent_id else 1
+            self._bump(conn, video_id, now, total_count=1, top_count=top, top_live=top)
+            hot = 0 if parent_id else self._hot_of(conn, video_id, 0, now)
+            content_html, render_ver = render_content(content_raw or "")
+            conn.execute(
+                "INSERT INTO comments (video_id, id, parent_id, seq, content_raw, content_html, render_ver, "
+                "created_at, updated_at, user_uid, username, channel_id, hot) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (video_id, comment_id, parent_id, seq, content_raw or "", content_html, render_ver, now, now,
+                 user_uid or "", username or "", channel_id or "", hot),
+            )
+            if idempotency_key:
+                ttl_ms = int(max(float(write_cfg.idempotency_ttl_sec), 1.0) * 1000)
+                conn.execute(
+                    "INSERT INTO idempotency (video_id, user_uid, key, comment_id, fp, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (video_id, user_uid, idempotency_key, comment_id, fp, now + ttl_ms),
+                )
+            c = self._get(conn, video_id, comment_id)
+        self._publish(video_id, [thread_event(EVENT_CREATED, video_id, c)])
+        return c
+
+    def edit_comment(self, video_id: str, comment_id: str, content_raw: str) -> dict:
+        now = _now_ms()
+        content_html, render_ver = render_content(content_raw or "")  # outside the write lock
+        with self._write() as conn:
+            cur = conn.execute(
+                "UPDATE comments SET content_raw = ?, content_html = ?, render_ver = ?, edited = 1, updated_at = ? "
+                "WHERE video_id = ? AND id = ?",
+                (content_raw or "", content_html, render_ver, now, video_id, comment_id),
+            )
+            if cur.rowcount == 0:
+                raise KeyError("not_found")
+            self._bump(conn, video_id, now)
+            c = self._get(conn, video_id, comment_id)
+        self._publish(video_id, [thread_event(EVENT_EDITED, video_id, c)])
+        return c
+
+    @staticmethod
+    def _live_delta(conn: sqlite3.Connection, video_id: str, c: dict, deleted: bool) -> dict[str, int]:
+        """Move the live counters on a real soft-delete/restore transition; returns the thread deltas."""
+        if bool(c["is_deleted"]) == deleted:
+            return {}
+        delta = -1 if deleted else 1
+        if not c["parent_id"]:
+            return {"top_live": delta}
+        conn.execute(
+            "UPDATE comments SET reply_live = MAX(reply_live + ?, 0) WHERE video_id = ? AND id = ?",
+            (delta, video_id, c["parent_id"]),
+        )
+        return {}
+
+    def delete_comment(self, video_id: str, comment_id: str, hard_delete: bool) -> dict:
+        now = _now_ms()
+        with self._write() as conn:
+            c = self._get(conn, video_id, comment_id)
+            if c is None:
+                raise KeyError("not_found")
+            parent_id = c["parent_id"]
+            if not hard_delete:
+                conn.execute(
+                    "UPDATE comments SET is_deleted = 1, content_raw = '', content_html = '', updated_at = ? "
+                    "WHERE video_id = ? AND id = ?",
+                    (now, video_id, comment_id),
+                )
+                self._bump(conn, video_id, now, **self._live_delta(conn, video_id, c, True))
+                out = self._get(conn, video_id, comment_id)
+            else:
+                conn.execute("DELETE FROM comments WHERE video_id = ? AND id = ?", (video_id, comment_id))
+                live = 0 if c["is_deleted"] else 1
+                if parent_id:
+                    conn.execute(
+                        "UPDATE comments SET reply_count = MAX(reply_count - 1, 0), reply_live = MAX(reply_live - ?, 0) "
+                        "WHERE video_id = ? AND id = ?",
+                        (live, video_id, parent_id),
+                    )
+                    self._bump(conn, video_id, now, total_count=-1)
+                else:
+                    self._bump(conn, video_id, now, total_count=-1, top_count=-1, top_live=-live)
+                out = dict(
+                    c,
+                    content_raw="",
+                    content_html="",
+                    is_deleted=True,
+                    edited=True,
+                    updated_at=now,
+                )
+        self._publish(video_id, [thread_event(EVENT_DELETED, video_id, out, hard=bool(hard_delete))])
+        return out
+
+    def restore_comment(self, video_id: str, comment_id: str) -> dict:
+        now = _now_ms()
+        with self._write() as conn:
+            c = self._get(conn, video_id, comment_id)
+            if c is None:
+                raise KeyError("not_found")
+            conn.execute(
+                "UPDATE comments SET is_deleted = 0, updated_at = ? WHERE video_id = ? AND id = ?",
+                (now, video_id, comment_id),
+            )
+            self._bump(conn, video_id, now, **self._live_delta(conn, video_id, c, False))
+            out = self._get(conn, video_id, comment_id)
+        self._publish(video_id, [thread_event(EVENT_RESTORED, video_id, out)])
+        return out
+
+    # ---- pages
+
+    def _page(
+        self,
+        conn: sqlite3.Connection,
+        video_id: str,
+        parent_id: str,
+        ver: int,
+        page_size: int,
+        page_token: str,
+        newest_first: bool,
+        include_deleted: bool,
+        rank: str,
+    ) -> tuple[list[dict], str]:
+        """
+        One keyset page: creation order by seq, RANK_TOP by (score, seq) and
+        RANK_HOT (top level) by (hot, seq), ranked orders best first with ties
+        newest first. Legacy offset tokens are honored; a cursor of another
+        order starts over.
+        """
+        page_size = max(int(page_size), 1)
+        if rank == RANK_HOT and parent_id:
+            rank = RANK_TOP
+        if rank == RANK_HOT:
+            cols, desc, where = ("hot", "seq"), True, "video_id = ? AND parent_id = ''"
+            args: list[Any] = [video_id]
+        else:
+            cols = ("score", "seq") if rank == RANK_TOP else ("seq",)
+            desc = bool(newest_first) or rank == RANK_TOP
+            where = "video_id = ? AND parent_id = ?"
+            args = [video_id, parent_id]
+        if not include_deleted:
+            where += " AND is_deleted = 0"
+
+        tok: Union[PageCursor, int] = decode_page_token(page_token)
+        offset = 0
+        if isinstance(tok, PageCursor):
+            if tok.rank == rank and len(tok.key) == len(cols) and (rank or tok.newest_first == bool(newest_first)):
+                row_key = f"({', '.join(cols)})" if len(cols) > 1 else cols[0]
+                marks = f"({', '.join('?' * len(cols))})" if len(cols) > 1 else "?"
+                where += f" AND {row_key} {'<' if desc else '>'} {marks}"
+                args.extend(tok.key)
+        else:
+            offset = tok
+
+        order = ", ".join(f"{c} {'DESC' if desc else 'ASC'}" for c in cols)
+        rows = conn.execute(
+            f"SELECT {_COMMENT_COLS}, hot FROM comments WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            (*args, page_size + 1, offset),
+        ).fetchall()
+        next_token = ""
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_token = encode_cursor(PageCursor(
+                newest_first=bool(newest_first) if not rank else True,
+                key=tuple(int(last[c]) for c in cols),
+                ver=ver,
+                rank=rank,
+            ))
+        out = []
+        for row in rows:
+            c = _comment(row)
+            c.pop("hot", None)
+            out.append(c)
+        return out, next_token
+
+    def _refresh_hot(self, video_id: str) -> None:
+        """Recompute a thread's hot values when the decay parameters changed since they were stored."""
+        params = json.dumps(_hot_params())
+        with self._read() as conn:
+            row = self._thread(conn, video_id)
+            if row is None or row["hot_cfg"] == params:
+                return
+        with self._write() as conn:
+            row = self._thread(conn, video_id)
+            if row is None or row["hot_cfg"] == params:
+                return
+            conn.execute("UPDATE threads SET hot_cfg = ? WHERE video_id = ?", (params, video_id))
+            rows = conn.execute(
+                "SELECT id, score, created_at FROM comments WHERE video_id = ? AND parent_id = ''", (video_id,),
+            ).fetchall()
+            p = json.loads(params)
+            conn.executemany(
+                "UPDATE comments SET hot = ? WHERE video_id = ? AND id = ?",
+                [(hot_value(r["score"], r["created_at"], p), video_id, r["id"]) for r in rows],
+            )
+            self._bump(conn, video_id, _now_ms())
+        log.info("rebuilt hot order of %s (%d comments)", video_id, len(rows))
+
+    def list_top(
+        self,
+        video_id: str,
+        page_size: int,
+        page_token: str,
+        newest_first: bool,
+        include_deleted: bool,
+        rank: str = "",
+        ver: Optional[int] = None,
+    ) -> tuple[list[dict], str, int]:
+        if rank == RANK_HOT:
+            self._refresh_hot(video_id)
+        with self._read() as conn:
+            t = self._thread(conn, video_id)
+            if t is None:
+                return [], "", 0
+            items, next_token = self._page(
+                conn, video_id, "", int(t["ver"]), page_size, page_token, newest_first, include_deleted, rank,
+            )
+            total = int(t["top_count"] if include_deleted else t["top_live"])
+        return items, next_token, max(total, 0)
+
+    def list_replies(
+        self,
+        video_id: str,
+        parent_id: str,
+        page_size: int,
+        page_token: str,
+        newest_first: bool,
+        include_deleted: bool,
+        rank: str = "",
+        ver: Optional[int] = None,
+    ) -> tuple[list[dict], str, int]:
+        parent_id = parent_id or ""
+        with self._read() as conn:
+            parent = self._get(conn, video_id, parent_id) if parent_id else None
+            if parent is None:
+                return [], "", 0
+            t = self._thread(conn, video_id)
+            items, next_token = self._page(
+                conn, video_id, parent_id, int(t["ver"]) if t is not None else 0,
+                page_size, page_token, newest_first, include_deleted, rank,
+            )
+        total = parent["reply_count"] if include_deleted else parent["reply_live"]
+        return items, next_token, max(int(total), 0)
+
+    def export_thread(self, video_id: str, include_deleted: bool, chunk_size: int = 500) -> Iterator[list[dict]]:
+        """
+        Walks top-level comments by seq, one query per chunk, each followed
+        by its replies; like the Couchbase export, not a snapshot.
+        """
+        chunk_size = max(int(chunk_size or 0), 1)
+        deleted = "" if include_deleted else " AND is_deleted = 0"
+        out: list[dict] = []
+        after = -1
+        while True:
+            with self._read() as conn:
+                tops = conn.execute(
+                    f"SELECT {_COMMENT_COLS} FROM comments WHERE video_id = ? AND parent_id = '' AND seq > ?{deleted} "
+                    "ORDER BY seq LIMIT ?",
+                    (video_id, after, chunk_size),
+                ).fetchall()
+            if not tops:
+                break
+            for top in tops:
+                after = int(top["seq"])
+                out.append(_comment(top))
+                if len(out) >= chunk_size:
+                    yield out
+                    out = []
+                if not (top["reply_count"] if include_deleted else top["reply_live"]):
+                    continue
+                reply_after = -1
+                while True:
+                    with self._read() as conn:
+                        replies = conn.execute(
+                            f"SELECT {_COMMENT_COLS} FROM comments WHERE video_id = ? AND parent_id = ? AND seq > ?"
+                            f"{deleted} ORDER BY seq LIMIT ?",
+                            (video_id, top["id"], reply_after, chunk_size),
+                        ).fetchall()
+                    if not replies:
+                        break
+                    for r in replies:
+                        reply_after = int(r["seq"])
+                        out.append(_comment(r))
+                        if len(out) >= chunk_size:
+                            yield out
+                            out = []
+        if out:
+            yield out
+
+    # ---- rendering
+
+    def stale_render_video_ids(self) -> list[str]:
+        rows = self._conn().execute(
+            "SELECT DISTINCT video_id FROM comments WHERE is_deleted = 0 AND render_ver != ?", (RENDERER_VERSION,),
+        ).fetchall()
+        return [r["video_id"] for r in rows]
+
+    def rerender_thread(self, video_id: str) -> int:
+        """Renders outside the write lock, then stores the html only where content_raw is still what was rendered."""
+        with self._read() as conn:
+            rows = conn.execute(
+                "SELECT id, content_raw FROM comments WHERE video_id = ? AND is_deleted = 0 AND render_ver != ?",
+                (video_id, RENDERER_VERSION),
+            ).fetchall()
+        if not rows:
+            return 0
+        updates = [(*render_content(r["content_raw"]), video_id, r["id"], r["content_raw"]) for r in rows]
+        with self._write() as conn:
+            changed = 0
+            for u in updates:
+                changed += conn.execute(
+                    "UPDATE comments SET content_html = ?, render_ver = ? "
+                    "WHERE video_id = ? AND id = ? AND content_raw = ? AND is_deleted = 0",
+                    u,
+                ).rowcount
+            if changed:
+                self._bump(conn, video_id, _now_ms())
+        return changed
+
+    # ---- counts and votes
+
+    def get_counts(self, video_id: str) -> tuple[int, int]:
+        with self._read() as conn:
+            t = self._thread(conn, video_id)
+        if t is None:
+            return 0, 0
+        return int(t["top_count"]), int(t["total_count"])
+
+    def batch_get_counts(self, video_ids: list[str]) -> dict[str, tuple[int, int]]:
+        ids = list(dict.fromkeys(video_ids))
+        out = {v: (0, 0) for v in ids}
+        with self._read() as conn:
+            for i in range(0, len(ids), _IN_CHUNK):
+                part = ids[i:i + _IN_CHUNK]
+                rows = conn.execute(
+                    f"SELECT video_id, top_count, total_count FROM threads "
+                    f"WHERE video_id IN ({', '.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                out.update((r["video_id"], (int(r["top_count"]), int(r["total_count"]))) for r in rows)
+        return out
+
+    def apply_vote(self, video_id: str, user_uid: str, comment_id: str, vote: int) -> tuple[int, int, int]:
+        if vote not in (-1, 0, 1):
+            raise ValueError("invalid vote")
+        now = _now_ms()
+        with self._write() as conn:
+            c = self._get(conn, video_id, comment_id)
+            if c is None:
+                # a vote left behind by a hard delete goes with the comment
+                conn.execute(
+                    "DELETE FROM votes WHERE user_uid = ? AND video_id = ? AND comment_id = ?",
+                    (user_uid, video_id, comment_id),
+                )
+            else:
+                likes, dislikes = self._vote(conn, video_id, user_uid, c, vote, now)
+        if c is None:
+            raise KeyError("not_found")
+        self._publish(video_id, [thread_event(EVENT_VOTED, video_id, comment_id=comment_id, likes=likes, dislikes=dislikes)])
+        return likes, dislikes, vote
+
+    def _vote(self, conn: sqlite3.Connection, video_id: str, user_uid: str, c: dict, vote: int, now: int) -> tuple[int, int]:
+        """Set the user's vote on comment c and move its tallies; returns (likes, dislikes)."""
+        comment_id = c["id"]
+        row = conn.execute(
+            "SELECT vote FROM votes WHERE user_uid = ? AND video_id = ? AND comment_id = ?",
+            (user_uid, video_id, comment_id),
+        ).fetchone()
+        old = int(row["vote"]) if row is not None else 0
+        if vote == old:
+            return int(c["likes"]), int(c["dislikes"])
+        if vote:
+            conn.execute(
+                "INSERT INTO votes (user_uid, video_id, comment_id, vote, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_uid, video_id, comment_id) DO UPDATE SET vote = excluded.vote, "
+                "updated_at = excluded.updated_at",
+                (user_uid, video_id, comment_id, vote, now),
+            )
+        else:
+            conn.execute(
+                "DELETE FROM votes WHERE user_uid = ? AND video_id = ? AND comment_id = ?",
+                (user_uid, video_id, comment_id),
+            )
+        likes = max(int(c["likes"]) + int(vote == 1) - int(old == 1), 0)
+        dislikes = max(int(c["dislikes"]) + int(vote == -1) - int(old == -1), 0)
+        score = likes - dislikes
+        hot = 0 if c["parent_id"] else self._hot_of(conn, video_id, score, int(c["created_at"]))
+        conn.execute(
+            "UPDATE comments SET likes = ?, dislikes = ?, score = ?, hot = ?, updated_at = ? "
+            "WHERE video_id = ? AND id = ?",
+            (likes, dislikes, score, hot, now, video_id, comment_id),
+        )
+        self._bump(conn, video_id, now)
+        return likes, dislikes
+
+    def get_my_votes(self, video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+        video_id = (video_id or "").strip()
+        user_uid = (user_uid or "").strip()
+        ids = list(dict.fromkeys(cid for cid in ((c or "").strip() for c in comment_ids or []) if cid))
+        if not video_id or not user_uid or not ids:
+            return {}
+        out: dict[str, int] = {}
+        with self._read() as conn:
+            for i in range(0, len(ids), _IN_CHUNK):
+                part = ids[i:i + _IN_CHUNK]
+                rows = conn.execute(
+                    f"SELECT comment_id, vote FROM votes WHERE user_uid = ? AND video_id = ? "
+                    f"AND comment_id IN ({', '.join('?' * len(part))})",
+                    (user_uid, video_id, *part),
+                ).fetchall()
+                out.update((r["comment_id"], int(r["vote"])) for r in rows)
+        return out
+
+    def thread_version(self, video_id: str) -> int:
+        row = self._conn().execute("SELECT ver FROM threads WHERE video_id = ?", (video_id,)).fetchone()
+        return int(row["ver"]) if row is not None else 0
+
+    def watch_thread(self, video_id: str, loop: Optional[Any] = None) -> Subscription:
+        return self.events.subscribe(video_id, loop)
+
+    def close(self) -> None:
+        """Close this thread's connection (others close when their threads end)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Iterator, Optional
+
+from config.storage_cfg import storage_cfg
+
+# ---------------------------
+# The comment store as the servicers see it. A backend keeps comments,
+# counts and votes of each video and publishes what its writes changed
+# (WatchThread). Backends: "couchbase" (db/couchbase_db.py, the module
+# functions on the cluster connection) and "sqlite" (db/sqlite_db.py, an
+# embedded database for single-node deployments and CI).
+#
+# Comments are dicts with the fields of the Comment message (id, video_id,
+# parent_id, content_raw, content_html, is_deleted, edited, created_at,
+# updated_at, user_uid, username, channel_id, reply_count, likes, dislikes).
+# Errors: KeyError("not_found") for a missing comment,
+# KeyError("parent_not_found") for a reply to one, ValueError/TimeoutError
+# for idempotency keys (see create_comment).
+# ---------------------------
+
+# Ranked orders (list_* rank argument; "" = creation order)
+RANK_TOP = "top"
+RANK_HOT = "hot"
+
+
+class Storage:
+    """Backend interface; list_top_with_replies has a generic implementation on top of the others."""
+
+    name = ""
+
+    def ping(self) -> bool:
+        raise NotImplementedError
+
+    def create_comment(
+        self,
+        video_id: str,
+        parent_id: str,
+        comment_id: str,
+        content_raw: str,
+        user_uid: str,
+        username: str,
+        channel_id: str,
+        idempotency_key: str = "",
+    ) -> dict:
+        """
+        With an idempotency_key only the first request for it (per video and
+        user) creates the comment; repeats return that comment as it is now.
+        A key reused for different content raises ValueError, a key whose
+        first request is still running TimeoutError.
+        """
+        raise NotImplementedError
+
+    def edit_comment(self, video_id: str, comment_id: str, content_raw: str) -> dict:
+        raise NotImplementedError
+
+    def delete_comment(self, video_id: str, comment_id: str, hard_delete: bool) -> dict:
+        """Soft delete blanks the content and keeps the comment; hard delete removes it (replies stay)."""
+        raise NotImplementedError
+
+    def restore_comment(self, video_id: str, comment_id: str) -> dict:
+        raise NotImplementedError
+
+    def list_top(
+        self,
+        video_id: str,
+        page_size: int,
+        page_token: str,
+        newest_first: bool,
+        include_deleted: bool,
+        rank: str = "",
+        ver: Optional[int] = None,
+    ) -> tuple[list[dict], str, int]:
+        """
+        One page of top-level comments: (comments, next_token or "", total).
+        ver: the thread_version() the caller just read, so a backend can serve
+        the thread it validated for that call instead of checking it again.
+        """
+        raise NotImplementedError
+
+    def list_replies(
+        self,
+        video_id: str,
+        parent_id: str,
+        page_size: int,
+        page_token: str,
+        newest_first: bool,
+        include_deleted: bool,
+        rank: str = "",
+        ver: Optional[int] = None,
+    ) -> tuple[list[dict], str, int]:
+        """Like list_top for the replies of parent_id; RANK_HOT lists them like RANK_TOP."""
+        raise NotImplementedError
+
+    def list_top_with_replies(
+        self,
+        video_id: str,
+        page_size: int,
+        page_token: str,
+        newest_first: bool,
+        include_deleted: bool,
+        rank: str = "",
+        replies_per_comment: int = 3,
+        reply_newest_first: bool = False,
+        reply_rank: str = "",
+        user_uid: str = "",
+    ) -> tuple[list[tuple[dict, list[dict], str, int]], str, int, dict[str, int]]:
+        """
+        A list_top page plus the first replies_per_comment replies of every
+        comment on it, and with user_uid that user's votes on all of them.
+        Returns ([(comment, replies, replies next_token, replies total)], next_token, total, votes).
+        """
+        tops, next_token, total = self.list_top(video_id, page_size, page_token, newest_first, include_deleted, rank)
+        items = []
+        for c in tops:
+            replies: list[dict] = []
+            reply_token, reply_total = "", 0
+            if replies_per_comment > 0 and int(c.get("reply_count", 0) or 0):
+                replies, reply_token, reply_total = self.list_replies(
+                    video_id, c["id"], replies_per_comment, "", reply_newest_first, include_deleted, reply_rank,
+                )
+            items.append((c, replies, reply_token, reply_total))
+        votes: dict[str, int] = {}
+        if user_uid:
+            ids = [d["id"] for c, replies, _, _ in items for d in (c, *replies)]
+            votes = self.get_my_votes(video_id, user_uid, ids)
+        return items, next_token, total, votes
+
+    def export_thread(self, video_id: str, include_deleted: bool, chunk_size: int = 500) -> Iterator[list[dict]]:
+        """Every comment in chunks: top-level comments in creation order, each followed by its replies."""
+        raise NotImplementedError
+
+    def stale_render_video_ids(self) -> list[str]:
+        """Videos with comments rendered by another renderer version (or never)."""
+        raise NotImplementedError
+
+    def rerender_thread(self, video_id: str) -> int:
+        """Re-render the video's stale comments; returns how many were rewritten."""
+        raise NotImplementedError
+
+    def get_counts(self, video_id: str) -> tuple[int, int]:
+        """(top-level comments, all comments), soft-deleted ones included; unknown videos get (0, 0), nothing is created."""
+        raise NotImplementedError
+
+    def batch_get_counts(self, video_ids: list[str]) -> dict[str, tuple[int, int]]:
+        """get_counts of many videos; unknown videos get (0, 0) and nothing is created for them."""
+        return {v: self.get_counts(v) for v in dict.fromkeys(video_ids)}
+
+    def apply_vote(self, video_id: str, user_uid: str, comment_id: str, vote: int) -> tuple[int, int, int]:
+        """vote: -1, 0 (clear) or 1. Returns (likes, dislikes, my_vote)."""
+        raise NotImplementedError
+
+    def get_my_votes(self, video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+        """comment_id -> the user's vote; comments without one may be left out."""
+        raise NotImplementedError
+
+    def thread_version(self, video_id: str) -> int:
+        """Changes with every write to the video (keys the response cache)."""
+        raise NotImplementedError
+
+    def watch_thread(self, video_id: str, loop: Optional[Any] = None) -> Any:
+        """utils.pubsub_ut.Subscription to the video's events; pass the event loop when reading with aget()."""
+        raise NotImplementedError
+
+    def start_hot_reranker(self, stop: threading.Event) -> Optional[threading.Thread]:
+        """Background upkeep of the hot orders until `stop` is set, for backends that need it (None if not)."""
+        return None
+
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """The backend storage_cfg.backend names, created on first use."""
+    global _storage
+    if _storage is not None:
+        return _storage
+    with _storage_lock:
+        if _storage is None:
+            if storage_cfg.backend == "couchbase":
+                from db.couchbase_db import CouchbaseStorage
+                _storage = CouchbaseStorage()
+            elif storage_cfg.backend == "sqlite":
+                from db.sqlite_db import SqliteStorage
+                _storage = SqliteStorage(storage_cfg.sqlite_path)
+            else:
+                raise ValueError(f"unknown YTCOMMENTS_STORAGE: {storage_cfg.backend!r} (couchbase|sqlite)")
+    return _storage
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import signal
 import threading
@@ -17,42 +18,63 @@ except Exception:
     pass
 
 from config.app_cfg import app_cfg
-from db.couchbase_db import ping
+from config.metrics_cfg import metrics_cfg
+from config.profile_cfg import profile_cfg
+from config.storage_cfg import storage_cfg
+from db.storage import get_storage
+from utils.metrics_ut import metrics, serve_prometheus
 
-from proto import ytcomments_pb2_grpc as ytcomments_pbg
 from proto import info_pb2_grpc as info_pbg
 
-from srv.ytcomments_grpc_srv import YtCommentsServicer
+from srv.ytcomments_grpc_srv import YtCommentsServicer, add_servicer_to_server
 from srv.info_grpc_srv import InfoServicer
+from srv.metrics_interceptor import AioMetricsInterceptor, MetricsInterceptor
+from srv.profile_interceptor import AioProfileInterceptor, ProfileInterceptor
 
 log = logging.getLogger("main")
 
 
-def main() -> None:
-    setup_logging()
-    log.info("starting ytcomments (grpc) on %s:%s", app_cfg.grpc_host, app_cfg.grpc_port)
+# Enable gRPC Server Reflection (service full names)
+SERVICE_NAMES = (
+    "ytcomments.v1.YtComments",
+    "ytcomments.v1.Info",
+    reflection.SERVICE_NAME,
+)
 
-    if not ping():
-        raise SystemExit("Couchbase ping failed; refusing to start")
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
-    ytcomments_pbg.add_YtCommentsServicer_to_server(YtCommentsServicer(), server)
-    info_pbg.add_InfoServicer_to_server(InfoServicer(), server)
+def _start_metrics_endpoint() -> None:
+    if metrics_cfg.enabled and metrics_cfg.prometheus_port:
+        serve_prometheus(metrics, metrics_cfg.prometheus_host, metrics_cfg.prometheus_port, prefix="ytcomments")
 
-    # Enable gRPC Server Reflection (service full names)
-    service_names = (
-        "ytcomments.v1.YtComments",
-        "ytcomments.v1.Info",
-        reflection.SERVICE_NAME,
-    )
-    reflection.enable_server_reflection(service_names, server)
+
+def _interceptors(aio: bool) -> list | None:
+    out = []
+    if metrics_cfg.enabled:
+        out.append(AioMetricsInterceptor() if aio else MetricsInterceptor())
+    if profile_cfg.enabled:
+        out.append(AioProfileInterceptor() if aio else ProfileInterceptor())
+    return out or None
+
+
+def serve_sync() -> None:
+    storage = get_storage()
+    if not storage.ping():
+        raise SystemExit(f"{storage.name} ping failed; refusing to start")
+
+    stop_event = threading.Event()
+    storage.start_hot_reranker(stop_event)
+    _start_metrics_endpoint()
+
+    pool = futures.ThreadPoolExecutor(max_workers=app_cfg.grpc_max_workers)
+    server = grpc.server(pool, interceptors=_interceptors(aio=False))
+    add_servicer_to_server(YtCommentsServicer(storage), server)
+    info_pbg.add_InfoServicer_to_server(InfoServicer(), server)
+    reflection.enable_server_reflection(SERVICE_NAMES, server)
 
     server.add_insecure_port(f"{app_cfg.grpc_host}:{app_cfg.grpc_port}")
     server.start()
     log.info("server started")
 
-    stop_event = threading.Event()
-
     def _on_signal(signum, frame):  # noqa: ARG001
         if not stop_event.is_set():
             log.info("signal %s received; shutting down...", signum)
@@ -76,5 +98,86 @@ def main() -> None:
         log.warning("server stop error: %s", e)
 
 
+async def serve_async() -> None:
+    from db import couchbase_aio
+    from srv.ytcomments_aio_srv import YtCommentsAioServicer
+
+    if storage_cfg.backend != "couchbase":
+        raise SystemExit(f"YTCOMMENTS_GRPC_MODE=async needs YTCOMMENTS_STORAGE=couchbase, not {storage_cfg.backend!r}")
+    storage = get_storage()
+    if not storage.ping() or not await couchbase_aio.ping():
+        raise SystemExit("Couchbase ping failed; refusing to start")
+
+    reranker_stop = threading.Event()
+    storage.start_hot_reranker(reranker_stop)
+    _start_metrics_endpoint()
+
+    # runs the sync Info servicer
+    pool = futures.ThreadPoolExecutor(max_workers=app_cfg.grpc_max_workers)
+    server = grpc.aio.server(
+        migration_thread_pool=pool,
+        maximum_concurrent_rpcs=(app_cfg.grpc_max_concurrent_rpcs or None),
+        interceptors=_interceptors(aio=True),
+    )
+    add_servicer_to_server(YtCommentsAioServicer(), server)
+    info_pbg.add_InfoServicer_to_server(InfoServicer(), server)
+    reflection.enable_server_reflection(SERVICE_NAMES, server)
+
+    server.add_insecure_port(f"{app_cfg.grpc_host}:{app_cfg.grpc_port}")
+    await server.start()
+    log.info("server started (async)")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def _on_signal(signum: int) -> None:
+        if not stop_event.is_set():
+            log.info("signal %s received; shutting down...", signum)
+            stop_event.set()
+        else:
+            log.warning("signal %s received again; forcing stop", signum)
+            loop.create_task(server.stop(grace=0))
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, _on_signal, signum)
+
+    await stop_event.wait()
+    reranker_stop.set()
+
+    try:
+        await asyncio.wait_for(server.stop(grace=5), timeout=6)
+        log.info("server stopped")
+    except Exception as e:
+        log.warning("server stop error: %s", e)
+
+
+def _run_async() -> None:
+    try:
+        import uvloop  # type: ignore
+    except Exception:
+        log.warning("uvloop not available; using the default asyncio loop")
+        asyncio.run(serve_async())
+        return
+    uvloop.run(serve_async())
+
+
+def main() -> None:
+    setup_logging()
+    log.info(
+        "starting ytcomments (grpc, %s, %s storage) on %s:%s",
+        app_cfg.grpc_mode,
+        storage_cfg.backend,
+        app_cfg.grpc_host,
+        app_cfg.grpc_port,
+    )
+
+    if app_cfg.grpc_mode == "async":
+        _run_async()
+    elif app_cfg.grpc_mode == "sync":
+        serve_sync()
+    else:
+        raise SystemExit(f"unknown YTCOMMENTS_GRPC_MODE: {app_cfg.grpc_mode!r} (sync|async)")
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
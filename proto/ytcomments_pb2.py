@@ -24,15 +24,17 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10ytcomments.proto\x12\rytcomments.v1\"\x93\x01\n\x0bUserContext\x12\x10\n\x08user_uid\x18\x01 \x01(\t\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x12\n\nchannel_id\x18\x03 \x01(\t\x12\x16\n\x0eis_video_owner\x18\x04 \x01(\x08\x12\x14\n\x0cis_moderator\x18\x05 \x01(\x08\x12\n\n\x02ip\x18\x06 \x01(\t\x12\x12\n\nuser_agent\x18\x07 \x01(\t\"\x9f\x02\n\x07\x43omment\x12\n\n\x02id\x18\x01 \x01(\t\x12\x10\n\x08video_id\x18\x02 \x01(\t\x12\x11\n\tparent_id\x18\x03 \x01(\t\x12\x13\n\x0b\x63ontent_raw\x18\x04 \x01(\t\x12\x14\n\x0c\x63ontent_html\x18\x05 \x01(\t\x12\x12\n\nis_deleted\x18\x06 \x01(\x08\x12\x0e\n\x06\x65\x64ited\x18\x07 \x01(\x08\x12\x12\n\ncreated_at\x18\x08 \x01(\x03\x12\x12\n\nupdated_at\x18\t \x01(\x03\x12\x10\n\x08user_uid\x18\n \x01(\t\x12\x10\n\x08username\x18\x0b \x01(\t\x12\x12\n\nchannel_id\x18\x0c \x01(\t\x12\x13\n\x0breply_count\x18\r \x01(\x05\x12\r\n\x05likes\x18\x0e \x01(\x05\x12\x10\n\x08\x64islikes\x18\x0f \x01(\x05\"\xb3\x01\n\x0eListTopRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\x12&\n\x04sort\x18\x04 \x01(\x0e\x32\x18.ytcomments.v1.SortOrder\x12\x17\n\x0finclude_deleted\x18\x05 \x01(\x08\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"f\n\x0fListTopResponse\x12%\n\x05items\x18\x01 \x03(\x0b\x32\x16.ytcomments.v1.Comment\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\x12\x13\n\x0btotal_count\x18\x03 \x01(\x05\"\xca\x01\n\x12ListRepliesRequest\x12\x10\n\x08video_id\x18\n \x01(\t\x12\x11\n\tparent_id\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\x12&\n\x04sort\x18\x04 \x01(\x0e\x32\x18.ytcomments.v1.SortOrder\x12\x17\n\x0finclude_deleted\x18\x05 \x01(\x08\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"j\n\x13ListRepliesResponse\x12%\n\x05items\x18\x01 \x03(\x0b\x32\x16.ytcomments.v1.Comment\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\x12\x13\n\x0btotal_count\x18\x03 \x01(\x05\"\x92\x01\n\x14\x43reateCommentRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x11\n\tparent_id\x18\x02 \x01(\t\x12\x13\n\x0b\x63ontent_raw\x18\x03 \x01(\t\x12\x17\n\x0fidempotency_key\x18\x04 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"@\n\x15\x43reateCommentResponse\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\"x\n\x12\x45\x64itCommentRequest\x12\x10\n\x08video_id\x18\n \x01(\t\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x13\n\x0b\x63ontent_raw\x18\x02 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\">\n\x13\x45\x64itCommentResponse\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\"z\n\x14\x44\x65leteCommentRequest\x12\x10\n\x08video_id\x18\n \x01(\t\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x13\n\x0bhard_delete\x18\x02 \x01(\x08\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"@\n\x15\x44\x65leteCommentResponse\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\"f\n\x15RestoreCommentRequest\x12\x10\n\x08video_id\x18\n \x01(\t\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"A\n\x16RestoreCommentResponse\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\"M\n\x10GetCountsRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"A\n\x11GetCountsResponse\x12\x17\n\x0ftop_level_count\x18\x01 \x01(\x05\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\"j\n\x0bVoteRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x12\n\ncomment_id\x18\x02 \x01(\t\x12\x0c\n\x04vote\x18\x03 \x01(\x05\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"]\n\x0cVoteResponse\x12\n\n\x02ok\x18\x01 \x01(\x08\x12\r\n\x05likes\x18\x02 \x01(\x05\x12\x10\n\x08\x64islikes\x18\x03 \x01(\x05\x12\x0f\n\x07my_vote\x18\x04 \x01(\x05\x12\x0f\n\x07user_id\x18\x05 \x01(\t\"c\n\x11GetMyVotesRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x13\n\x0b\x63omment_ids\x18\x02 \x03(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"/\n\x0b\x43ommentVote\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x0c\n\x04vote\x18\x02 \x01(\x05\"?\n\x12GetMyVotesResponse\x12)\n\x05votes\x18\x01 \x03(\x0b\x32\x1a.ytcomments.v1.CommentVote*E\n\tSortOrder\x12\x14\n\x10SORT_UNSPECIFIED\x10\x00\x12\x10\n\x0cNEWEST_FIRST\x10\x01\x12\x10\n\x0cOLDEST_FIRST\x10\x02\x32\xe1\x05\n\nYtComments\x12H\n\x07ListTop\x12\x1d.ytcomments.v1.ListTopRequest\x1a\x1e.ytcomments.v1.ListTopResponse\x12T\n\x0bListReplies\x12!.ytcomments.v1.ListRepliesRequest\x1a\".ytcomments.v1.ListRepliesResponse\x12S\n\x06\x43reate\x12#.ytcomments.v1.CreateCommentRequest\x1a$.ytcomments.v1.CreateCommentResponse\x12M\n\x04\x45\x64it\x12!.ytcomments.v1.EditCommentRequest\x1a\".ytcomments.v1.EditCommentResponse\x12S\n\x06\x44\x65lete\x12#.ytcomments.v1.DeleteCommentRequest\x1a$.ytcomments.v1.DeleteCommentResponse\x12V\n\x07Restore\x12$.ytcomments.v1.RestoreCommentRequest\x1a%.ytcomments.v1.RestoreCommentResponse\x12N\n\tGetCounts\x12\x1f.ytcomments.v1.GetCountsRequest\x1a .ytcomments.v1.GetCountsResponse\x12?\n\x04Vote\x12\x1a.ytcomments.v1.VoteRequest\x1a\x1b.ytcomments.v1.VoteResponse\x12Q\n\nGetMyVotes\x12 .ytcomments.v1.GetMyVotesRequest\x1a!.ytcomments.v1.GetMyVotesResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10ytcomments.proto\x12\rytcomments.v1\"\x93\x01\n\x0bUserContext\x12\x10\n\x08user_uid\x18\x01 \x01(\t\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x12\n\nchannel_id\x18\x03 \x01(\t\x12\x16\n\x0eis_video_owner\x18\x04 \x01(\x08\x12\x14\n\x0cis_moderator\x18\x05 \x01(\x08\x12\n\n\x02ip\x18\x06 \x01(\t\x12\x12\n\nuser_agent\x18\x07 \x01(\t\"\x9f\x02\n\x07\x43omment\x12\n\n\x02id\x18\x01 \x01(\t\x12\x10\n\x08video_id\x18\x02 \x01(\t\x12\x11\n\tparent_id\x18\x03 \x01(\t\x12\x13\n\x0b\x63ontent_raw\x18\x04 \x01(\t\x12\x14\n\x0c\x63ontent_html\x18\x05 \x01(\t\x12\x12\n\nis_deleted\x18\x06 \x01(\x08\x12\x0e\n\x06\x65\x64ited\x18\x07 \x01(\x08\x12\x12\n\ncreated_at\x18\x08 \x01(\x03\x12\x12\n\nupdated_at\x18\t \x01(\x03\x12\x10\n\x08user_uid\x18\n \x01(\t\x12\x10\n\x08username\x18\x0b \x01(\t\x12\x12\n\nchannel_id\x18\x0c \x01(\t\x12\x13\n\x0breply_count\x18\r \x01(\x05\x12\r\n\x05likes\x18\x0e \x01(\x05\x12\x10\n\x08\x64islikes\x18\x0f \x01(\x05\"\xb3\x01\n\x0eListTopRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\x12&\n\x04sort\x18\x04 \x01(\x0e\x32\x18.ytcomments.v1.SortOrder\x12\x17\n\x0finclude_deleted\x18\x05 \x01(\x08\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"f\n\x0fListTopResponse\x12%\n\x05items\x18\x01 \x03(\x0b\x32\x16.ytcomments.v1.Comment\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\x12\x13\n\x0btotal_count\x18\x03 \x01(\x05\"\xca\x01\n\x12ListRepliesRequest\x12\x10\n\x08video_id\x18\n \x01(\t\x12\x11\n\tparent_id\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\x12&\n\x04sort\x18\x04 \x01(\x0e\x32\x18.ytcomments.v1.SortOrder\x12\x17\n\x0finclude_deleted\x18\x05 \x01(\x08\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"j\n\x13ListRepliesResponse\x12%\n\x05items\x18\x01 \x03(\x0b\x32\x16.ytcomments.v1.Comment\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\x12\x13\n\x0btotal_count\x18\x03 \x01(\x05\"\x92\x01\n\x14\x43reateCommentRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x11\n\tparent_id\x18\x02 \x01(\t\x12\x13\n\x0b\x63ontent_raw\x18\x03 \x01(\t\x12\x17\n\x0fidempotency_key\x18\x04 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"@\n\x15\x43reateCommentResponse\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\"x\n\x12\x45\x64itCommentRequest\x12\x10\n\x08video_id\x18\n \x01(\t\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x13\n\x0b\x63ontent_raw\x18\x02 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\">\n\x13\x45\x64itCommentResponse\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\"z\n\x14\x44\x65leteCommentRequest\x12\x10\n\x08video_id\x18\n \x01(\t\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x13\n\x0bhard_delete\x18\x02 \x01(\x08\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"@\n\x15\x44\x65leteCommentResponse\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\"f\n\x15RestoreCommentRequest\x12\x10\n\x08video_id\x18\n \x01(\t\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"A\n\x16RestoreCommentResponse\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\"M\n\x10GetCountsRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"A\n\x11GetCountsResponse\x12\x17\n\x0ftop_level_count\x18\x01 \x01(\x05\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\"S\n\x15\x42\x61tchGetCountsRequest\x12\x11\n\tvideo_ids\x18\x01 \x03(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"M\n\x0bVideoCounts\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x17\n\x0ftop_level_count\x18\x02 \x01(\x05\x12\x13\n\x0btotal_count\x18\x03 \x01(\x05\"C\n\x16\x42\x61tchGetCountsResponse\x12)\n\x05items\x18\x01 \x03(\x0b\x32\x1a.ytcomments.v1.VideoCounts\"j\n\x0bVoteRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x12\n\ncomment_id\x18\x02 \x01(\t\x12\x0c\n\x04vote\x18\x03 \x01(\x05\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"]\n\x0cVoteResponse\x12\n\n\x02ok\x18\x01 \x01(\x08\x12\r\n\x05likes\x18\x02 \x01(\x05\x12\x10\n\x08\x64islikes\x18\x03 \x01(\x05\x12\x0f\n\x07my_vote\x18\x04 \x01(\x05\x12\x0f\n\x07user_id\x18\x05 \x01(\t\"c\n\x11GetMyVotesRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x13\n\x0b\x63omment_ids\x18\x02 \x03(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"/\n\x0b\x43ommentVote\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x0c\n\x04vote\x18\x02 \x01(\x05\"?\n\x12GetMyVotesResponse\x12)\n\x05votes\x18\x01 \x03(\x0b\x32\x1a.ytcomments.v1.CommentVote\"\xa3\x02\n\x19ListTopWithRepliesRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\x12&\n\x04sort\x18\x04 \x01(\x0e\x32\x18.ytcomments.v1.SortOrder\x12\x17\n\x0finclude_deleted\x18\x05 \x01(\x08\x12\x1b\n\x13replies_per_comment\x18\x06 \x01(\x05\x12,\n\nreply_sort\x18\x07 \x01(\x0e\x32\x18.ytcomments.v1.SortOrder\x12\x18\n\x10include_my_votes\x18\x08 \x01(\x08\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"\xa4\x01\n\x12\x43ommentWithReplies\x12\'\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x16.ytcomments.v1.Comment\x12\'\n\x07replies\x18\x02 \x03(\x0b\x32\x16.ytcomments.v1.Comment\x12\x1f\n\x17replies_next_page_token\x18\x03 \x01(\t\x12\x1b\n\x13replies_total_count\x18\x04 \x01(\x05\"\xaa\x01\n\x1aListTopWithRepliesResponse\x12\x30\n\x05items\x18\x01 \x03(\x0b\x32!.ytcomments.v1.CommentWithReplies\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\x12\x13\n\x0btotal_count\x18\x03 \x01(\x05\x12,\n\x08my_votes\x18\x04 \x03(\x0b\x32\x1a.ytcomments.v1.CommentVote\"O\n\x12WatchThreadRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\"\xe0\x01\n\x0bThreadEvent\x12,\n\x04type\x18\x01 \x01(\x0e\x32\x1e.ytcomments.v1.ThreadEventType\x12\x10\n\x08video_id\x18\x02 \x01(\t\x12\x12\n\ncomment_id\x18\x03 \x01(\t\x12\x11\n\tparent_id\x18\x04 \x01(\t\x12\'\n\x07\x63omment\x18\x05 \x01(\x0b\x32\x16.ytcomments.v1.Comment\x12\x14\n\x0chard_deleted\x18\x06 \x01(\x08\x12\r\n\x05likes\x18\x07 \x01(\x05\x12\x10\n\x08\x64islikes\x18\x08 \x01(\x05\x12\n\n\x02\x61t\x18\t \x01(\x03\"}\n\x13\x45xportThreadRequest\x12\x10\n\x08video_id\x18\x01 \x01(\t\x12\x17\n\x0finclude_deleted\x18\x02 \x01(\x08\x12\x12\n\nchunk_size\x18\x03 \x01(\x05\x12\'\n\x03\x63tx\x18\x64 \x01(\x0b\x32\x1a.ytcomments.v1.UserContext\":\n\x11\x45xportThreadChunk\x12%\n\x05items\x18\x01 \x03(\x0b\x32\x16.ytcomments.v1.Comment*]\n\tSortOrder\x12\x14\n\x10SORT_UNSPECIFIED\x10\x00\x12\x10\n\x0cNEWEST_FIRST\x10\x01\x12\x10\n\x0cOLDEST_FIRST\x10\x02\x12\r\n\tTOP_RATED\x10\x03\x12\x07\n\x03HOT\x10\x04*\xa5\x01\n\x0fThreadEventType\x12\x1c\n\x18THREAD_EVENT_UNSPECIFIED\x10\x00\x12\x13\n\x0f\x43OMMENT_CREATED\x10\x01\x12\x12\n\x0e\x43OMMENT_EDITED\x10\x02\x12\x13\n\x0f\x43OMMENT_DELETED\x10\x03\x12\x14\n\x10\x43OMMENT_RESTORED\x10\x04\x12\x11\n\rCOMMENT_VOTED\x10\x05\x12\r\n\tHEARTBEAT\x10\x06\x32\xd3\x08\n\nYtComments\x12H\n\x07ListTop\x12\x1d.ytcomments.v1.ListTopRequest\x1a\x1e.ytcomments.v1.ListTopResponse\x12T\n\x0bListReplies\x12!.ytcomments.v1.ListRepliesRequest\x1a\".ytcomments.v1.ListRepliesResponse\x12S\n\x06\x43reate\x12#.ytcomments.v1.CreateCommentRequest\x1a$.ytcomments.v1.CreateCommentResponse\x12M\n\x04\x45\x64it\x12!.ytcomments.v1.EditCommentRequest\x1a\".ytcomments.v1.EditCommentResponse\x12S\n\x06\x44\x65lete\x12#.ytcomments.v1.DeleteCommentRequest\x1a$.ytcomments.v1.DeleteCommentResponse\x12V\n\x07Restore\x12$.ytcomments.v1.RestoreCommentRequest\x1a%.ytcomments.v1.RestoreCommentResponse\x12N\n\tGetCounts\x12\x1f.ytcomments.v1.GetCountsRequest\x1a .ytcomments.v1.GetCountsResponse\x12]\n\x0e\x42\x61tchGetCounts\x12$.ytcomments.v1.BatchGetCountsRequest\x1a%.ytcomments.v1.BatchGetCountsResponse\x12?\n\x04Vote\x12\x1a.ytcomments.v1.VoteRequest\x1a\x1b.ytcomments.v1.VoteResponse\x12Q\n\nGetMyVotes\x12 .ytcomments.v1.GetMyVotesRequest\x1a!.ytcomments.v1.GetMyVotesResponse\x12i\n\x12ListTopWithReplies\x12(.ytcomments.v1.ListTopWithRepliesRequest\x1a).ytcomments.v1.ListTopWithRepliesResponse\x12N\n\x0bWatchThread\x12!.ytcomments.v1.WatchThreadRequest\x1a\x1a.ytcomments.v1.ThreadEvent0\x01\x12V\n\x0c\x45xportThread\x12\".ytcomments.v1.ExportThreadRequest\x1a .ytcomments.v1.ExportThreadChunk0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'ytcomments_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_SORTORDER']._serialized_start=2400
-  _globals['_SORTORDER']._serialized_end=2469
+  _globals['_SORTORDER']._serialized_start=3762
+  _globals['_SORTORDER']._serialized_end=3855
+  _globals['_THREADEVENTTYPE']._serialized_start=3858
+  _globals['_THREADEVENTTYPE']._serialized_end=4023
   _globals['_USERCONTEXT']._serialized_start=36
   _globals['_USERCONTEXT']._serialized_end=183
   _globals['_COMMENT']._serialized_start=186
@@ -65,16 +67,36 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_GETCOUNTSREQUEST']._serialized_end=1913
   _globals['_GETCOUNTSRESPONSE']._serialized_start=1915
   _globals['_GETCOUNTSRESPONSE']._serialized_end=1980
-  _globals['_VOTEREQUEST']._serialized_start=1982
-  _globals['_VOTEREQUEST']._serialized_end=2088
-  _globals['_VOTERESPONSE']._serialized_start=2090
-  _globals['_VOTERESPONSE']._serialized_end=2183
-  _globals['_GETMYVOTESREQUEST']._serialized_start=2185
-  _globals['_GETMYVOTESREQUEST']._serialized_end=2284
-  _globals['_COMMENTVOTE']._serialized_start=2286
-  _globals['_COMMENTVOTE']._serialized_end=2333
-  _globals['_GETMYVOTESRESPONSE']._serialized_start=2335
-  _globals['_GETMYVOTESRESPONSE']._serialized_end=2398
-  _globals['_YTCOMMENTS']._serialized_start=2472
-  _globals['_YTCOMMENTS']._serialized_end=3209
+  _globals['_BATCHGETCOUNTSREQUEST']._serialized_start=1982
+  _globals['_BATCHGETCOUNTSREQUEST']._serialized_end=2065
+  _globals['_VIDEOCOUNTS']._serialized_start=2067
+  _globals['_VIDEOCOUNTS']._serialized_end=2144
+  _globals['_BATCHGETCOUNTSRESPONSE']._serialized_start=2146
+  _globals['_BATCHGETCOUNTSRESPONSE']._serialized_end=2213
+  _globals['_VOTEREQUEST']._serialized_start=2215
+  _globals['_VOTEREQUEST']._serialized_end=2321
+  _globals['_VOTERESPONSE']._serialized_start=2323
+  _globals['_VOTERESPONSE']._serialized_end=2416
+  _globals['_GETMYVOTESREQUEST']._serialized_start=2418
+  _globals['_GETMYVOTESREQUEST']._serialized_end=2517
+  _globals['_COMMENTVOTE']._serialized_start=2519
+  _globals['_COMMENTVOTE']._serialized_end=2566
+  _globals['_GETMYVOTESRESPONSE']._serialized_start=2568
+  _globals['_GETMYVOTESRESPONSE']._serialized_end=2631
+  _globals['_LISTTOPWITHREPLIESREQUEST']._serialized_start=2634
+  _globals['_LISTTOPWITHREPLIESREQUEST']._serialized_end=2925
+  _globals['_COMMENTWITHREPLIES']._serialized_start=2928
+  _globals['_COMMENTWITHREPLIES']._serialized_end=3092
+  _globals['_LISTTOPWITHREPLIESRESPONSE']._serialized_start=3095
+  _globals['_LISTTOPWITHREPLIESRESPONSE']._serialized_end=3265
+  _globals['_WATCHTHREADREQUEST']._serialized_start=3267
+  _globals['_WATCHTHREADREQUEST']._serialized_end=3346
+  _globals['_THREADEVENT']._serialized_start=3349
+  _globals['_THREADEVENT']._serialized_end=3573
+  _globals['_EXPORTTHREADREQUEST']._serialized_start=3575
+  _globals['_EXPORTTHREADREQUEST']._serialized_end=3700
+  _globals['_EXPORTTHREADCHUNK']._serialized_start=3702
+  _globals['_EXPORTTHREADCHUNK']._serialized_end=3760
+  _globals['_YTCOMMENTS']._serialized_start=4026
+  _globals['_YTCOMMENTS']._serialized_end=5133
 # @@protoc_insertion_point(module_scope)
@@ -69,6 +69,11 @@ class YtCommentsStub(object):
                 request_serializer=ytcomments__pb2.GetCountsRequest.SerializeToString,
                 response_deserializer=ytcomments__pb2.GetCountsResponse.FromString,
                 _registered_method=True)
+        self.BatchGetCounts = channel.unary_unary(
+                '/ytcomments.v1.YtComments/BatchGetCounts',
+                request_serializer=ytcomments__pb2.BatchGetCountsRequest.SerializeToString,
+                response_deserializer=ytcomments__pb2.BatchGetCountsResponse.FromString,
+                _registered_method=True)
         self.Vote = channel.unary_unary(
                 '/ytcomments.v1.YtComments/Vote',
                 request_serializer=ytcomments__pb2.VoteRequest.SerializeToString,
@@ -79,6 +84,21 @@ class YtCommentsStub(object):
                 request_serializer=ytcomments__pb2.GetMyVotesRequest.SerializeToString,
                 response_deserializer=ytcomments__pb2.GetMyVotesResponse.FromString,
                 _registered_method=True)
+        self.ListTopWithReplies = channel.unary_unary(
+                '/ytcomments.v1.YtComments/ListTopWithReplies',
+                request_serializer=ytcomments__pb2.ListTopWithRepliesRequest.SerializeToString,
+                response_deserializer=ytcomments__pb2.ListTopWithRepliesResponse.FromString,
+                _registered_method=True)
+        self.WatchThread = channel.unary_stream(
+                '/ytcomments.v1.YtComments/WatchThread',
+                request_serializer=ytcomments__pb2.WatchThreadRequest.SerializeToString,
+                response_deserializer=ytcomments__pb2.ThreadEvent.FromString,
+                _registered_method=True)
+        self.ExportThread = channel.unary_stream(
+                '/ytcomments.v1.YtComments/ExportThread',
+                request_serializer=ytcomments__pb2.ExportThreadRequest.SerializeToString,
+                response_deserializer=ytcomments__pb2.ExportThreadChunk.FromString,
+                _registered_method=True)
 
 
 class YtCommentsServicer(object):
@@ -126,6 +146,12 @@ class YtCommentsServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchGetCounts(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def Vote(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -138,6 +164,26 @@ class YtCommentsServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ListTopWithReplies(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchThread(self, request, context):
+        """Stream of the video's writes from now on. Ends with RESOURCE_EXHAUSTED if the
+        client falls too far behind; reload the thread and watch again.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ExportThread(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_YtCommentsServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -176,6 +222,11 @@ def add_YtCommentsServicer_to_server(servicer, server):
                     request_deserializer=ytcomments__pb2.GetCountsRequest.FromString,
                     response_serializer=ytcomments__pb2.GetCountsResponse.SerializeToString,
             ),
+            'BatchGetCounts': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetCounts,
+                    request_deserializer=ytcomments__pb2.BatchGetCountsRequest.FromString,
+                    response_serializer=ytcomments__pb2.BatchGetCountsResponse.SerializeToString,
+            ),
             'Vote': grpc.unary_unary_rpc_method_handler(
                     servicer.Vote,
                     request_deserializer=ytcomments__pb2.VoteRequest.FromString,
@@ -186,6 +237,21 @@ def add_YtCommentsServicer_to_server(servicer, server):
                     request_deserializer=ytcomments__pb2.GetMyVotesRequest.FromString,
                     response_serializer=ytcomments__pb2.GetMyVotesResponse.SerializeToString,
             ),
+            'ListTopWithReplies': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListTopWithReplies,
+                    request_deserializer=ytcomments__pb2.ListTopWithRepliesRequest.FromString,
+                    response_serializer=ytcomments__pb2.ListTopWithRepliesResponse.SerializeToString,
+            ),
+            'WatchThread': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchThread,
+                    request_deserializer=ytcomments__pb2.WatchThreadRequest.FromString,
+                    response_serializer=ytcomments__pb2.ThreadEvent.SerializeToString,
+            ),
+            'ExportThread': grpc.unary_stream_rpc_method_handler(
+                    servicer.ExportThread,
+                    request_deserializer=ytcomments__pb2.ExportThreadRequest.FromString,
+                    response_serializer=ytcomments__pb2.ExportThreadChunk.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'ytcomments.v1.YtComments', rpc_method_handlers)
@@ -386,6 +452,33 @@ class YtComments(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def BatchGetCounts(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ytcomments.v1.YtComments/BatchGetCounts',
+            ytcomments__pb2.BatchGetCountsRequest.SerializeToString,
+            ytcomments__pb2.BatchGetCountsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def Vote(request,
             target,
@@ -439,3 +532,84 @@ class YtComments(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def ListTopWithReplies(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ytcomments.v1.YtComments/ListTopWithReplies',
+            ytcomments__pb2.ListTopWithRepliesRequest.SerializeToString,
+            ytcomments__pb2.ListTopWithRepliesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchThread(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/ytcomments.v1.YtComments/WatchThread',
+            ytcomments__pb2.WatchThreadRequest.SerializeToString,
+            ytcomments__pb2.ThreadEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ExportThread(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/ytcomments.v1.YtComments/ExportThread',
+            ytcomments__pb2.ExportThreadRequest.SerializeToString,
+            ytcomments__pb2.ExportThreadChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -7,6 +7,7 @@ from typing import Dict
 import grpc
 
 from config.app_cfg import app_cfg
+from utils.metrics_ut import metrics
 from utils.time_ut import uptime_sec
 
 from proto import info_pb2, info_pb2_grpc
@@ -26,7 +27,7 @@ class InfoServicer(info_pb2_grpc.InfoServicer):
             version=app_cfg.version,
             uptime=int(uptime_sec()),
             labels=labels,
-            metrics={},
+            metrics=metrics.snapshot(request.selector),
             build_hash=app_cfg.build_hash,
             build_time=app_cfg.build_time,
         )
\ No newline at end of file
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import inspect
+import logging
+import time
+from typing import Any, Callable
+
+import grpc
+
+from utils.metrics_ut import metrics
+
+log = logging.getLogger("metrics_interceptor")
+
+
+def _method_name(handler_call_details) -> str:
+    return (handler_call_details.method or "").rsplit("/", 1)[-1] or "unknown"
+
+
+def _status(context, failed: bool) -> str:
+    """Status code name of a finished RPC; UNKNOWN for an exception without one."""
+    code = None
+    try:
+        code = context.code()
+    except Exception:
+        pass
+    if isinstance(code, grpc.StatusCode):
+        return code.name
+    return "UNKNOWN" if failed else "OK"
+
+
+class _Rpc:
+    """Per-method metrics: rpc.requests, rpc.errors{code}, rpc.latency_ms, rpc.in_flight."""
+
+    __slots__ = ("method", "requests", "latency", "in_flight")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.requests = metrics.counter("rpc.requests", method=method)
+        self.latency = metrics.histogram("rpc.latency_ms", method=method)
+        self.in_flight = metrics.gauge("rpc.in_flight", method=method)
+
+    def start(self) -> float:
+        self.requests.inc()
+        self.in_flight.inc()
+        return time.perf_counter()
+
+    def done(self, t0: float, context, failed: bool) -> None:
+        self.in_flight.dec()
+        self.latency.observe((time.perf_counter() - t0) * 1000.0)
+        code = _status(context, failed)
+        if code != "OK":
+            metrics.counter("rpc.errors", method=self.method, code=code).inc()
+
+
+def _wrap_sync(rpc: _Rpc, behavior: Callable, streaming: bool) -> Callable:
+    if streaming:
+        def run_stream(request, context):
+            t0 = rpc.start()
+            failed = True
+            try:
+                yield from behavior(request, context)
+                failed = False
+            finally:
+                rpc.done(t0, context, failed)
+        return run_stream
+
+    def run(request, context):
+        t0 = rpc.start()
+        failed = True
+        try:
+            resp = behavior(request, context)
+            failed = False
+            return resp
+        finally:
+            rpc.done(t0, context, failed)
+    return run
+
+
+def _wrap_async(rpc: _Rpc, behavior: Callable, streaming: bool) -> Callable:
+    if streaming and inspect.isasyncgenfunction(behavior):
+        async def run_stream(request, context):
+            t0 = rpc.start()
+            failed = True
+            try:
+                async for item in behavior(request, context):
+                    yield item
+                failed = False
+            finally:
+                rpc.done(t0, context, failed)
+        return run_stream
+
+    if inspect.iscoroutinefunction(behavior):
+        async def run(request, context):
+            t0 = rpc.start()
+            failed = True
+            try:
+                resp = await behavior(request, context)
+                failed = False
+                return resp
+            finally:
+                rpc.done(t0, context, failed)
+        return run
+
+    return _wrap_sync(rpc, behavior, streaming)  # sync handlers on the aio server's thread pool
+
+
+_rpcs: dict[str, _Rpc] = {}
+
+
+def _wrap_handler(handler: Any, method: str, wrap: Callable) -> Any:
+    if handler is None or handler.request_streaming:
+        return handler  # no client-streaming RPCs here
+    rpc = _rpcs.get(method)
+    if rpc is None:
+        rpc = _rpcs.setdefault(method, _Rpc(method))
+    if handler.response_streaming:
+        return grpc.unary_stream_rpc_method_handler(
+            wrap(rpc, handler.unary_stream, True),
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+    return grpc.unary_unary_rpc_method_handler(
+        wrap(rpc, handler.unary_unary, False),
+        request_deserializer=handler.request_deserializer,
+        response_serializer=handler.response_serializer,
+    )
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records per-RPC counts, error codes and latency for grpc.server."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        return _wrap_handler(continuation(handler_call_details), _method_name(handler_call_details), _wrap_sync)
+
+
+class AioMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """MetricsInterceptor for grpc.aio.server."""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        return _wrap_handler(await continuation(handler_call_details), _method_name(handler_call_details), _wrap_async)
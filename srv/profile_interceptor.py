@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import cProfile
+import inspect
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+import grpc
+
+from config.profile_cfg import ProfileCfg, profile_cfg
+from srv.metrics_interceptor import _method_name, _status
+from utils.metrics_ut import metrics
+from utils.profile_ut import ReportDir, RuntimeSettings, StackSampler, Trace, tracing
+
+log = logging.getLogger("profile_interceptor")
+
+_TOP_FUNCTIONS = 40
+_TOP_STACKS = 20
+
+
+def _phase_lines(tr: Trace, elapsed_ms: float) -> list[str]:
+    if not tr.phases:
+        return ["  (none)"]
+    width = max(len(name) for name in tr.phases)
+    lines = []
+    for name, (calls, sec) in sorted(tr.phases.items(), key=lambda kv: kv[1][1], reverse=True):
+        ms = sec * 1000.0
+        share = 100.0 * ms / elapsed_ms if elapsed_ms > 0 else 0.0
+        lines.append(f"  {name:<{width}}  {int(calls):>5} calls  {ms:>9.3f} ms  {share:5.1f}%")
+    return lines
+
+
+class Profiler:
+    """
+    Decides which RPCs to profile and writes their reports:
+
+    - a `sample_rate` fraction of RPCs runs under cProfile (one at a time;
+      the sync server only),
+    - with `slow_ms` set, the other RPCs' threads are stack-sampled and the
+      samples kept for RPCs that took at least slow_ms,
+    - every report has the RPC's phase breakdown (kv.<op>, json.*,
+      thread.entry, filter.*, pb), also on the aio server.
+
+    sample_rate and slow_ms are re-read from <dir>/profile.json while running.
+    """
+
+    def __init__(self, cfg: ProfileCfg = profile_cfg):
+        self.settings = RuntimeSettings(
+            os.path.join(cfg.dir, "profile.json"),
+            {"sample_rate": float(cfg.sample_rate), "slow_ms": float(cfg.slow_ms)},
+        )
+        self.reports = ReportDir(cfg.dir, cfg.max_reports)
+        self.sampler = StackSampler(cfg.stack_interval_ms / 1000.0)
+        self._cprofile = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile")
+        self._seq = itertools.count()
+
+    def decide(self) -> tuple[bool, float]:
+        """(sample this RPC, slow threshold in ms or 0)."""
+        s = self.settings.get()
+        rate = s["sample_rate"]
+        return rate > 0 and random.random() < rate, max(s["slow_ms"], 0.0)
+
+    def report(
+        self,
+        method: str,
+        reason: str,
+        elapsed_ms: float,
+        code: str,
+        tr: Trace,
+        prof: Optional[cProfile.Profile] = None,
+        stacks: Optional[dict] = None,
+    ) -> None:
+        """Queue a report; formatting and file I/O run off the RPC's thread."""
+        metrics.counter("profile.reports", reason=reason).inc()
+        name = f"report-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{next(self._seq) % 1000000:06d}-{method}"
+        self._writer.submit(self._write, name, method, reason, elapsed_ms, code, tr, prof, stacks)
+
+    def _write(self, name, method, reason, elapsed_ms, code, tr, prof, stacks) -> None:
+        try:
+            lines = [
+                f"method: {method}",
+                f"reason: {reason}",
+                f"status: {code}",
+                f"elapsed_ms: {elapsed_ms:.3f}",
+                "",
+                "phases (inclusive; nested phases overlap):",
+                *_phase_lines(tr, elapsed_ms),
+            ]
+            files: dict[str, Any] = {}
+            if prof is not None:
+                buf = io.StringIO()
+                pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(_TOP_FUNCTIONS)
+                lines += ["", f"cProfile, top {_TOP_FUNCTIONS} by cumulative time:", buf.getvalue()]
+                files[".prof"] = prof.dump_stats
+            if stacks:
+                total = sum(stacks.values())
+                lines += ["", f"stack samples: {total} (every {self.sampler.interval_sec * 1000.0:g} ms)"]
+                for stack, n in stacks.most_common(_TOP_STACKS):
+                    lines.append(f"  {n:>5}  {stack}")
+                files[".stacks"] = "".join(f"{stack} {n}\n" for stack, n in stacks.items())
+            files[".txt"] = "\n".join(lines) + "\n"
+            base = self.reports.write(name, files)
+            log.debug("profile report %s", base)
+        except Exception as e:
+            log.warning("profile report %s failed: %s", name, e)
+
+    def wrap_sync(self, method: str, behavior: Callable) -> Callable:
+        def run(request, context):
+            sampled, slow_ms = self.decide()
+            prof = cProfile.Profile() if sampled and self._cprofile.acquire(blocking=False) else None
+            tid = threading.get_ident()
+            stacks = self.sampler.watch(tid) if prof is None and slow_ms else None
+            failed = True
+            t0 = time.perf_counter()
+            with tracing() as tr:
+                try:
+                    if prof is not None:
+                        prof.enable()
+                    resp = behavior(request, context)
+                    failed = False
+                    return resp
+                finally:
+                    if prof is not None:
+                        prof.disable()
+                        self._cprofile.release()
+                    if stacks is not None:
+                        self.sampler.unwatch(tid)
+                    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+                    slow = bool(slow_ms) and elapsed_ms >= slow_ms
+                    if prof is not None or slow:
+                        self.report(
+                            method, "sampled" if prof is not None else "slow", elapsed_ms,
+                            _status(context, failed), tr, prof, stacks if slow else None,
+                        )
+        return run
+
+    def wrap_async(self, method: str, behavior: Callable) -> Callable:
+        # Coroutines of other RPCs interleave on the loop thread, so neither
+        # cProfile nor stack samples can be attributed to one RPC: phases only.
+        if not inspect.iscoroutinefunction(behavior):
+            return self.wrap_sync(method, behavior)
+
+        async def run(request, context):
+            sampled, slow_ms = self.decide()
+            failed = True
+            t0 = time.perf_counter()
+            with tracing() as tr:
+                try:
+                    resp = await behavior(request, context)
+                    failed = False
+                    return resp
+                finally:
+                    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+                    slow = bool(slow_ms) and elapsed_ms >= slow_ms
+                    if sampled or slow:
+                        self.report(method, "sampled" if sampled else "slow", elapsed_ms, _status(context, failed), tr)
+        return run
+
+
+def _wrap_handler(handler: Any, method: str, wrap: Callable) -> Any:
+    if handler is None or handler.request_streaming or handler.response_streaming:
+        return handler  # long-lived streams have no meaningful latency to profile
+    return grpc.unary_unary_rpc_method_handler(
+        wrap(method, handler.unary_unary),
+        request_deserializer=handler.request_deserializer,
+        response_serializer=handler.response_serializer,
+    )
+
+
+class ProfileInterceptor(grpc.ServerInterceptor):
+    """Profiles sampled and slow unary RPCs of grpc.server (see Profiler)."""
+
+    def __init__(self, profiler: Optional[Profiler] = None):
+        self.profiler = profiler or Profiler()
+
+    def intercept_service(self, continuation, handler_call_details):
+        return _wrap_handler(continuation(handler_call_details), _method_name(handler_call_details), self.profiler.wrap_sync)
+
+
+class AioProfileInterceptor(grpc.aio.ServerInterceptor):
+    """ProfileInterceptor for grpc.aio.server (phase breakdowns only)."""
+
+    def __init__(self, profiler: Optional[Profiler] = None):
+        self.profiler = profiler or Profiler()
+
+    async def intercept_service(self, continuation, handler_call_details):
+        return _wrap_handler(await continuation(handler_call_details), _method_name(handler_call_details), self.profiler.wrap_async)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from config.cache_cfg import cache_cfg
+from utils.lru_ut import LruCache
+from utils.metrics_ut import metrics
+
+# ---------------------------
+# Response cache: serialized page responses per video, valid for one thread
+# version (Storage.thread_version). The servicers key pages by request
+# (srv/ytcomments_rpc.py); a backend's writes may drop the video's pages
+# early, writes elsewhere show up as a newer version.
+# ---------------------------
+
+
+@dataclass
+class _CachedPages:
+    ver: int
+    pages: dict = field(default_factory=dict)  # request key -> serialized response
+
+    @property
+    def size(self) -> int:
+        return sum(len(b) for b in self.pages.values())
+
+
+_response_cache = LruCache(
+    cache_cfg.response_max_videos if cache_cfg.response_enabled else 0,
+    cache_cfg.response_max_bytes,
+    cache_cfg.thread_ttl_sec,
+)
+_response_lock = threading.Lock()
+_response_hits = 0
+_response_misses = 0
+
+
+def cached_response(video_id: str, ver: int, key: Any) -> Optional[bytes]:
+    global _response_hits, _response_misses
+    e = _response_cache.get(video_id)
+    data = e.pages.get(key) if e is not None and e.ver == ver else None
+    with _response_lock:
+        if data is None:
+            _response_misses += 1
+        else:
+            _response_hits += 1
+    return data
+
+
+def cache_response(video_id: str, ver: int, key: Any, data: bytes) -> None:
+    """Keep a response built from thread version `ver`, unless the video's pages are newer already."""
+    if not cache_cfg.response_enabled:
+        return
+    with _response_lock:
+        e = _response_cache.peek(video_id)
+        fresh = e is None or e.ver < ver
+        if fresh:
+            e = _CachedPages(ver=ver)
+        elif e.ver > ver:
+            return
+        e.pages[key] = data
+        while len(e.pages) > max(int(cache_cfg.response_max_pages or 0), 1):
+            e.pages.pop(next(iter(e.pages)))
+        if fresh:
+            _response_cache.put(video_id, e, e.size)
+        else:
+            _response_cache.resize(video_id, e.size)
+
+
+def response_cache_stats() -> dict[str, float]:
+    out = _response_cache.stats()
+    with _response_lock:
+        lookups = _response_hits + _response_misses
+        out.update(
+            hits=float(_response_hits),
+            misses=float(_response_misses),
+            hit_ratio=(_response_hits / lookups) if lookups else 0.0,
+        )
+    return out
+
+
+def drop_responses(video_id: str) -> None:
+    _response_cache.pop(video_id)
+
+
+metrics.collector("response_cache", response_cache_stats)
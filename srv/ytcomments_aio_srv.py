@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import logging
+
+import grpc
+
+from config.watch_cfg import watch_cfg
+from db import couchbase_aio
+from proto import ytcomments_pb2 as pb
+from proto import ytcomments_pb2_grpc as pbg
+from srv import ytcomments_rpc as rpc
+
+log = logging.getLogger("ytcomments_aio_srv")
+
+
+class YtCommentsAioServicer(pbg.YtCommentsServicer):
+    """grpc.aio twin of YtCommentsServicer (app_cfg.grpc_mode = "async"): the same RPCs on db/couchbase_aio.py."""
+
+    def __init__(self):
+        self.db = couchbase_aio
+
+    async def _run(self, call: rpc.Rpc, context: grpc.aio.ServicerContext):
+        try:
+            return await rpc.run_async(call, self.db)
+        except rpc.RpcAbort as e:
+            await context.abort(e.code, e.details)
+
+    async def ListTop(self, request: pb.ListTopRequest, context: grpc.aio.ServicerContext) -> bytes:
+        return await self._run(rpc.list_top(request), context)
+
+    async def ListReplies(self, request: pb.ListRepliesRequest, context: grpc.aio.ServicerContext) -> bytes:
+        return await self._run(rpc.list_replies(request), context)
+
+    async def Create(self, request: pb.CreateCommentRequest, context: grpc.aio.ServicerContext) -> pb.CreateCommentResponse:
+        return await self._run(rpc.create(request), context)
+
+    async def Edit(self, request: pb.EditCommentRequest, context: grpc.aio.ServicerContext) -> pb.EditCommentResponse:
+        return await self._run(rpc.edit(request), context)
+
+    async def Delete(self, request: pb.DeleteCommentRequest, context: grpc.aio.ServicerContext) -> pb.DeleteCommentResponse:
+        return await self._run(rpc.delete(request), context)
+
+    async def Restore(self, request: pb.RestoreCommentRequest, context: grpc.aio.ServicerContext) -> pb.RestoreCommentResponse:
+        return await self._run(rpc.restore(request), context)
+
+    async def GetCounts(self, request: pb.GetCountsRequest, context: grpc.aio.ServicerContext) -> pb.GetCountsResponse:
+        return await self._run(rpc.get_counts(request), context)
+
+    async def BatchGetCounts(
+        self, request: pb.BatchGetCountsRequest, context: grpc.aio.ServicerContext
+    ) -> pb.BatchGetCountsResponse:
+        return await self._run(rpc.batch_get_counts(request), context)
+
+    async def Vote(self, request: pb.VoteRequest, context: grpc.aio.ServicerContext) -> pb.VoteResponse:
+        return await self._run(rpc.vote(request), context)
+
+    async def GetMyVotes(self, request: pb.GetMyVotesRequest, context: grpc.aio.ServicerContext) -> pb.GetMyVotesResponse:
+        return await self._run(rpc.get_my_votes(request), context)
+
+    async def ListTopWithReplies(
+        self, request: pb.ListTopWithRepliesRequest, context: grpc.aio.ServicerContext
+    ) -> pb.ListTopWithRepliesResponse:
+        return await self._run(rpc.list_top_with_replies(request), context)
+
+    async def WatchThread(self, request: pb.WatchThreadRequest, context: grpc.aio.ServicerContext):
+        try:
+            video_id = rpc.required(request.video_id, "video_id")
+        except rpc.RpcAbort as e:
+            await context.abort(e.code, e.details)
+
+        sub = self.db.watch_thread(video_id)
+        try:
+            while True:
+                events = await sub.aget(timeout=watch_cfg.heartbeat_sec or None)
+                if events is None:
+                    break
+                for msg in rpc.watch_messages(video_id, events):
+                    yield msg
+        finally:
+            sub.close()
+        if sub.dropped:
+            await context.abort(*rpc.WATCHER_DROPPED)
+
+    async def ExportThread(self, request: pb.ExportThreadRequest, context: grpc.aio.ServicerContext):
+        try:
+            video_id = rpc.required(request.video_id, "video_id")
+        except rpc.RpcAbort as e:
+            await context.abort(e.code, e.details)
+
+        async for items in self.db.export_thread(video_id, bool(request.include_deleted), rpc.chunk_size(request)):
+            yield rpc.export_chunk(items)
@@ -1,237 +1,161 @@
 from __future__ import annotations
 
+import inspect
 import logging
-import uuid
+from typing import Optional
 
 import grpc
 
-from db.couchbase_db import (
-    apply_vote,
-    create_comment,
-    delete_comment,
-    edit_comment,
-    get_counts,
-    list_replies,
-    list_top,
-    restore_comment,
-    get_my_votes,  # NEW
-)
+from config.watch_cfg import watch_cfg
+from db.storage import Storage, get_storage
 from proto import ytcomments_pb2 as pb
 from proto import ytcomments_pb2_grpc as pbg
+from srv import ytcomments_rpc as rpc
+from utils.retry_ut import RetryExhausted, deadline_scope
 
 log = logging.getLogger("ytcomments_srv")
 
 
-def _pb_from_doc(d: dict) -> pb.Comment:
-    return pb.Comment(
-        id=d.get("id", ""),
-        video_id=d.get("video_id", ""),
-        parent_id=d.get("parent_id", "") or "",
-        content_raw=d.get("content_raw", "") or "",
-        content_html=d.get("content_html", "") or "",
-        is_deleted=bool(d.get("is_deleted", False)),
-        edited=bool(d.get("edited", False)),
-        created_at=int(d.get("created_at", 0) or 0),
-        updated_at=int(d.get("updated_at", 0) or 0),
-        user_uid=d.get("user_uid", "") or "",
-        username=d.get("username", "") or "",
-        channel_id=d.get("channel_id", "") or "",
-        reply_count=int(d.get("reply_count", 0) or 0),
-        likes=int(d.get("likes", 0) or 0),
-        dislikes=int(d.get("dislikes", 0) or 0),
-    )
-
-
-def _page_size(req) -> int:
-    v = int(req.page_size or 0)
-    if v <= 0:
-        v = 50
-    return min(v, 200)
-
-
-def _newest_first(sort: int) -> bool:
-    return sort == pb.NEWEST_FIRST
+def _passthrough(cls):
+    """Response serializer that sends responses cached as bytes as they are."""
+    def serialize(msg) -> bytes:
+        return msg if isinstance(msg, bytes) else cls.SerializeToString(msg)
+    return serialize
+
+
+# Leave this much of the RPC deadline for answering after CAS retries give up
+_DEADLINE_MARGIN_SEC = 0.05
+
+
+def _retry_deadline(context) -> float | None:
+    remaining = context.time_remaining()
+    return None if remaining is None else max(remaining - _DEADLINE_MARGIN_SEC, 0.0)
+
+
+def _retry_status(e: RetryExhausted) -> tuple:
+    log.warning("CAS retries exhausted for video %s: %s", e.key, e)
+    if e.reason == "deadline":
+        return grpc.StatusCode.UNAVAILABLE, "thread is busy, retry later"
+    return grpc.StatusCode.ABORTED, "too many concurrent writes to this thread, retry"
+
+
+def _guarded(fn):
+    """
+    Unary handler wrapper: CAS retries give up before the RPC deadline, and
+    retries that run out end the RPC with ABORTED/UNAVAILABLE.
+    """
+    if inspect.iscoroutinefunction(fn):
+        async def run_async(request, context):
+            with deadline_scope(_retry_deadline(context)):
+                try:
+                    return await fn(request, context)
+                except RetryExhausted as e:
+                    await context.abort(*_retry_status(e))
+        return run_async
+
+    def run(request, context):
+        with deadline_scope(_retry_deadline(context)):
+            try:
+                return fn(request, context)
+            except RetryExhausted as e:
+                context.abort(*_retry_status(e))
+    return run
+
+
+def add_servicer_to_server(servicer, server) -> None:
+    """
+    add_YtCommentsServicer_to_server, with serializers that let handlers
+    return an already serialized response (bytes from the response cache),
+    and unary handlers wrapped by _guarded.
+    """
+    service = pb.DESCRIPTOR.services_by_name["YtComments"]
+    handlers = {}
+    for m in service.methods:
+        make = grpc.unary_stream_rpc_method_handler if m.server_streaming else grpc.unary_unary_rpc_method_handler
+        fn = getattr(servicer, m.name)
+        handlers[m.name] = make(
+            fn if m.server_streaming else _guarded(fn),
+            request_deserializer=getattr(pb, m.input_type.name).FromString,
+            response_serializer=_passthrough(getattr(pb, m.output_type.name)),
+        )
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(service.full_name, handlers),))
+    server.add_registered_method_handlers(service.full_name, handlers)
 
 
 class YtCommentsServicer(pbg.YtCommentsServicer):
-    def ListTop(self, request: pb.ListTopRequest, context: grpc.ServicerContext) -> pb.ListTopResponse:
-        video_id = (request.video_id or "").strip()
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
-
-        items, next_token, total = list_top(
-            video_id=video_id,
-            page_size=_page_size(request),
-            page_token=(request.page_token or ""),
-            newest_first=_newest_first(request.sort),
-            include_deleted=bool(request.include_deleted),
-        )
-        return pb.ListTopResponse(
-            items=[_pb_from_doc(x) for x in items],
-            next_page_token=next_token,
-            total_count=int(total),
-        )
+    """The RPCs of srv/ytcomments_rpc.py on a Storage backend."""
 
-    def ListReplies(self, request: pb.ListRepliesRequest, context: grpc.ServicerContext) -> pb.ListRepliesResponse:
-        video_id = (request.video_id or "").strip()
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
-
-        parent_id = (request.parent_id or "").strip()
-        if not parent_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "parent_id is required")
-
-        items, next_token, total = list_replies(
-            video_id=video_id,
-            parent_id=parent_id,
-            page_size=_page_size(request),
-            page_token=(request.page_token or ""),
-            newest_first=_newest_first(request.sort),
-            include_deleted=bool(request.include_deleted),
-        )
-        return pb.ListRepliesResponse(
-            items=[_pb_from_doc(x) for x in items],
-            next_page_token=next_token,
-            total_count=int(total),
-        )
-
-    def Create(self, request: pb.CreateCommentRequest, context: grpc.ServicerContext) -> pb.CreateCommentResponse:
-        video_id = (request.video_id or "").strip()
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
+    def __init__(self, storage: Optional[Storage] = None):
+        self.db = storage or get_storage()
 
-        parent_id = (request.parent_id or "").strip()
-        content_raw = (request.content_raw or "").strip()
-        if not content_raw:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "content_raw is required")
+    def _run(self, call: rpc.Rpc, context: grpc.ServicerContext):
+        try:
+            return rpc.run(call, self.db)
+        except rpc.RpcAbort as e:
+            context.abort(e.code, e.details)
 
-        user_uid = (request.ctx.user_uid if request.ctx else "") or ""
-        username = (request.ctx.username if request.ctx else "") or ""
-        channel_id = (request.ctx.channel_id if request.ctx else "") or ""
+    def ListTop(self, request: pb.ListTopRequest, context: grpc.ServicerContext) -> bytes:
+        return self._run(rpc.list_top(request), context)
 
-        cid = uuid.uuid4().hex
+    def ListReplies(self, request: pb.ListRepliesRequest, context: grpc.ServicerContext) -> bytes:
+        return self._run(rpc.list_replies(request), context)
 
-        try:
-            doc = create_comment(
-                video_id=video_id,
-                parent_id=parent_id,
-                comment_id=cid,
-                content_raw=content_raw,
-                user_uid=user_uid,
-                username=username,
-                channel_id=channel_id,
-            )
-        except KeyError:
-            context.abort(grpc.StatusCode.NOT_FOUND, "parent comment not found")
-
-        return pb.CreateCommentResponse(comment=_pb_from_doc(doc))
+    def Create(self, request: pb.CreateCommentRequest, context: grpc.ServicerContext) -> pb.CreateCommentResponse:
+        return self._run(rpc.create(request), context)
 
     def Edit(self, request: pb.EditCommentRequest, context: grpc.ServicerContext) -> pb.EditCommentResponse:
-        video_id = (request.video_id or "").strip()
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
-
-        comment_id = (request.comment_id or "").strip()
-        if not comment_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "comment_id is required")
-
-        doc = edit_comment(video_id, comment_id, (request.content_raw or ""))
-        return pb.EditCommentResponse(comment=_pb_from_doc(doc))
+        return self._run(rpc.edit(request), context)
 
     def Delete(self, request: pb.DeleteCommentRequest, context: grpc.ServicerContext) -> pb.DeleteCommentResponse:
-        video_id = (request.video_id or "").strip()
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
-
-        comment_id = (request.comment_id or "").strip()
-        if not comment_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "comment_id is required")
-
-        doc = delete_comment(video_id, comment_id, hard_delete=bool(request.hard_delete))
-        return pb.DeleteCommentResponse(comment=_pb_from_doc(doc))
+        return self._run(rpc.delete(request), context)
 
     def Restore(self, request: pb.RestoreCommentRequest, context: grpc.ServicerContext) -> pb.RestoreCommentResponse:
-        video_id = (request.video_id or "").strip()
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
-
-        comment_id = (request.comment_id or "").strip()
-        if not comment_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "comment_id is required")
-
-        doc = restore_comment(video_id, comment_id)
-        return pb.RestoreCommentResponse(comment=_pb_from_doc(doc))
+        return self._run(rpc.restore(request), context)
 
     def GetCounts(self, request: pb.GetCountsRequest, context: grpc.ServicerContext) -> pb.GetCountsResponse:
-        video_id = (request.video_id or "").strip()
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
+        return self._run(rpc.get_counts(request), context)
 
-        top, total = get_counts(video_id)
-        return pb.GetCountsResponse(top_level_count=int(top), total_count=int(total))
+    def BatchGetCounts(self, request: pb.BatchGetCountsRequest, context: grpc.ServicerContext) -> pb.BatchGetCountsResponse:
+        return self._run(rpc.batch_get_counts(request), context)
 
     def Vote(self, request: pb.VoteRequest, context: grpc.ServicerContext) -> pb.VoteResponse:
-        video_id = (request.video_id or "").strip()
-        comment_id = (request.comment_id or "").strip()
-        vote = int(request.vote)
-
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
-        if not comment_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "comment_id is required")
-        if vote not in (-1, 0, 1):
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "vote must be -1,0,1")
+        return self._run(rpc.vote(request), context)
 
-        user_uid = (request.ctx.user_uid if request.ctx else "") or ""
-        if not user_uid:
-            context.abort(grpc.StatusCode.UNAUTHENTICATED, "ctx.user_uid is required")
-
-        try:
-            likes, dislikes, my_vote = apply_vote(video_id, user_uid, comment_id, vote)
-        except KeyError:
-            context.abort(grpc.StatusCode.NOT_FOUND, "comment not found")
-        except Exception as e:
-            context.abort(grpc.StatusCode.INTERNAL, f"vote failed: {e}")
-
-        return pb.VoteResponse(
-            ok=True,
-            likes=int(likes),
-            dislikes=int(dislikes),
-            my_vote=int(my_vote),
-            user_id=user_uid,
-        )
-
-    # NEW: return current user's votes for a set of comments
     def GetMyVotes(self, request: pb.GetMyVotesRequest, context: grpc.ServicerContext) -> pb.GetMyVotesResponse:
-        video_id = (request.video_id or "").strip()
-        if not video_id:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "video_id is required")
+        return self._run(rpc.get_my_votes(request), context)
 
-        user_uid = (request.ctx.user_uid if request.ctx else "") or ""
-        if not user_uid:
-            context.abort(grpc.StatusCode.UNAUTHENTICATED, "ctx.user_uid is required")
+    def ListTopWithReplies(
+        self, request: pb.ListTopWithRepliesRequest, context: grpc.ServicerContext
+    ) -> pb.ListTopWithRepliesResponse:
+        return self._run(rpc.list_top_with_replies(request), context)
 
-        comment_ids = []
-        for cid in list(request.comment_ids or []):
-            cid = (cid or "").strip()
-            if cid:
-                comment_ids.append(cid)
-
-        # Allow empty list: return empty response
-        if not comment_ids:
-            return pb.GetMyVotesResponse(votes=[])
+    def WatchThread(self, request: pb.WatchThreadRequest, context: grpc.ServicerContext):
+        try:
+            video_id = rpc.required(request.video_id, "video_id")
+        except rpc.RpcAbort as e:
+            context.abort(e.code, e.details)
 
+        sub = self.db.watch_thread(video_id)
+        context.add_callback(sub.close)  # client gone or server stopping
+        try:
+            while True:
+                events = sub.get(timeout=watch_cfg.heartbeat_sec or None)
+                if events is None:
+                    break
+                yield from rpc.watch_messages(video_id, events)
+        finally:
+            sub.close()
+        if sub.dropped:
+            context.abort(*rpc.WATCHER_DROPPED)
+
+    def ExportThread(self, request: pb.ExportThreadRequest, context: grpc.ServicerContext):
         try:
-            votes_map = get_my_votes(video_id=video_id, user_uid=user_uid, comment_ids=comment_ids)
-        except Exception as e:
-            context.abort(grpc.StatusCode.INTERNAL, f"get_my_votes failed: {e}")
-
-        out = []
-        # keep request order stable
-        for cid in comment_ids:
-            v = int(votes_map.get(cid, 0) or 0)
-            if v not in (-1, 0, 1):
-                v = 0
-            out.append(pb.CommentVote(comment_id=cid, vote=v))
-
-        return pb.GetMyVotesResponse(votes=out)
\ No newline at end of file
+            video_id = rpc.required(request.video_id, "video_id")
+        except rpc.RpcAbort as e:
+            context.abort(e.code, e.details)
+
+        # the next chunk is read only once the previous one was sent, i.e. at the client's pace
+        for items in self.db.export_thread(video_id, bool(request.include_deleted), rpc.chunk_size(request)):
+            if not context.is_active():
+                return
+            yield rpc.export_chunk(items)
@@ -0,0 +1,426 @@
+from __future__ import annotations
+
+import time
+import uuid
+from typing import Any, Generator
+
+import grpc
+
+from config.cache_cfg import cache_cfg
+from config.profile_cfg import profile_cfg
+from db.storage import RANK_HOT, RANK_TOP
+from proto import ytcomments_pb2 as pb
+from srv.response_cache import cache_response, cached_response
+from utils.events_ut import EVENT_CREATED, EVENT_DELETED, EVENT_EDITED, EVENT_RESTORED, EVENT_VOTED
+from utils.profile_ut import traced
+
+# ---------------------------
+# The YtComments RPCs, shared by the sync servicer (srv/ytcomments_grpc_srv.py,
+# on a db.storage.Storage) and the async one (srv/ytcomments_aio_srv.py, on
+# db/couchbase_aio.py). A unary RPC is a generator: it validates the request,
+# yields the storage calls it needs (Call) and gets their results or
+# exceptions sent back, and returns the response. run() and run_async() make
+# the calls on a sync or an async backend; both have the Storage method names.
+# A request that fails raises RpcAbort, which the servicer turns into
+# context.abort().
+# ---------------------------
+
+MAX_IDEMPOTENCY_KEY = 128
+MAX_BATCH_COUNTS = 500
+
+
+class RpcAbort(Exception):
+    """End the RPC with this status code and details."""
+
+    def __init__(self, code: grpc.StatusCode, details: str):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+class Call:
+    """A storage call yielded by an RPC: db.<method>(*args, **kwargs)."""
+
+    __slots__ = ("method", "args", "kwargs")
+
+    def __init__(self, method: str, *args: Any, **kwargs: Any):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+
+
+Rpc = Generator[Call, Any, Any]
+
+
+def run(rpc: Rpc, db: Any) -> Any:
+    """Drive an RPC on a sync backend; returns its response."""
+    res: Any = None
+    exc: BaseException | None = None
+    while True:
+        try:
+            call = rpc.throw(exc) if exc is not None else rpc.send(res)
+        except StopIteration as stop:
+            return stop.value
+        res, exc = None, None
+        try:
+            res = getattr(db, call.method)(*call.args, **call.kwargs)
+        except Exception as e:
+            exc = e
+
+
+async def run_async(rpc: Rpc, db: Any) -> Any:
+    """Drive an RPC on a backend whose methods are coroutines; returns its response."""
+    res: Any = None
+    exc: BaseException | None = None
+    while True:
+        try:
+            call = rpc.throw(exc) if exc is not None else rpc.send(res)
+        except StopIteration as stop:
+            return stop.value
+        res, exc = None, None
+        try:
+            res = await getattr(db, call.method)(*call.args, **call.kwargs)
+        except Exception as e:
+            exc = e
+
+
+@traced("pb", profile_cfg.enabled)
+def pb_from_doc(d: dict) -> pb.Comment:
+    return pb.Comment(
+        id=d.get("id", ""),
+        video_id=d.get("video_id", ""),
+        parent_id=d.get("parent_id", "") or "",
+        content_raw=d.get("content_raw", "") or "",
+        content_html=d.get("content_html", "") or "",
+        is_deleted=bool(d.get("is_deleted", False)),
+        edited=bool(d.get("edited", False)),
+        created_at=int(d.get("created_at", 0) or 0),
+        updated_at=int(d.get("updated_at", 0) or 0),
+        user_uid=d.get("user_uid", "") or "",
+        username=d.get("username", "") or "",
+        channel_id=d.get("channel_id", "") or "",
+        reply_count=int(d.get("reply_count", 0) or 0),
+        likes=int(d.get("likes", 0) or 0),
+        dislikes=int(d.get("dislikes", 0) or 0),
+    )
+
+
+def required(value: str, name: str) -> str:
+    """A stripped request field that must not be empty."""
+    value = (value or "").strip()
+    if not value:
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, f"{name} is required")
+    return value
+
+
+def _user_uid(request, why: str = "") -> str:
+    user_uid = (request.ctx.user_uid if request.ctx else "") or ""
+    if not user_uid:
+        raise RpcAbort(grpc.StatusCode.UNAUTHENTICATED, f"ctx.user_uid is required{why}")
+    return user_uid
+
+
+def page_size(req) -> int:
+    v = int(req.page_size or 0)
+    if v <= 0:
+        v = 50
+    return min(v, 200)
+
+
+def newest_first(sort: int) -> bool:
+    return sort == pb.NEWEST_FIRST
+
+
+def rank(sort: int) -> str:
+    return {pb.TOP_RATED: RANK_TOP, pb.HOT: RANK_HOT}.get(sort, "")
+
+
+def chunk_size(req) -> int:
+    v = int(req.chunk_size or 0)
+    if v <= 0:
+        v = 500
+    return min(v, 2000)
+
+
+def replies_per_comment(req) -> int:
+    v = int(req.replies_per_comment or 0)
+    if v <= 0:
+        v = 3
+    return min(v, 20)
+
+
+def page_key(request, parent_id: str = "") -> tuple:
+    """Response cache key of a ListTop/ListReplies request (the thread version is kept apart)."""
+    return (parent_id, int(request.sort), page_size(request), request.page_token or "", bool(request.include_deleted))
+
+
+def _cached_page(video_id: str, key: tuple, method: str, msg, **kwargs: Any) -> Rpc:
+    """A ListTop/ListReplies page through the response cache; returns it serialized."""
+    ver = None
+    if cache_cfg.response_enabled:
+        ver = yield Call("thread_version", video_id)
+        data = cached_response(video_id, ver, key)
+        if data is not None:
+            return data
+
+    # the version just read vouches for the thread the page is built from: one revalidation per miss
+    items, next_token, total = yield Call(method, video_id=video_id, ver=ver, **kwargs)
+    data = msg(
+        items=[pb_from_doc(x) for x in items],
+        next_page_token=next_token,
+        total_count=int(total),
+    ).SerializeToString()
+    if ver is not None:
+        cache_response(video_id, ver, key, data)
+    return data
+
+
+def list_top(request: pb.ListTopRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    return (yield from _cached_page(
+        video_id,
+        page_key(request),
+        "list_top",
+        pb.ListTopResponse,
+        page_size=page_size(request),
+        page_token=(request.page_token or ""),
+        newest_first=newest_first(request.sort),
+        include_deleted=bool(request.include_deleted),
+        rank=rank(request.sort),
+    ))
+
+
+def list_replies(request: pb.ListRepliesRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    parent_id = required(request.parent_id, "parent_id")
+    return (yield from _cached_page(
+        video_id,
+        page_key(request, parent_id),
+        "list_replies",
+        pb.ListRepliesResponse,
+        parent_id=parent_id,
+        page_size=page_size(request),
+        page_token=(request.page_token or ""),
+        newest_first=newest_first(request.sort),
+        include_deleted=bool(request.include_deleted),
+        rank=rank(request.sort),
+    ))
+
+
+def create(request: pb.CreateCommentRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    parent_id = (request.parent_id or "").strip()
+    content_raw = required(request.content_raw, "content_raw")
+
+    user_uid = (request.ctx.user_uid if request.ctx else "") or ""
+    username = (request.ctx.username if request.ctx else "") or ""
+    channel_id = (request.ctx.channel_id if request.ctx else "") or ""
+
+    idempotency_key = (request.idempotency_key or "").strip()
+    if len(idempotency_key) > MAX_IDEMPOTENCY_KEY:
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, "idempotency_key is too long")
+
+    try:
+        doc = yield Call(
+            "create_comment",
+            video_id=video_id,
+            parent_id=parent_id,
+            comment_id=uuid.uuid4().hex,
+            content_raw=content_raw,
+            user_uid=user_uid,
+            username=username,
+            channel_id=channel_id,
+            idempotency_key=idempotency_key,
+        )
+    except KeyError as e:
+        # "not_found": a retried create whose comment was hard-deleted since
+        what = "comment" if e.args and e.args[0] == "not_found" else "parent comment"
+        raise RpcAbort(grpc.StatusCode.NOT_FOUND, f"{what} not found")
+    except ValueError:
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, "idempotency_key was used for a different comment")
+    except TimeoutError:
+        raise RpcAbort(grpc.StatusCode.ABORTED, "a request with this idempotency_key is still in progress")
+
+    return pb.CreateCommentResponse(comment=pb_from_doc(doc))
+
+
+def edit(request: pb.EditCommentRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    comment_id = required(request.comment_id, "comment_id")
+    doc = yield Call("edit_comment", video_id, comment_id, (request.content_raw or ""))
+    return pb.EditCommentResponse(comment=pb_from_doc(doc))
+
+
+def delete(request: pb.DeleteCommentRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    comment_id = required(request.comment_id, "comment_id")
+    doc = yield Call("delete_comment", video_id, comment_id, hard_delete=bool(request.hard_delete))
+    return pb.DeleteCommentResponse(comment=pb_from_doc(doc))
+
+
+def restore(request: pb.RestoreCommentRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    comment_id = required(request.comment_id, "comment_id")
+    doc = yield Call("restore_comment", video_id, comment_id)
+    return pb.RestoreCommentResponse(comment=pb_from_doc(doc))
+
+
+def get_counts(request: pb.GetCountsRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    top, total = yield Call("get_counts", video_id)
+    return pb.GetCountsResponse(top_level_count=int(top), total_count=int(total))
+
+
+def batch_get_counts(request: pb.BatchGetCountsRequest) -> Rpc:
+    video_ids = [(v or "").strip() for v in request.video_ids]
+    if not video_ids:
+        return pb.BatchGetCountsResponse(items=[])
+    if len(video_ids) > MAX_BATCH_COUNTS:
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, f"at most {MAX_BATCH_COUNTS} video_ids")
+    if not all(video_ids):
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, "video_ids must not be empty")
+
+    counts = yield Call("batch_get_counts", video_ids)
+    items = []
+    for v in video_ids:
+        top, total = counts.get(v, (0, 0))
+        items.append(pb.VideoCounts(video_id=v, top_level_count=int(top), total_count=int(total)))
+    return pb.BatchGetCountsResponse(items=items)
+
+
+def vote(request: pb.VoteRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    comment_id = required(request.comment_id, "comment_id")
+    v = int(request.vote)
+    if v not in (-1, 0, 1):
+        raise RpcAbort(grpc.StatusCode.INVALID_ARGUMENT, "vote must be -1,0,1")
+    user_uid = _user_uid(request)
+
+    try:
+        likes, dislikes, my_vote = yield Call("apply_vote", video_id, user_uid, comment_id, v)
+    except KeyError:
+        raise RpcAbort(grpc.StatusCode.NOT_FOUND, "comment not found")
+    except Exception as e:
+        raise RpcAbort(grpc.StatusCode.INTERNAL, f"vote failed: {e}")
+
+    return pb.VoteResponse(
+        ok=True,
+        likes=int(likes),
+        dislikes=int(dislikes),
+        my_vote=int(my_vote),
+        user_id=user_uid,
+    )
+
+
+def get_my_votes(request: pb.GetMyVotesRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    user_uid = _user_uid(request)
+
+    comment_ids = []
+    for cid in list(request.comment_ids or []):
+        cid = (cid or "").strip()
+        if cid:
+            comment_ids.append(cid)
+
+    # Allow empty list: return empty response
+    if not comment_ids:
+        return pb.GetMyVotesResponse(votes=[])
+
+    try:
+        votes_map = yield Call("get_my_votes", video_id=video_id, user_uid=user_uid, comment_ids=comment_ids)
+    except Exception as e:
+        raise RpcAbort(grpc.StatusCode.INTERNAL, f"get_my_votes failed: {e}")
+
+    out = []
+    # keep request order stable
+    for cid in comment_ids:
+        v = int(votes_map.get(cid, 0) or 0)
+        if v not in (-1, 0, 1):
+            v = 0
+        out.append(pb.CommentVote(comment_id=cid, vote=v))
+
+    return pb.GetMyVotesResponse(votes=out)
+
+
+def list_top_with_replies(request: pb.ListTopWithRepliesRequest) -> Rpc:
+    video_id = required(request.video_id, "video_id")
+    user_uid = _user_uid(request, " for include_my_votes") if request.include_my_votes else ""
+
+    reply_sort = request.reply_sort or pb.OLDEST_FIRST
+    items, next_token, total, votes = yield Call(
+        "list_top_with_replies",
+        video_id=video_id,
+        page_size=page_size(request),
+        page_token=(request.page_token or ""),
+        newest_first=newest_first(request.sort),
+        include_deleted=bool(request.include_deleted),
+        rank=rank(request.sort),
+        replies_per_comment=replies_per_comment(request),
+        reply_newest_first=newest_first(reply_sort),
+        reply_rank=rank(reply_sort),
+        user_uid=user_uid,
+    )
+
+    out = []
+    my_votes = []
+    for c, replies, reply_token, reply_total in items:
+        out.append(pb.CommentWithReplies(
+            comment=pb_from_doc(c),
+            replies=[pb_from_doc(r) for r in replies],
+            replies_next_page_token=reply_token,
+            replies_total_count=int(reply_total),
+        ))
+        if votes:
+            for d in [c, *replies]:
+                my_votes.append(pb.CommentVote(comment_id=d["id"], vote=int(votes.get(d["id"], 0) or 0)))
+    return pb.ListTopWithRepliesResponse(
+        items=out,
+        next_page_token=next_token,
+        total_count=int(total),
+        my_votes=my_votes,
+    )
+
+
+# ---------------------------
+# Streams: the servicers read events/chunks their own way and send these.
+# ---------------------------
+
+WATCHER_DROPPED = (grpc.StatusCode.RESOURCE_EXHAUSTED, "watcher fell behind; reload the thread and watch again")
+
+_EVENT_TYPES = {
+    EVENT_CREATED: pb.COMMENT_CREATED,
+    EVENT_EDITED: pb.COMMENT_EDITED,
+    EVENT_DELETED: pb.COMMENT_DELETED,
+    EVENT_RESTORED: pb.COMMENT_RESTORED,
+    EVENT_VOTED: pb.COMMENT_VOTED,
+}
+
+
+def pb_event(ev: dict) -> pb.ThreadEvent:
+    # built once per event, however many streams send it
+    msg = ev.get("_pb")
+    if msg is None:
+        c = ev.get("comment")
+        msg = ev["_pb"] = pb.ThreadEvent(
+            type=_EVENT_TYPES.get(ev.get("type", ""), pb.THREAD_EVENT_UNSPECIFIED),
+            video_id=ev.get("video_id", ""),
+            comment_id=ev.get("comment_id", "") or "",
+            parent_id=ev.get("parent_id", "") or "",
+            comment=pb_from_doc(c) if c is not None else None,
+            hard_deleted=bool(ev.get("hard", False)),
+            likes=int(ev.get("likes", 0) or 0),
+            dislikes=int(ev.get("dislikes", 0) or 0),
+            at=int(ev.get("at", 0) or 0),
+        )
+    return msg
+
+
+def watch_messages(video_id: str, events: list[dict]) -> list[pb.ThreadEvent]:
+    """What to send for a batch of events read from a subscription; an empty batch is a heartbeat."""
+    if not events:
+        return [pb.ThreadEvent(type=pb.HEARTBEAT, video_id=video_id, at=int(time.time() * 1000))]
+    return [pb_event(ev) for ev in events]
+
+
+def export_chunk(items: list[dict]) -> pb.ExportThreadChunk:
+    return pb.ExportThreadChunk(items=[pb_from_doc(x) for x in items])
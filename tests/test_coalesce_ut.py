@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from utils.coalesce_ut import Coalescer
+
+
+class _Recorder:
+    """apply() that records its batches; the first one blocks until `release` is set."""
+
+    def __init__(self):
+        self.batches: list[tuple] = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, key, ops):
+        self.batches.append((key, list(ops)))
+        if len(self.batches) == 1:
+            self.started.set()
+            assert self.release.wait(5)
+        return [ValueError(op) if op == "bad" else (key, op) for op in ops]
+
+
+def _submit_all(c: Coalescer, key, ops: list) -> tuple[list[threading.Thread], dict]:
+    out: dict = {}
+
+    def run(op):
+        try:
+            out[op] = c.submit(key, op)
+        except Exception as e:
+            out[op] = e
+
+    threads = [threading.Thread(target=run, args=(op,)) for op in ops]
+    for t in threads:
+        t.start()
+    return threads, out
+
+
+def _wait_pending(c: Coalescer, n: int) -> None:
+    deadline = time.monotonic() + 5
+    while c.stats()["pending"] < n:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_single_op_runs_on_the_caller():
+    c = Coalescer(lambda key, ops: [(key, op, threading.get_ident()) for op in ops])
+    assert c.submit("k", 1) == ("k", 1, threading.get_ident())
+    assert c.stats() == {"batches": 1.0, "ops": 1.0, "avg_batch": 1.0, "pending": 0.0}
+
+
+def test_ops_arriving_during_a_batch_go_in_the_next_one():
+    rec = _Recorder()
+    c = Coalescer(rec, max_batch=2)
+    first, first_out = _submit_all(c, "k", ["a"])
+    assert rec.started.wait(5)
+
+    rest, out = _submit_all(c, "k", ["b", "bad", "d"])
+    _wait_pending(c, 3)
+    rec.release.set()
+    for t in first + rest:
+        t.join(5)
+
+    assert [len(ops) for _, ops in rec.batches] == [1, 2, 1]
+    assert sorted(op for _, ops in rec.batches for op in ops) == ["a", "b", "bad", "d"]
+    assert first_out == {"a": ("k", "a")}
+    assert out["b"] == ("k", "b") and out["d"] == ("k", "d")
+    assert isinstance(out["bad"], ValueError)  # only that op fails
+    assert c.stats()["batches"] == 3.0 and c.stats()["pending"] == 0.0
+
+
+def test_keys_do_not_wait_for_each_other():
+    rec = _Recorder()
+    c = Coalescer(rec)
+    blocked, _ = _submit_all(c, "k1", ["a"])
+    assert rec.started.wait(5)
+
+    assert c.submit("k2", "b") == ("k2", "b")  # while k1's batch is still running
+    rec.release.set()
+    for t in blocked:
+        t.join(5)
+
+
+def test_apply_errors_fail_the_whole_batch():
+    calls = []
+
+    def flaky(key, ops):
+        calls.append(ops)
+        if len(calls) == 1:
+            raise KeyError("down")
+        return ops
+
+    c = Coalescer(flaky)
+    with pytest.raises(KeyError):
+        c.submit("k", 1)
+    assert c.submit("k", 2) == 2  # the key is usable again after a failure
+
+    with pytest.raises(RuntimeError, match="2 results for 1 ops"):
+        Coalescer(lambda key, ops: [1, 2]).submit("k", 1)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from db import couchbase_db as cb
+from db import memory_coll
+from tools import import_legacy
+
+
+def _records() -> list[dict]:
+    """Two videos as mongoexport writes them: ObjectIds, extended JSON dates, embedded and separate votes."""
+    base = 1_600_000_000_000
+    return [
+        {"_id": {"$oid": "a1"}, "video_id": "imp1", "content": "first", "created_at": {"$date": base}, "user_id": "u1"},
+        {"_id": {"$oid": "a2"}, "video_id": "imp1", "content": "second", "created_at": {"$date": base + 1000},
+         "deleted": True},
+        {"id": "a3", "video_id": "imp1", "parent_id": "a1", "content_raw": "reply", "created_at": base + 2000,
+         "votes": {"u2": "like"}},
+        {"video_id": "imp1", "comment_id": "a1", "user_uid": "u1", "vote": 1},
+        {"video_id": "imp1", "comment_id": "a1", "user_uid": "u2", "vote": -1},
+        {"_id": {"$oid": "b1"}, "video_id": "imp2", "content": "other video", "created_at": base,
+         "likes": {"$numberInt": "3"}, "dislikes": {"$numberLong": "1"}},
+    ]
+
+
+def _write_jsonl(path, records: list[dict]) -> None:
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+
+
+@pytest.fixture
+def coll():
+    return memory_coll.install()
+
+
+def _doc(coll, key: str) -> dict:
+    return coll.get(key).content_as[dict]
+
+
+def test_import_writes_thread_and_votes(coll, tmp_path):
+    dump = tmp_path / "comments.jsonl"
+    _write_jsonl(dump, _records())
+
+    progress = import_legacy.run(import_legacy.read_dump(str(dump)), str(tmp_path / "done"), workers=2, report_sec=0)
+
+    assert (progress.videos, progress.skipped, progress.failed) == (2, 0, 0)
+    thread = _doc(coll, cb.thread_doc_id("imp1"))
+    assert thread["layout"] == cb.THREAD_LAYOUT
+    assert thread["counts"] == {"total": 3, "top": 2, "top_live": 1}
+    assert _doc(coll, cb.comment_doc_id("imp1", "a3"))["parent_id"] == "a1"
+    a1 = _doc(coll, cb.comment_doc_id("imp1", "a1"))
+    assert (a1["likes"], a1["dislikes"]) == (1, 1)
+
+    assert _doc(coll, cb.vote_doc_id("imp1", "a1", "u1"))["vote"] == 1
+    assert _doc(coll, cb.vote_doc_id("imp1", "a1", "u2"))["vote"] == -1
+    assert _doc(coll, cb.vote_doc_id("imp1", "a3", "u2"))["vote"] == 1
+    digest = _doc(coll, cb.vote_digest_doc_id("imp1", "u2"))
+    assert digest["complete"] is True
+    assert digest["votes"] == {"a1": -1, "a3": 1}
+    assert _doc(coll, cb.vote_digest_doc_id("imp1", "u1"))["votes"] == {"a1": 1}
+
+    b1 = _doc(coll, cb.comment_doc_id("imp2", "b1"))  # no votes: counters taken from the extended JSON
+    assert (b1["likes"], b1["dislikes"], b1["score"]) == (3, 1, 2)
+
+
+def test_rerun_resumes_from_checkpoint(coll, tmp_path):
+    checkpoint = tmp_path / "done"
+    records = _records()
+    import_legacy.run([r for r in records if r["video_id"] == "imp1"], str(checkpoint), workers=1, report_sec=0)
+    assert checkpoint.read_text(encoding="utf-8").split() == ["imp1"]
+
+    # a finished video is not rebuilt even when its docs are gone
+    coll.remove(cb.thread_doc_id("imp1"))
+    progress = import_legacy.run(records, str(checkpoint), workers=1, report_sec=0)
+
+    assert (progress.videos, progress.skipped) == (1, 0)
+    assert not coll.exists(cb.thread_doc_id("imp1")).exists
+    assert coll.exists(cb.thread_doc_id("imp2")).exists
+    assert sorted(checkpoint.read_text(encoding="utf-8").split()) == ["imp1", "imp2"]
+
+
+def test_videos_with_a_thread_are_skipped(coll, tmp_path):
+    cb.create_comment("imp2", "", "live1", "written by the service", "u9", "u9", "c9")
+
+    progress = import_legacy.run(_records(), str(tmp_path / "done"), workers=2, report_sec=0)
+
+    assert (progress.videos, progress.skipped) == (1, 1)
+    assert not coll.exists(cb.comment_doc_id("imp2", "b1")).exists
+    assert _doc(coll, cb.thread_doc_id("imp2"))["counts"]["total"] == 1
+    assert coll.exists(cb.thread_doc_id("imp1")).exists
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import timedelta
+
+import couchbase.subdocument as SD
+import pytest
+from couchbase.exceptions import (
+    CasMismatchException,
+    DocumentExistsException,
+    DocumentNotFoundException,
+    PathExistsException,
+    PathMismatchException,
+    PathNotFoundException,
+)
+from couchbase.options import MutateInOptions
+
+from db import memory_coll
+from db.memory_coll import AsyncMemoryCollection, MemoryCollection
+
+
+@pytest.fixture
+def coll() -> MemoryCollection:
+    return MemoryCollection()
+
+
+def _doc(coll: MemoryCollection, key: str) -> dict:
+    return coll.get(key).content_as[dict]
+
+
+def test_replace_checks_cas(coll):
+    first = coll.insert("k", {"n": 1})
+    second = coll.replace("k", {"n": 2}, cas=first.cas)
+    assert second.cas != first.cas
+
+    with pytest.raises(CasMismatchException):
+        coll.replace("k", {"n": 3}, cas=first.cas)
+    assert _doc(coll, "k") == {"n": 2}
+
+    coll.replace("k", {"n": 4})  # no cas: unconditional
+    assert _doc(coll, "k") == {"n": 4}
+    with pytest.raises(DocumentNotFoundException):
+        coll.replace("missing", {"n": 1})
+
+
+def test_insert_existing_key(coll):
+    coll.insert("k", {"n": 1})
+    with pytest.raises(DocumentExistsException):
+        coll.insert("k", {"n": 2})
+    assert _doc(coll, "k") == {"n": 1}
+
+    coll.upsert("k", {"n": 3})
+    assert _doc(coll, "k") == {"n": 3}
+
+
+def test_remove(coll):
+    with pytest.raises(DocumentNotFoundException):
+        coll.remove("missing")
+
+    res = coll.insert("k", {"n": 1})
+    with pytest.raises(CasMismatchException):
+        coll.remove("k", cas=res.cas + 1)
+    coll.remove("k", cas=res.cas)
+    assert not coll.exists("k").exists
+    with pytest.raises(DocumentNotFoundException):
+        coll.get("k")
+
+
+def test_multi_reports_per_key(coll):
+    coll.insert("a", {"n": 1})
+    res = coll.get_multi(["a", "b"])
+    assert not res.all_ok
+    assert res.results["a"].content_as[dict] == {"n": 1}
+    assert isinstance(res.exceptions["b"], DocumentNotFoundException)
+
+    res = coll.insert_multi({"a": {"n": 2}, "c": {"n": 3}})
+    assert set(res.results) == {"c"}
+    assert isinstance(res.exceptions["a"], DocumentExistsException)
+
+
+def test_expiry(coll, monkeypatch):
+    coll.upsert("k", {"n": 1}, expiry=timedelta(seconds=-1))  # not positive: never expires
+    coll.upsert("t", {"n": 1}, expiry=timedelta(seconds=10))
+    assert coll.exists("k").exists
+    coll.touch("k", timedelta(seconds=60))
+
+    now = time.time()
+    monkeypatch.setattr(memory_coll.time, "time", lambda: now + 30)
+    assert coll.exists("k").exists
+    assert not coll.exists("t").exists
+    coll.insert("t", {"n": 2})  # an expired key is free again
+
+
+def test_lookup_in(coll):
+    coll.insert("k", {"a": {"b": 1}, "items": [10, 20]})
+    res = coll.lookup_in("k", [SD.get("a.b"), SD.get("a.c"), SD.exists("items"), SD.count("items"), SD.get("items[1]")])
+
+    assert res.content_as[int](0) == 1
+    assert not res.exists(1)
+    with pytest.raises(PathNotFoundException):
+        res.content_as[int](1)
+    assert res.exists(2)
+    assert res.content_as[int](3) == 2
+    assert res.content_as[int](4) == 20
+    assert res.cas == coll.get("k").cas
+
+    with pytest.raises(DocumentNotFoundException):
+        coll.lookup_in("missing", [SD.get("a")])
+
+
+def test_mutate_in(coll):
+    coll.insert("k", {"n": 1, "items": [1]})
+    res = coll.mutate_in("k", [
+        SD.increment("n", 2),
+        SD.decrement("c.d", 1, create_parents=True),
+        SD.upsert("x.y", "v", create_parents=True),
+        SD.array_append("items", 2, 3),
+        SD.array_prepend("items", 0),
+        SD.remove("x.y"),
+    ])
+    assert (res.content_as[int](0), res.content_as[int](1)) == (3, -1)
+    assert _doc(coll, "k") == {"n": 3, "c": {"d": -1}, "x": {}, "items": [0, 1, 2, 3]}
+
+    with pytest.raises(PathExistsException):
+        coll.mutate_in("k", [SD.insert("n", 5)])
+    with pytest.raises(PathNotFoundException):
+        coll.mutate_in("k", [SD.upsert("p.q", 1)])  # no create_parents
+    with pytest.raises(PathMismatchException):
+        coll.mutate_in("k", [SD.array_append("n", 1)])
+    with pytest.raises(PathExistsException):
+        coll.mutate_in("k", [SD.array_addunique("items", 2)])
+    with pytest.raises(CasMismatchException):
+        coll.mutate_in("k", [SD.increment("n", 1)], cas=res.cas + 1)
+
+    # all or nothing: the failing last spec leaves the counter as it was
+    with pytest.raises(PathNotFoundException):
+        coll.mutate_in("k", [SD.increment("n", 1), SD.replace("missing", 1)])
+    assert _doc(coll, "k")["n"] == 3
+
+
+def test_mutate_in_store_semantics(coll):
+    with pytest.raises(DocumentNotFoundException):
+        coll.mutate_in("k", [SD.upsert("a", 1)])
+
+    coll.mutate_in("k", [SD.upsert("a", 1)], MutateInOptions(store_semantics=SD.StoreSemantics.UPSERT))
+    assert _doc(coll, "k") == {"a": 1}
+    with pytest.raises(DocumentExistsException):
+        coll.mutate_in("k", [SD.upsert("a", 2)], MutateInOptions(store_semantics=SD.StoreSemantics.INSERT))
+    assert _doc(coll, "k") == {"a": 1}
+
+
+def test_ops_and_async_view(coll):
+    async def main():
+        acoll = AsyncMemoryCollection(coll)
+        await acoll.insert("k", {"n": 1})
+        return (await acoll.get("k")).content_as[dict]
+
+    assert asyncio.run(main()) == {"n": 1}
+    assert _doc(coll, "k") == {"n": 1}  # same docs
+    assert coll.ops == {"insert": 1, "get": 2}
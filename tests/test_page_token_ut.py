@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+
+from utils.page_token_ut import PageCursor, decode_page_token, encode_cursor
+
+
+@pytest.mark.parametrize("cur", [
+    PageCursor(newest_first=True, key=(3, 41), ver=7),
+    PageCursor(newest_first=False, key=(0, 0)),
+    PageCursor(newest_first=True, key=(1, 0, -5, 12), ver=2, rank="top"),
+    PageCursor(newest_first=True, key=(331889, 0, 82972449361, 7), ver=25, rank="hot"),
+])
+def test_cursor_round_trip(cur):
+    token = encode_cursor(cur)
+    assert token.startswith("c1.")
+    assert "=" not in token  # padding stripped, safe in URLs as it is
+    assert decode_page_token(token) == cur
+
+
+def test_rank_is_left_out_for_creation_order():
+    plain = encode_cursor(PageCursor(newest_first=True, key=(1, 2), ver=3))
+    ranked = encode_cursor(PageCursor(newest_first=True, key=(1, 2), ver=3, rank="top"))
+    assert len(plain) < len(ranked)
+    assert decode_page_token(plain).rank == ""
+
+
+@pytest.mark.parametrize("token, offset", [
+    ("", 0),
+    (None, 0),
+    ("  ", 0),
+    ("40", 40),
+    (" 15 ", 15),
+    ("-3", 0),
+    ("abc", 0),
+])
+def test_legacy_offsets(token, offset):
+    assert decode_page_token(token) == offset
+
+
+@pytest.mark.parametrize("token", [
+    "c1.",
+    "c1.!!!",
+    "c1.e30",  # {}
+    "c1.eyJkIjoxfQ",  # {"d":1}, no key
+    "c1.eyJkIjoxLCJrIjpbIngiXX0",  # {"d":1,"k":["x"]}
+])
+def test_unreadable_cursors_start_over(token):
+    assert decode_page_token(token) == 0
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+from utils.pubsub_ut import Hub, LocalBroker
+
+
+class _CountingBroker(LocalBroker):
+    """LocalBroker that counts subscribe and unsubscribe calls per topic."""
+
+    def __init__(self):
+        super().__init__()
+        self.subscribed: dict = {}
+        self.unsubscribed: dict = {}
+
+    def subscribe(self, topic, fn):
+        self.subscribed[topic] = self.subscribed.get(topic, 0) + 1
+        unsubscribe = super().subscribe(topic, fn)
+
+        def counted() -> None:
+            self.unsubscribed[topic] = self.unsubscribed.get(topic, 0) + 1
+            unsubscribe()
+
+        return counted
+
+
+def test_publish_fans_out_to_the_topic():
+    hub = Hub(LocalBroker())
+    a, b = hub.subscribe("v1"), hub.subscribe("v1")
+    other = hub.subscribe("v2")
+
+    hub.publish("v1", ["e1", "e2"])
+    hub.publish("v1", ["e3"])
+    hub.publish("v1", [])  # nothing to send
+
+    assert a.get(0) == ["e1", "e2", "e3"]
+    assert b.get(0) == ["e1", "e2", "e3"]
+    assert a.get(0) == []  # drained
+    assert other.get(0) == []
+    assert hub.stats() == {"topics": 2.0, "subscribers": 3.0, "published": 3.0, "delivered": 6.0, "dropped": 0.0}
+
+
+def test_one_broker_subscription_per_topic():
+    broker = _CountingBroker()
+    hub = Hub(broker)
+    subs = [hub.subscribe("v1") for _ in range(3)]
+    assert broker.subscribed == {"v1": 1}
+
+    subs[0].close()
+    subs[1].close()
+    assert broker.unsubscribed == {}
+    subs[2].close()
+    assert broker.unsubscribed == {"v1": 1}
+    assert hub.stats()["topics"] == 0.0
+
+    hub.publish("v1", ["e1"])  # no one listening
+    assert hub.stats()["delivered"] == 0.0
+
+
+def test_close_ends_the_subscription():
+    hub = Hub()
+    sub = hub.subscribe("v1")
+    hub.publish("v1", ["e1"])
+    sub.close()
+    sub.close()  # idempotent
+
+    assert sub.closed and not sub.dropped
+    assert sub.get() == ["e1"]  # what was queued is still read
+    assert sub.get() is None
+    hub.publish("v1", ["e2"])
+    assert sub.get() is None
+
+
+def test_overflow_drops_the_subscriber():
+    hub = Hub(queue_size=3)
+    slow, fast = hub.subscribe("v1"), hub.subscribe("v1")
+
+    hub.publish("v1", ["e1", "e2"])
+    assert fast.get(0) == ["e1", "e2"]
+    hub.publish("v1", ["e3", "e4"])  # slow would hold four
+
+    assert slow.closed and slow.dropped
+    assert slow.get() is None  # its queue was cleared
+    assert fast.get(0) == ["e3", "e4"]
+    assert hub.stats()["dropped"] == 1.0
+    assert hub.stats()["subscribers"] == 1.0
+
+
+def test_get_waits_for_a_publish_from_another_thread():
+    hub = Hub()
+    sub = hub.subscribe("v1")
+    t = threading.Timer(0.05, hub.publish, ("v1", ["e1"]))
+    t.start()
+    assert sub.get(5) == ["e1"]
+    t.join()
+
+    assert sub.get(0.01) == []  # timed out
+
+
+def test_aget_on_the_loop():
+    hub = Hub()
+
+    async def main():
+        sub = hub.subscribe("v1", asyncio.get_running_loop())
+        hub.publish("v1", ["e1"])
+        assert await sub.aget(0) == ["e1"]  # already queued
+        assert await sub.aget(0.01) == []  # timed out
+
+        t = threading.Timer(0.05, hub.publish, ("v1", ["e2"]))
+        t.start()
+        got = await sub.aget(5)
+        t.join()
+
+        threading.Timer(0.05, sub.close).start()
+        return got, await sub.aget(5)
+
+    assert asyncio.run(main()) == (["e2"], None)
+
+
+def test_set_broker_moves_live_topics():
+    old, new = _CountingBroker(), _CountingBroker()
+    hub = Hub(old)
+    sub = hub.subscribe("v1")
+
+    hub.set_broker(new)
+    assert old.unsubscribed == {"v1": 1} and new.subscribed == {"v1": 1}
+
+    old.publish("v1", ["stale"])
+    hub.publish("v1", ["e1"])
+    assert sub.get(0) == ["e1"]
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import pytest
+
+from db import couchbase_db as cb
+from db import memory_coll
+from db.sqlite_db import SqliteStorage
+from db.storage import RANK_HOT, RANK_TOP, Storage
+from utils.page_token_ut import decode_page_token
+
+_FIELDS = ("id", "parent_id", "content_raw", "is_deleted", "edited", "reply_count", "likes", "dislikes")
+
+
+def _couchbase(tmp_path) -> Storage:
+    memory_coll.install()
+    return cb.CouchbaseStorage()
+
+
+def _sqlite(tmp_path) -> Storage:
+    return SqliteStorage(str(tmp_path / "comments.db"))
+
+
+_BACKENDS = {"couchbase": _couchbase, "sqlite": _sqlite}
+
+
+@pytest.fixture(params=sorted(_BACKENDS))
+def storage(request, tmp_path) -> Storage:
+    return _BACKENDS[request.param](tmp_path)
+
+
+def _fields(c: dict) -> dict:
+    return {k: c[k] for k in _FIELDS}
+
+
+def _seed(s: Storage) -> None:
+    """Seven top-level comments (c3 best rated, c5 worst), replies under c2, c4 soft-deleted."""
+    for i in range(7):
+        s.create_comment("v1", "", f"c{i}", f"top {i}", "u1", "user one", "ch1")
+    for i in range(4):
+        s.create_comment("v1", "c2", f"r{i}", f"reply {i}", "u2", "user two", "ch2")
+    s.apply_vote("v1", "u2", "c3", 1)
+    s.apply_vote("v1", "u3", "c3", 1)
+    s.apply_vote("v1", "u2", "c1", 1)
+    s.apply_vote("v1", "u2", "c5", -1)
+    s.apply_vote("v1", "u3", "r1", 1)
+    s.delete_comment("v1", "c4", False)
+
+
+def _walk(list_page, page_size: int) -> list[tuple[list[str], bool, int]]:
+    """Every page of a listing: [(ids, has next page, total)]; checks each token resumes where the page ended."""
+    pages = []
+    token = ""
+    while True:
+        items, token, total = list_page(page_size, token)
+        pages.append(([c["id"] for c in items], bool(token), total))
+        if not token:
+            return pages
+        assert decode_page_token(token) is not None
+        assert len(pages) <= 20
+
+
+def _listings(s: Storage) -> dict:
+    out = {}
+    for rank in ("", RANK_TOP, RANK_HOT):
+        for newest_first in (True, False):
+            for include_deleted in (False, True):
+                key = (rank, newest_first, include_deleted)
+                out[("top",) + key] = _walk(
+                    lambda n, tok: s.list_top("v1", n, tok, newest_first, include_deleted, rank), 3,
+                )
+                out[("replies",) + key] = _walk(
+                    lambda n, tok: s.list_replies("v1", "c2", n, tok, newest_first, include_deleted, rank), 3,
+                )
+    return out
+
+
+def test_create_edit_delete_restore(storage):
+    c = storage.create_comment("v1", "", "c1", "first", "u1", "user one", "ch1")
+    assert _fields(c) == {
+        "id": "c1", "parent_id": "", "content_raw": "first", "is_deleted": False, "edited": False,
+        "reply_count": 0, "likes": 0, "dislikes": 0,
+    }
+    storage.create_comment("v1", "c1", "r1", "reply", "u2", "user two", "ch2")
+    with pytest.raises(KeyError, match="parent_not_found"):
+        storage.create_comment("v1", "nope", "r2", "reply", "u2", "user two", "ch2")
+
+    c = storage.edit_comment("v1", "c1", "edited")
+    assert (c["content_raw"], c["edited"], c["reply_count"]) == ("edited", True, 1)
+    with pytest.raises(KeyError, match="not_found"):
+        storage.edit_comment("v1", "nope", "x")
+
+    c = storage.delete_comment("v1", "c1", False)
+    assert (c["is_deleted"], c["content_raw"]) == (True, "")
+    assert storage.list_top("v1", 10, "", True, False, "") == ([], "", 0)
+    assert [c["id"] for c in storage.list_top("v1", 10, "", True, True, "")[0]] == ["c1"]
+    assert storage.get_counts("v1") == (1, 2)
+
+    c = storage.restore_comment("v1", "c1")
+    assert c["is_deleted"] is False
+    assert [c["id"] for c in storage.list_top("v1", 10, "", True, False, "")[0]] == ["c1"]
+
+    storage.delete_comment("v1", "r1", True)
+    assert storage.list_replies("v1", "c1", 10, "", True, True, "") == ([], "", 0)
+    assert storage.get_counts("v1") == (1, 1)
+    assert storage.get_counts("unknown") == (0, 0)
+
+
+def test_votes(storage):
+    storage.create_comment("v1", "", "c1", "first", "u1", "user one", "ch1")
+    storage.create_comment("v1", "", "c2", "second", "u1", "user one", "ch1")
+
+    assert storage.apply_vote("v1", "u2", "c1", 1) == (1, 0, 1)
+    assert storage.apply_vote("v1", "u2", "c1", -1) == (0, 1, -1)
+    assert storage.apply_vote("v1", "u3", "c1", -1) == (0, 2, -1)
+    assert storage.apply_vote("v1", "u3", "c1", 0) == (0, 1, 0)
+    with pytest.raises(KeyError, match="not_found"):
+        storage.apply_vote("v1", "u2", "nope", 1)
+
+    votes = storage.get_my_votes("v1", "u2", ["c1", "c2"])
+    assert {cid: votes.get(cid, 0) for cid in ("c1", "c2")} == {"c1": -1, "c2": 0}
+    votes = storage.get_my_votes("v1", "u3", ["c1"])
+    assert votes.get("c1", 0) == 0
+
+
+def test_orders_and_pages(storage):
+    _seed(storage)
+
+    top = _walk(lambda n, tok: storage.list_top("v1", n, tok, True, False, ""), 4)
+    assert top == [(["c6", "c5", "c3", "c2"], True, 6), (["c1", "c0"], False, 6)]
+    rated = _walk(lambda n, tok: storage.list_top("v1", n, tok, True, False, RANK_TOP), 4)
+    assert [cid for ids, _, _ in rated for cid in ids] == ["c3", "c1", "c6", "c2", "c0", "c5"]
+    oldest = _walk(lambda n, tok: storage.list_top("v1", n, tok, False, True, ""), 4)
+    assert oldest == [(["c0", "c1", "c2", "c3"], True, 7), (["c4", "c5", "c6"], False, 7)]
+    replies = _walk(lambda n, tok: storage.list_replies("v1", "c2", n, tok, False, False, RANK_TOP), 2)
+    assert replies == [(["r1", "r3"], True, 4), (["r2", "r0"], False, 4)]
+
+
+def test_backends_agree(tmp_path):
+    """The same writes on both backends: same orders, page breaks and totals in every listing, same counts and votes."""
+    seen = {}
+    for name, make in sorted(_BACKENDS.items()):
+        path = tmp_path / name
+        path.mkdir()
+        s = make(path)
+        _seed(s)
+        votes = s.get_my_votes("v1", "u2", ["c1", "c3", "c5", "c0", "r1"])
+        seen[name] = (
+            _listings(s),
+            s.get_counts("v1"),
+            s.batch_get_counts(["v1", "unknown"]),
+            {cid: votes.get(cid, 0) for cid in ("c1", "c3", "c5", "c0", "r1")},
+        )
+
+    assert seen["couchbase"] == seen["sqlite"]
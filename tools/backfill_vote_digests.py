@@ -0,0 +1,78 @@
+"""
+Build per-(video, user) vote digests (uvotes::{video}::{user}) from the
+existing cvote:: docs, then mark each thread so GetMyVotes reads only the
+digest.
+
+    python -m tools.backfill_vote_digests                 # all threads not backfilled yet (N1QL)
+    python -m tools.backfill_vote_digests VIDEO_ID ...    # only these videos
+
+Votes cast while it runs go to both doc kinds and win over what the job
+read. Safe to re-run.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import time
+
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv()
+except Exception:
+    pass
+
+from couchbase.options import QueryOptions
+
+from config.couchbase_cfg import cb_cfg
+from db.couchbase_db import backfill_vote_digests, connect
+from utils.log_ut import setup_logging
+
+log = logging.getLogger("backfill_vote_digests")
+
+
+def _keyspace() -> str:
+    return f"`{cb_cfg.bucket}`.`{cb_cfg.scope}`.`{cb_cfg.collection}`"
+
+
+def pending_video_ids() -> list[str]:
+    ctx = connect()
+    q = (
+        f"SELECT RAW t.video_id FROM {_keyspace()} t "
+        "WHERE t.type = 'comment_thread' AND (t.vote_digests IS MISSING OR t.vote_digests = false)"
+    )
+    return [str(v) for v in ctx.cluster.query(q).rows() if v]
+
+
+def video_votes(video_id: str) -> list[dict]:
+    ctx = connect()
+    q = (
+        f"SELECT v.user_uid, v.comment_id, v.vote FROM {_keyspace()} v "
+        "WHERE v.type = 'comment_vote' AND v.video_id = $video_id"
+    )
+    return list(ctx.cluster.query(q, QueryOptions(named_parameters={"video_id": video_id})).rows())
+
+
+def main(argv: list[str]) -> int:
+    setup_logging()
+    video_ids = argv or pending_video_ids()
+    log.info("threads to backfill: %d", len(video_ids))
+
+    t0 = time.time()
+    failed = 0
+    digests = 0
+    for i, video_id in enumerate(video_ids, 1):
+        try:
+            digests += backfill_vote_digests(video_id, video_votes(video_id))
+        except Exception as e:
+            failed += 1
+            log.error("backfill %s failed: %s", video_id, e)
+        if i % 100 == 0:
+            log.info("progress: %d/%d, digests=%d", i, len(video_ids), digests)
+
+    log.info("done: %d threads, %d digests, %d failed, %.1fs", len(video_ids), digests, failed, time.time() - t0)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,100 @@
+"""
+GetMyVotes latency against the configured cluster: serial per-comment gets
+of cvote:: docs (original implementation), one bulk get of the cvote:: docs,
+and get_my_votes (one get of the user's uvotes:: digest).
+
+    python -m tools.bench_my_votes                  # pages of 50 and 200 ids
+    python -m tools.bench_my_votes 20 100 500       # custom page sizes
+
+Seeds vote docs for a throwaway video (half the ids voted, half missing),
+reports p50/p95/mean per page size and removes the docs afterwards.
+Env: BENCH_ROUNDS (default 30).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv()
+except Exception:
+    pass
+
+from db.couchbase_db import (
+    _get_many,
+    _get_user_vote,
+    _set_user_votes,
+    connect,
+    get_my_votes,
+    vote_digest_doc_id,
+    vote_doc_id,
+)
+from utils.log_ut import setup_logging
+
+log = logging.getLogger("bench_my_votes")
+
+
+def serial_my_votes(video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+    """The previous implementation: one KV get per comment."""
+    return {cid: _get_user_vote(video_id, cid, user_uid) for cid in comment_ids}
+
+
+def bulk_my_votes(video_id: str, user_uid: str, comment_ids: list[str]) -> dict[str, int]:
+    """Bulk get of the cvote:: docs (used for threads without digests)."""
+    docs = _get_many([vote_doc_id(video_id, cid, user_uid) for cid in comment_ids], strict=False)
+    return {cid: int((docs.get(vote_doc_id(video_id, cid, user_uid)) or {}).get("vote", 0) or 0) for cid in comment_ids}
+
+
+def _timed(fn, rounds: int) -> list[float]:
+    out = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def _summary(ms: list[float]) -> str:
+    ms = sorted(ms)
+    p95 = ms[min(int(len(ms) * 0.95), len(ms) - 1)]
+    return f"p50={statistics.median(ms):8.2f}ms p95={p95:8.2f}ms mean={statistics.fmean(ms):8.2f}ms"
+
+
+def main(argv: list[str]) -> int:
+    setup_logging()
+    sizes = [int(x) for x in argv] or [50, 200]
+    rounds = int(os.getenv("BENCH_ROUNDS", "30"))
+
+    video_id = f"bench-{uuid.uuid4().hex[:12]}"
+    user_uid = "bench-user"
+    comment_ids = [f"c{i}" for i in range(max(sizes))]
+    voted = comment_ids[::2]
+    _set_user_votes(video_id, user_uid, {cid: 1 if i % 2 else -1 for i, cid in enumerate(voted)}, complete=True)
+
+    try:
+        for n in sizes:
+            ids = comment_ids[:n]
+            expected = serial_my_votes(video_id, user_uid, ids)
+            for name, fn in (("bulk", bulk_my_votes), ("digest", get_my_votes)):
+                if fn(video_id, user_uid, ids) != expected:
+                    log.error("%s results differ for %d ids", name, n)
+                    return 1
+            serial = _timed(lambda: serial_my_votes(video_id, user_uid, ids), rounds)
+            print(f"ids={n:5d} serial {_summary(serial)}")
+            for name, fn in (("bulk", bulk_my_votes), ("digest", get_my_votes)):
+                ms = _timed(lambda: fn(video_id, user_uid, ids), rounds)
+                print(f"ids={n:5d} {name:6s} {_summary(ms)}  speedup x{statistics.median(serial) / max(statistics.median(ms), 1e-9):.1f}")
+    finally:
+        keys = [vote_doc_id(video_id, cid, user_uid) for cid in voted] + [vote_digest_doc_id(video_id, user_uid)]
+        connect().coll.remove_multi(keys, return_exceptions=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,355 @@
+"""
+Throughput and latency of the comments service on the in-memory collection
+(db/memory_coll.py) or the SQLite backend (db/sqlite_db.py, in a temporary
+file): no cluster needed, so runs are comparable between commits.
+
+    python -m tools.bench_service                        # all scenarios
+    python -m tools.bench_service hot_write vote_storm   # selected ones
+
+Scenarios (each on fresh videos):
+  hot_write        concurrent Create on one video (write contention)
+  deep_pagination  ListTop page walks to the end of a deep thread, per sort
+  vote_storm       concurrent Vote by many users on a few comments
+  my_votes         GetMyVotes fan-out for BENCH_FANOUT comment ids
+
+They drive YtCommentsServicer in process and/or through a local gRPC port
+(BENCH_MODE: inproc, grpc or both; default both). Results (ops/s, p50/p99)
+are printed and written to BENCH_REPORT (default bench-report.json); with
+BENCH_COMPARE=<older report> the differences are printed as well.
+
+Env: BENCH_BACKEND (memory or sqlite, default memory), BENCH_LATENCY_MS
+(per KV op of the memory backend, default 0.5), BENCH_JITTER_MS (default
+0.2), BENCH_CONCURRENCY (default 32), BENCH_OPS (default 2000),
+BENCH_DEPTH (comments in the paginated thread, default 2000), BENCH_FANOUT
+(default 50,200).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent import futures
+from typing import Any, Callable, Optional
+
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv()
+except Exception:
+    pass
+
+import grpc
+
+from db import memory_coll
+from db.storage import Storage
+from proto import ytcomments_pb2 as pb
+from proto import ytcomments_pb2_grpc as pbg
+from utils.log_ut import setup_logging
+
+log = logging.getLogger("bench_service")
+
+# Unary methods returning pre-serialized bytes in process
+_RESPONSES = {"ListTop": pb.ListTopResponse, "ListReplies": pb.ListRepliesResponse}
+
+
+class _Aborted(Exception):
+    def __init__(self, code: grpc.StatusCode, details: str):
+        super().__init__(f"{code.name}: {details}")
+        self.code = code
+
+
+class _Context:
+    """The parts of grpc.ServicerContext the servicer uses."""
+
+    def abort(self, code: grpc.StatusCode, details: str) -> None:
+        raise _Aborted(code, details)
+
+    def time_remaining(self) -> Optional[float]:
+        return None
+
+    def is_active(self) -> bool:
+        return True
+
+    def add_callback(self, fn: Callable) -> bool:
+        return False
+
+    def code(self) -> None:
+        return None
+
+
+def _inproc_caller(storage: Storage) -> tuple[Callable[[str, Any], Any], Callable[[], None]]:
+    from srv.ytcomments_grpc_srv import YtCommentsServicer
+
+    servicer = YtCommentsServicer(storage)
+
+    def call(method: str, request: Any) -> Any:
+        resp = getattr(servicer, method)(request, _Context())
+        if isinstance(resp, bytes):
+            return _RESPONSES[method].FromString(resp)
+        return resp
+
+    return call, lambda: None
+
+
+def _grpc_caller(storage: Storage, workers: int) -> tuple[Callable[[str, Any], Any], Callable[[], None]]:
+    from srv.ytcomments_grpc_srv import YtCommentsServicer, add_servicer_to_server
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    add_servicer_to_server(YtCommentsServicer(storage), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+    stub = pbg.YtCommentsStub(channel)
+
+    def call(method: str, request: Any) -> Any:
+        return getattr(stub, method)(request)
+
+    def close() -> None:
+        channel.close()
+        server.stop(grace=None)
+
+    return call, close
+
+
+class _Recorder:
+    """Latencies (ms) and errors of the timed calls of one scenario run."""
+
+    def __init__(self, call: Callable[[str, Any], Any]):
+        self._call = call
+        self._lock = threading.Lock()
+        self.ms: list[float] = []
+        self.errors: dict[str, int] = {}
+
+    def call(self, method: str, request: Any) -> Any:
+        t0 = time.perf_counter()
+        try:
+            return self._call(method, request)
+        except Exception as e:
+            if isinstance(e, _Aborted):
+                code = e.code.name
+            elif isinstance(e, grpc.RpcError):
+                code = e.code().name
+            else:
+                code = type(e).__name__
+            with self._lock:
+                self.errors[code] = self.errors.get(code, 0) + 1
+            return None
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            with self._lock:
+                self.ms.append(ms)
+
+
+def _run(jobs: list[Callable[[], None]], concurrency: int) -> float:
+    """Run the jobs on `concurrency` threads; returns the wall time in seconds."""
+    t0 = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        for f in [pool.submit(job) for job in jobs]:
+            f.result()
+    return time.perf_counter() - t0
+
+
+def _summary(rec: _Recorder, sec: float) -> dict:
+    ms = sorted(rec.ms) or [0.0]
+    return {
+        "ops": len(rec.ms),
+        "errors": dict(rec.errors),
+        "sec": round(sec, 4),
+        "ops_per_sec": round(len(rec.ms) / sec, 1) if sec > 0 else 0.0,
+        "p50_ms": round(statistics.median(ms), 3),
+        "p99_ms": round(ms[min(int(len(ms) * 0.99), len(ms) - 1)], 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def _video(name: str) -> str:
+    return f"bench-{name}-{uuid.uuid4().hex[:8]}"
+
+
+def _seed_comments(call: Callable[[str, Any], Any], video_id: str, n: int) -> list[str]:
+    """n top-level comments, created in process (not timed)."""
+    ids = []
+    for i in range(n):
+        resp = call("Create", pb.CreateCommentRequest(
+            video_id=video_id, content_raw=f"seed comment {i}", ctx=pb.UserContext(user_uid=f"seed{i % 97}"),
+        ))
+        ids.append(resp.comment.id)
+    return ids
+
+
+# ---------------------------
+# Scenarios: (recorder, seeding caller, settings) -> list of jobs
+# ---------------------------
+
+def hot_write(rec: _Recorder, seed: Callable, s: dict) -> list[Callable[[], None]]:
+    video_id = _video("hot")
+
+    def job(i: int) -> Callable[[], None]:
+        req = pb.CreateCommentRequest(
+            video_id=video_id, content_raw=f"comment {i}", ctx=pb.UserContext(user_uid=f"u{i % 1000}", username=f"user {i}"),
+        )
+        return lambda: rec.call("Create", req)
+
+    return [job(i) for i in range(s["ops"])]
+
+
+def deep_pagination(rec: _Recorder, seed: Callable, s: dict) -> list[Callable[[], None]]:
+    video_id = _video("deep")
+    _seed_comments(seed, video_id, s["depth"])
+
+    def walk(sort: int) -> None:
+        token = ""
+        while True:
+            resp = rec.call("ListTop", pb.ListTopRequest(video_id=video_id, page_size=20, page_token=token, sort=sort))
+            token = resp.next_page_token if resp is not None else ""
+            if not token:
+                return
+
+    sorts = [pb.SortOrder.Value(name) for name in pb.SortOrder.keys()]
+    walks = max(s["ops"] // max(s["depth"] // 20, 1), len(sorts))
+    return [lambda sort=sorts[i % len(sorts)]: walk(sort) for i in range(walks)]
+
+
+def vote_storm(rec: _Recorder, seed: Callable, s: dict) -> list[Callable[[], None]]:
+    video_id = _video("votes")
+    comment_ids = _seed_comments(seed, video_id, 10)
+    rnd = random.Random(1)
+
+    def job() -> Callable[[], None]:
+        req = pb.VoteRequest(
+            video_id=video_id, comment_id=rnd.choice(comment_ids), vote=rnd.choice((-1, 0, 1)),
+            ctx=pb.UserContext(user_uid=f"u{rnd.randrange(500)}"),
+        )
+        return lambda: rec.call("Vote", req)
+
+    return [job() for _ in range(s["ops"])]
+
+
+def my_votes(rec: _Recorder, seed: Callable, s: dict, fanout: int) -> list[Callable[[], None]]:
+    video_id = _video("myvotes")
+    comment_ids = _seed_comments(seed, video_id, fanout)
+    users = [f"u{i}" for i in range(20)]
+    for user in users:
+        for i, cid in enumerate(comment_ids[::2]):
+            seed("Vote", pb.VoteRequest(video_id=video_id, comment_id=cid, vote=1 if i % 2 else -1, ctx=pb.UserContext(user_uid=user)))
+    reqs = [pb.GetMyVotesRequest(video_id=video_id, comment_ids=comment_ids, ctx=pb.UserContext(user_uid=u)) for u in users]
+    return [lambda req=reqs[i % len(reqs)]: rec.call("GetMyVotes", req) for i in range(max(s["ops"] // 4, 1))]
+
+
+def _scenarios(s: dict) -> dict[str, Callable]:
+    out: dict[str, Callable] = {"hot_write": hot_write, "deep_pagination": deep_pagination, "vote_storm": vote_storm}
+    for n in s["fanout"]:
+        out[f"my_votes_{n}"] = lambda rec, seed, s, n=n: my_votes(rec, seed, s, n)
+    return out
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _compare(results: list[dict], path: str) -> None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            old = {(r["scenario"], r["mode"]): r for r in json.load(f).get("results", [])}
+    except (OSError, ValueError) as e:
+        log.error("cannot read %s: %s", path, e)
+        return
+
+    def pct(new: float, prev: float) -> str:
+        return f"{(new - prev) / prev * 100.0:+6.1f}%" if prev else "    n/a"
+
+    print(f"\ncompared to {path}:")
+    for r in results:
+        o = old.get((r["scenario"], r["mode"]))
+        if o is None:
+            continue
+        print(
+            f"{r['scenario']:18s} {r['mode']:6s} ops/s {pct(r['ops_per_sec'], o['ops_per_sec'])}"
+            f"  p50 {pct(r['p50_ms'], o['p50_ms'])}  p99 {pct(r['p99_ms'], o['p99_ms'])}"
+        )
+
+
+def main(argv: list[str]) -> int:
+    setup_logging()
+    s = {
+        "backend": os.getenv("BENCH_BACKEND", "memory").strip().lower(),
+        "latency_ms": float(os.getenv("BENCH_LATENCY_MS", "0.5")),
+        "jitter_ms": float(os.getenv("BENCH_JITTER_MS", "0.2")),
+        "concurrency": int(os.getenv("BENCH_CONCURRENCY", "32")),
+        "ops": int(os.getenv("BENCH_OPS", "2000")),
+        "depth": int(os.getenv("BENCH_DEPTH", "2000")),
+        "fanout": [int(x) for x in os.getenv("BENCH_FANOUT", "50,200").split(",") if x.strip()],
+    }
+    mode = os.getenv("BENCH_MODE", "both").strip().lower()
+    modes = ["inproc", "grpc"] if mode == "both" else [mode]
+    scenarios = _scenarios(s)
+    names = argv or list(scenarios)
+    unknown = [n for n in names if n not in scenarios]
+    if unknown or any(m not in ("inproc", "grpc") for m in modes):
+        log.error("unknown scenario or BENCH_MODE: %s (scenarios: %s)", unknown or mode, ", ".join(scenarios))
+        return 2
+    if s["backend"] not in ("memory", "sqlite"):
+        log.error("unknown BENCH_BACKEND: %s (memory|sqlite)", s["backend"])
+        return 2
+
+    tmp = tempfile.TemporaryDirectory(prefix="bench-") if s["backend"] == "sqlite" else None
+    if tmp is not None:
+        from db.sqlite_db import SqliteStorage
+        storage: Storage = SqliteStorage(os.path.join(tmp.name, "bench.db"))
+    else:
+        from db.couchbase_db import CouchbaseStorage
+        memory_coll.install(s["latency_ms"] / 1000.0, s["jitter_ms"] / 1000.0)
+        storage = CouchbaseStorage()
+    seed, _ = _inproc_caller(storage)
+
+    results = []
+    for m in modes:
+        call, close = _inproc_caller(storage) if m == "inproc" else _grpc_caller(storage, s["concurrency"])
+        try:
+            for name in names:
+                rec = _Recorder(call)
+                jobs = scenarios[name](rec, seed, s)
+                r = {"scenario": name, "mode": m, **_summary(rec, _run(jobs, s["concurrency"]))}
+                results.append(r)
+                print(
+                    f"{name:18s} {m:6s} ops={r['ops']:6d} errors={sum(r['errors'].values()):4d} "
+                    f"{r['ops_per_sec']:9.1f} ops/s  p50={r['p50_ms']:8.3f}ms  p99={r['p99_ms']:8.3f}ms"
+                )
+        finally:
+            close()
+    if tmp is not None:
+        tmp.cleanup()
+
+    report = {
+        "commit": _git_commit(),
+        "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "settings": s,
+        "results": results,
+    }
+    path = os.getenv("BENCH_REPORT", "bench-report.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    log.info("report written to %s", path)
+
+    compare = os.getenv("BENCH_COMPARE", "").strip()
+    if compare:
+        _compare(results, compare)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,308 @@
+"""
+Import comments and votes from a ytcomments_mongodb dump (mongoexport JSONL
+or mongodump BSON, optionally gzipped) into the current layout.
+
+    python -m tools.import_legacy comments.jsonl votes.jsonl
+    python -m tools.import_legacy dump/ytcomments/comments.bson dump/ytcomments/votes.bson
+
+Records are grouped by video and every thread is built in memory
+(build_thread_docs) and written with bulk upserts by IMPORT_WORKERS threads
+(default 8), thread doc last. Videos that already have a thread are skipped
+unless IMPORT_REPLACE=1. Finished videos are appended to the checkpoint file
+(IMPORT_CHECKPOINT, default <first dump>.done), so a rerun after an
+interruption skips them. With IMPORT_SORTED=1 the dumps must be sorted by
+video_id (mongoexport --sort '{video_id: 1}'); videos are then imported as
+they are read instead of after the whole dump is grouped in memory.
+Progress is logged every IMPORT_REPORT_SEC (default 10).
+"""
+
+from __future__ import annotations
+
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator
+
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv()
+except Exception:
+    pass
+
+from config.app_cfg import _getenv_bool
+from db.couchbase_db import build_thread_docs, import_thread
+from utils.log_ut import setup_logging
+
+log = logging.getLogger("import_legacy")
+
+
+# ---------------------------
+# Legacy records. Comments and votes may come from separate dumps or one;
+# a record with "vote" and "comment_id" is a vote, anything else with a
+# video_id a comment. Ids may be ObjectIds, times ms/s numbers, ISO strings,
+# datetimes or extended JSON ({"$oid": ..}, {"$date": ..}).
+# ---------------------------
+
+def _str(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, dict):
+        v = v.get("$oid", v.get("$numberLong", ""))
+    return str(v)
+
+
+def _ms(v: Any) -> int:
+    if isinstance(v, dict):
+        v = v.get("$date", v.get("$numberLong", 0))
+        if isinstance(v, dict):
+            v = v.get("$numberLong", 0)
+    if isinstance(v, datetime):
+        return int((v if v.tzinfo else v.replace(tzinfo=timezone.utc)).timestamp() * 1000)
+    if isinstance(v, str):
+        try:
+            return _ms(float(v))
+        except ValueError:
+            pass
+        try:
+            return _ms(datetime.fromisoformat(v.replace("Z", "+00:00")))
+        except ValueError:
+            return 0
+    if isinstance(v, (int, float)) and v > 0:
+        return int(v * 1000) if v < 10 ** 11 else int(v)  # seconds or ms
+    return 0
+
+
+def _int(v: Any) -> int:
+    """Counter: number, numeric string or extended JSON ({"$numberInt": ..}, {"$numberLong": ..}); 0 otherwise."""
+    if isinstance(v, dict):
+        v = v.get("$numberInt", v.get("$numberLong", v.get("$numberDouble", 0)))
+    try:
+        return int(v or 0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return int(float(v))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _vote(v: Any) -> int:
+    if isinstance(v, str):
+        v = {"like": 1, "up": 1, "dislike": -1, "down": -1}.get(v.strip().lower(), v)
+    v = _int(v)
+    return v if v in (-1, 0, 1) else 0
+
+
+def _first(rec: dict, *names: str) -> Any:
+    for n in names:
+        if rec.get(n) is not None:
+            return rec[n]
+    return None
+
+
+def normalize(rec: dict) -> list[tuple[str, str, dict]]:
+    """Legacy record -> [(kind, video_id, fields)], kind "comment" or "vote"; [] if unusable."""
+    video_id = _str(rec.get("video_id")).strip()
+    if not video_id:
+        return []
+    if "vote" in rec and "comment_id" in rec:
+        return [("vote", video_id, {
+            "comment_id": _str(rec["comment_id"]),
+            "user_uid": _str(_first(rec, "user_uid", "user_id")),
+            "vote": _vote(rec["vote"]),
+        })]
+
+    cid = _str(_first(rec, "id", "_id")).strip()
+    if not cid:
+        return []
+    created = _ms(_first(rec, "created_at", "created"))
+    out = [("comment", video_id, {
+        "id": cid,
+        "parent_id": _str(rec.get("parent_id")).strip(),
+        "content_raw": _str(_first(rec, "content_raw", "content", "text")),
+        "content_html": _str(rec.get("content_html")),
+        "is_deleted": bool(_first(rec, "is_deleted", "deleted") or False),
+        "edited": bool(rec.get("edited") or False),
+        "created_at": created,
+        "updated_at": _ms(_first(rec, "updated_at", "updated")) or created,
+        "user_uid": _str(_first(rec, "user_uid", "user_id")),
+        "username": _str(rec.get("username")),
+        "channel_id": _str(rec.get("channel_id")),
+        "likes": _int(rec.get("likes")),
+        "dislikes": _int(rec.get("dislikes")),
+    })]
+    # votes embedded in the comment: {user_uid: vote}
+    for uid, v in (rec.get("votes") or {}).items() if isinstance(rec.get("votes"), dict) else ():
+        out.append(("vote", video_id, {"comment_id": cid, "user_uid": _str(uid), "vote": _vote(v)}))
+    return out
+
+
+def read_dump(path: str) -> Iterator[dict]:
+    opener = gzip.open if path.endswith(".gz") else open
+    if path.removesuffix(".gz").endswith(".bson"):
+        try:
+            from bson import decode_file_iter  # type: ignore
+        except ImportError as e:
+            raise SystemExit("BSON dumps need the bson package (pip install pymongo)") from e
+        with opener(path, "rb") as f:
+            yield from decode_file_iter(f)
+        return
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def group_videos(records: Iterable[dict], sorted_input: bool) -> Iterator[tuple[str, list[dict], list[dict]]]:
+    """(video_id, comments, votes) per video; sorted_input: records come grouped by video."""
+    entries = (e for rec in records for e in normalize(rec))
+    if sorted_input:
+        for video_id, group in itertools.groupby(entries, key=lambda e: e[1]):
+            comments, votes = [], []
+            for kind, _, fields in group:
+                (comments if kind == "comment" else votes).append(fields)
+            yield video_id, comments, votes
+        return
+
+    videos: dict[str, tuple[list[dict], list[dict]]] = {}
+    for kind, video_id, fields in entries:
+        comments, votes = videos.setdefault(video_id, ([], []))
+        (comments if kind == "comment" else votes).append(fields)
+    for video_id in sorted(videos):
+        comments, votes = videos.pop(video_id)
+        yield video_id, comments, votes
+
+
+# ---------------------------
+# Import
+# ---------------------------
+
+class Progress:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.t0 = time.time()
+        self.videos = self.skipped = self.failed = 0
+        self.comments = self.votes = self.docs = 0
+
+    def add(self, comments: int, votes: int, docs: int) -> None:
+        with self.lock:
+            self.videos += 1
+            self.comments += comments
+            self.votes += votes
+            self.docs += docs
+
+    def report(self, final: bool = False) -> None:
+        dt = max(time.time() - self.t0, 1e-9)
+        log.info(
+            "%s: videos=%d skipped=%d failed=%d comments=%d votes=%d docs=%d | %.0f comments/s %.0f docs/s, %.1fs",
+            "done" if final else "progress",
+            self.videos, self.skipped, self.failed, self.comments, self.votes, self.docs,
+            self.comments / dt, self.docs / dt, dt,
+        )
+
+
+def _load_checkpoint(path: str) -> set[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def run(
+    records: Iterable[dict],
+    checkpoint: str,
+    workers: int = 8,
+    replace: bool = False,
+    sorted_input: bool = False,
+    report_sec: float = 10.0,
+) -> Progress:
+    """Import records (as read from dumps) into the connected cluster; see the module docstring."""
+    done = _load_checkpoint(checkpoint) if checkpoint else set()
+    progress = Progress()
+    ckpt_lock = threading.Lock()
+    ckpt = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+
+    def one(video_id: str, comments: list[dict], votes: list[dict]) -> None:
+        docs = build_thread_docs(video_id, comments, votes)
+        if not import_thread(video_id, docs, replace):
+            with progress.lock:
+                progress.skipped += 1
+        else:
+            progress.add(len(comments), len(votes), len(docs))
+        if ckpt is not None:
+            with ckpt_lock:
+                ckpt.write(video_id + "\n")
+                ckpt.flush()
+
+    next_report = time.time() + report_sec
+    inflight: dict[Future, str] = {}
+
+    def reap(block: bool) -> None:
+        nonlocal next_report
+        if not inflight:
+            return
+        finished, _ = wait(list(inflight), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for fut in finished:
+            video_id = inflight.pop(fut)
+            if fut.exception() is not None:
+                with progress.lock:
+                    progress.failed += 1
+                log.error("import %s failed: %s", video_id, fut.exception())
+        if report_sec and time.time() >= next_report:
+            progress.report()
+            next_report = time.time() + report_sec
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(int(workers), 1)) as pool:
+            for video_id, comments, votes in group_videos(records, sorted_input):
+                if video_id in done:
+                    continue
+                # bounded look-ahead: at most 2 threads per worker built or being written
+                while len(inflight) >= 2 * max(int(workers), 1):
+                    reap(True)
+                inflight[pool.submit(one, video_id, comments, votes)] = video_id
+                reap(False)
+            while inflight:
+                reap(True)
+    finally:
+        if ckpt is not None:
+            ckpt.close()
+    progress.report(final=True)
+    return progress
+
+
+def main(argv: list[str]) -> int:
+    setup_logging()
+    if not argv:
+        print(__doc__)
+        return 2
+
+    sorted_input = _getenv_bool("IMPORT_SORTED", False)
+    if sorted_input:
+        records: Iterable[dict] = heapq.merge(*(read_dump(p) for p in argv), key=lambda r: _str(r.get("video_id")))
+    else:
+        records = itertools.chain.from_iterable(read_dump(p) for p in argv)
+
+    progress = run(
+        records,
+        checkpoint=os.getenv("IMPORT_CHECKPOINT", "") or argv[0] + ".done",
+        workers=int(os.getenv("IMPORT_WORKERS", "8")),
+        replace=_getenv_bool("IMPORT_REPLACE", False),
+        sorted_input=sorted_input,
+        report_sec=float(os.getenv("IMPORT_REPORT_SEC", "10")),
+    )
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+Migrate comment threads stored in an older layout to the current one.
+
+    python -m tools.migrate_threads                 # all legacy threads (N1QL)
+    python -m tools.migrate_threads VIDEO_ID ...    # only these videos
+
+Threads are also migrated lazily on first access; this tool just does it
+up front. Safe to re-run.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import time
+
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv()
+except Exception:
+    pass
+
+from couchbase.options import QueryOptions
+
+from config.couchbase_cfg import cb_cfg
+from db.couchbase_db import THREAD_LAYOUT, connect, migrate_thread
+from utils.log_ut import setup_logging
+
+log = logging.getLogger("migrate_threads")
+
+
+def legacy_video_ids() -> list[str]:
+    ctx = connect()
+    q = (
+        f"SELECT RAW t.video_id FROM `{cb_cfg.bucket}`.`{cb_cfg.scope}`.`{cb_cfg.collection}` t "
+        "WHERE t.type = 'comment_thread' AND (t.layout IS MISSING OR t.layout < $layout)"
+    )
+    res = ctx.cluster.query(q, QueryOptions(named_parameters={"layout": THREAD_LAYOUT}))
+    return [str(v) for v in res.rows() if v]
+
+
+def main(argv: list[str]) -> int:
+    setup_logging()
+    video_ids = argv or legacy_video_ids()
+    log.info("threads to migrate: %d", len(video_ids))
+
+    t0 = time.time()
+    failed = 0
+    for i, video_id in enumerate(video_ids, 1):
+        try:
+            migrate_thread(video_id)
+        except Exception as e:
+            failed += 1
+            log.error("migrate %s failed: %s", video_id, e)
+        if i % 100 == 0:
+            log.info("progress: %d/%d", i, len(video_ids))
+
+    log.info("done: %d threads, %d failed, %.1fs", len(video_ids), failed, time.time() - t0)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
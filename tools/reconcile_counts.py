@@ -0,0 +1,63 @@
+"""
+Rebuild the ccount:: counter docs (GetCounts) from the thread docs' counts.
+
+    python -m tools.reconcile_counts                 # every thread (N1QL)
+    python -m tools.reconcile_counts VIDEO_ID ...    # only these videos
+
+Run once after upgrading to counter docs: threads written before have none
+until their next create or delete, and are read from the thread doc
+meanwhile. Also fixes counters left behind by a write that died between its
+thread mutation and its counter op. Couchbase backend only. Safe to re-run.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import time
+
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv()
+except Exception:
+    pass
+
+from config.couchbase_cfg import cb_cfg
+from db.couchbase_db import connect, reconcile_counts
+from utils.log_ut import setup_logging
+
+log = logging.getLogger("reconcile_counts")
+
+
+def thread_video_ids() -> list[str]:
+    ctx = connect()
+    q = (
+        f"SELECT RAW t.video_id FROM `{cb_cfg.bucket}`.`{cb_cfg.scope}`.`{cb_cfg.collection}` t "
+        "WHERE t.type = 'comment_thread'"
+    )
+    return [str(v) for v in ctx.cluster.query(q).rows() if v]
+
+
+def main(argv: list[str]) -> int:
+    setup_logging()
+    video_ids = argv or thread_video_ids()
+    log.info("threads to reconcile: %d", len(video_ids))
+
+    t0 = time.time()
+    failed = 0
+    for i, video_id in enumerate(video_ids, 1):
+        try:
+            top, total = reconcile_counts(video_id)
+            log.debug("%s: top=%d total=%d", video_id, top, total)
+        except Exception as e:
+            failed += 1
+            log.error("reconcile %s failed: %s", video_id, e)
+        if i % 100 == 0:
+            log.info("progress: %d/%d", i, len(video_ids))
+
+    log.info("done: %d threads, %d failed, %.1fs", len(video_ids), failed, time.time() - t0)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
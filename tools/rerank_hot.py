@@ -0,0 +1,64 @@
+"""
+Rebuild HOT indexes after a change of the decay parameters
+(YTCOMMENTS_HOT_HALF_LIFE_SEC / _PRIOR / _BUCKET_HALF_LIVES).
+
+    python -m tools.rerank_hot                 # all threads built with other parameters (N1QL)
+    python -m tools.rerank_hot VIDEO_ID ...    # only these videos
+
+The server's background re-ranker does the same for threads it reads; this
+tool just does it up front. Safe to re-run.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import time
+
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv()
+except Exception:
+    pass
+
+from couchbase.options import QueryOptions
+
+from config.couchbase_cfg import cb_cfg
+from db.couchbase_db import _hot_params, connect, rerank_hot
+from utils.log_ut import setup_logging
+
+log = logging.getLogger("rerank_hot")
+
+
+def stale_video_ids() -> list[str]:
+    ctx = connect()
+    q = (
+        f"SELECT RAW t.video_id FROM `{cb_cfg.bucket}`.`{cb_cfg.scope}`.`{cb_cfg.collection}` t "
+        "WHERE t.type = 'comment_thread' AND (t.hot_cfg IS MISSING OR t.hot_cfg != $params)"
+    )
+    res = ctx.cluster.query(q, QueryOptions(named_parameters={"params": _hot_params()}))
+    return [str(v) for v in res.rows() if v]
+
+
+def main(argv: list[str]) -> int:
+    setup_logging()
+    video_ids = argv or stale_video_ids()
+    log.info("threads to re-rank: %d", len(video_ids))
+
+    t0 = time.time()
+    failed = 0
+    for i, video_id in enumerate(video_ids, 1):
+        try:
+            rerank_hot(video_id)
+        except Exception as e:
+            failed += 1
+            log.error("re-rank %s failed: %s", video_id, e)
+        if i % 100 == 0:
+            log.info("progress: %d/%d", i, len(video_ids))
+
+    log.info("done: %d threads, %d failed, %.1fs", len(video_ids), failed, time.time() - t0)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
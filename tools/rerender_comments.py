@@ -0,0 +1,68 @@
+"""
+Re-render content_html of comments rendered by an older renderer
+(utils/render_ut.py: RENDERER_VERSION) or never rendered (legacy imports).
+
+    python -m tools.rerender_comments                 # all videos with stale comments
+    python -m tools.rerender_comments VIDEO_ID ...    # only these videos
+
+Runs on the configured backend (YTCOMMENTS_STORAGE); finding stale videos
+needs a N1QL index on Couchbase. Videos are re-rendered in parallel by
+YTCOMMENTS_RERENDER_WORKERS threads (default 8), sharing the render cache,
+so repeated texts are rendered once. Edits landing meanwhile win. Safe to
+re-run.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv()
+except Exception:
+    pass
+
+from config.render_cfg import render_cfg
+from db.storage import get_storage
+from utils.log_ut import setup_logging
+from utils.render_ut import RENDERER_VERSION, render_cache
+
+log = logging.getLogger("rerender_comments")
+
+
+def main(argv: list[str]) -> int:
+    setup_logging()
+    if not render_cfg.enabled:
+        log.error("rendering is off (YTCOMMENTS_RENDER); nothing to re-render")
+        return 2
+    storage = get_storage()
+    video_ids = argv or storage.stale_render_video_ids()
+    log.info("videos to re-render: %d (renderer v%d, %s)", len(video_ids), RENDERER_VERSION, storage.name)
+
+    t0 = time.time()
+    failed = 0
+    comments = 0
+    with ThreadPoolExecutor(max_workers=max(render_cfg.rerender_workers, 1)) as pool:
+        futs = {pool.submit(storage.rerender_thread, video_id): video_id for video_id in video_ids}
+        for i, fut in enumerate(as_completed(futs), 1):
+            try:
+                comments += fut.result()
+            except Exception as e:
+                failed += 1
+                log.error("re-render %s failed: %s", futs[fut], e)
+            if i % 100 == 0:
+                log.info("progress: %d/%d", i, len(video_ids))
+
+    stats = render_cache.stats()
+    log.info(
+        "done: %d videos, %d comments, %d failed, %.1fs (render cache hit ratio %.2f)",
+        len(video_ids), comments, failed, time.time() - t0, stats["hit_ratio"],
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class _Pending:
+    __slots__ = ("op", "result", "error", "done", "leader")
+
+    def __init__(self, op: Any):
+        self.op = op
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.done = False
+        self.leader = False
+
+
+class _Queue:
+    __slots__ = ("cond", "items", "busy")
+
+    def __init__(self, lock: threading.Lock):
+        self.cond = threading.Condition(lock)
+        self.items: List[_Pending] = []
+        self.busy = False
+
+
+class Coalescer:
+    """
+    Group commit per key. Callers submit ops for a key; the first caller of an
+    idle key becomes the leader, waits `window_sec` for more ops to arrive and
+    runs apply(key, ops) for up to `max_batch` of them on its own thread.
+    apply returns one result per op, an exception instance meaning that op
+    failed. Followers block until their op is done, or until they are promoted
+    to lead the next batch.
+    """
+
+    def __init__(
+        self,
+        apply: Callable[[Hashable, List[Any]], List[Any]],
+        window_sec: float = 0.0,
+        max_batch: int = 64,
+    ):
+        self.apply = apply
+        self.window_sec = max(float(window_sec or 0.0), 0.0)
+        self.max_batch = max(int(max_batch or 0), 1)
+
+        self._lock = threading.Lock()
+        self._queues: Dict[Hashable, _Queue] = {}
+
+        self.batches = 0
+        self.ops = 0
+
+    def submit(self, key: Hashable, op: Any) -> Any:
+        p = _Pending(op)
+        with self._lock:
+            q = self._queues.get(key)
+            if q is None:
+                q = self._queues[key] = _Queue(self._lock)
+            q.items.append(p)
+            if q.busy:
+                while not (p.done or p.leader):
+                    q.cond.wait()
+            else:
+                q.busy = True
+                p.leader = True
+
+        if not p.done:
+            self._lead(key, q)
+        if p.error is not None:
+            raise p.error
+        return p.result
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "batches": float(self.batches),
+                "ops": float(self.ops),
+                "avg_batch": (self.ops / self.batches) if self.batches else 0.0,
+                "pending": float(sum(len(q.items) for q in self._queues.values())),
+            }
+
+    def _lead(self, key: Hashable, q: _Queue) -> None:
+        if self.window_sec:
+            time.sleep(self.window_sec)
+
+        with self._lock:
+            batch = q.items[:self.max_batch]
+            del q.items[:len(batch)]
+
+        try:
+            results = list(self.apply(key, [p.op for p in batch]))
+            if len(results) != len(batch):
+                raise RuntimeError(f"coalesced apply returned {len(results)} results for {len(batch)} ops")
+        except Exception as e:
+            results = [e] * len(batch)
+
+        with self._lock:
+            for p, r in zip(batch, results):
+                if isinstance(r, Exception):
+                    p.error = r
+                else:
+                    p.result = r
+                p.done = True
+            self.batches += 1
+            self.ops += len(batch)
+            if q.items:
+                q.items[0].leader = True
+            else:
+                q.busy = False
+                self._queues.pop(key, None)
+            q.cond.notify_all()
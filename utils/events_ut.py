@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional
+
+# Thread events, published by the storage backends through utils/pubsub_ut.py
+# (WatchThread). An event is a dict: type, video_id, at (ms), and for comment
+# events the comment with its id and parent_id.
+EVENT_CREATED = "created"
+EVENT_EDITED = "edited"
+EVENT_DELETED = "deleted"
+EVENT_RESTORED = "restored"
+EVENT_VOTED = "voted"
+
+
+def thread_event(kind: str, video_id: str, comment: Optional[dict] = None, **fields: Any) -> Dict[str, Any]:
+    ev: Dict[str, Any] = {"type": kind, "video_id": video_id, "at": int(time.time() * 1000)}
+    if comment is not None:
+        ev.update(comment=comment, comment_id=comment.get("id", ""), parent_id=comment.get("parent_id", "") or "")
+    ev.update(fields)
+    return ev
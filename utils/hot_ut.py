@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import math
+from typing import List, Sequence
+
+# Hot values are fixed point, in millionths of a half-life
+HOT_SCALE = 1_000_000
+
+
+def hot_params(half_life_sec: float, prior: float, bucket_half_lives: float) -> List[float]:
+    """Decay parameters of a hot order as backends store them: [half-life, prior, bucket width]."""
+    return [float(half_life_sec), float(prior), float(bucket_half_lives)]
+
+
+def hot_value(score: int, created_at: int, params: Sequence[float]) -> int:
+    """
+    Time-independent HOT sort key: (score + prior) * 2^(-age / half_life)
+    orders comments like log2|score + prior| + created_at / half_life does.
+    """
+    base = int(score) + float(params[1])
+    if base == 0:
+        return 0
+    half_life_ms = max(float(params[0]), 1.0) * 1000.0
+    v = int(round((math.log2(abs(base)) + int(created_at) / half_life_ms) * HOT_SCALE))
+    return v if base > 0 else -v
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LruCache:
+    """
+    Thread-safe LRU with optional TTL and byte budget.
+    Sizes are supplied by the caller (put/resize); 0 disables a limit.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, ttl_sec: float = 0.0):
+        self.max_entries = max(int(max_entries or 0), 0)
+        self.max_bytes = max(int(max_bytes or 0), 0)
+        self.ttl_sec = max(float(ttl_sec or 0.0), 0.0)
+
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, list]" = OrderedDict()  # key -> [value, size, expires_at]
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, validate: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached value or None. validate(value) runs outside the lock;
+        a falsy result drops the entry and counts as a miss.
+        """
+        value = self.lookup(key)
+        if value is None:
+            return None
+        valid = validate is None or bool(validate(value))
+        self.settle(key, value, valid)
+        return value if valid else None
+
+    def lookup(self, key: Hashable) -> Any:
+        """
+        get() in two halves, for callers that validate asynchronously: the
+        cached value or None (counted as a miss). The caller validates the
+        value and reports the outcome with settle().
+        """
+        with self._lock:
+            slot = self._data.get(key)
+            if slot is not None and slot[2] and slot[2] <= time.monotonic():
+                self._drop(key)
+                slot = None
+            if slot is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            return slot[0]
+
+    def settle(self, key: Hashable, value: Any, valid: bool) -> None:
+        """Count a lookup() as a hit, or drop its entry (unless replaced meanwhile) and count a miss."""
+        with self._lock:
+            if valid:
+                self.hits += 1
+                return
+            cur = self._data.get(key)
+            if cur is not None and cur[0] is value:
+                self._drop(key)
+                self.invalidations += 1
+            self.misses += 1
+
+    def peek(self, key: Hashable) -> Any:
+        with self._lock:
+            slot = self._data.get(key)
+            return None if slot is None else slot[0]
+
+    def put(self, key: Hashable, value: Any, size: int = 0) -> None:
+        if not self.max_entries:
+            return
+        expires_at = time.monotonic() + self.ttl_sec if self.ttl_sec else 0.0
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = [value, int(size), expires_at]
+            self._bytes += int(size)
+            self._evict()
+
+    def resize(self, key: Hashable, size: int) -> None:
+        with self._lock:
+            slot = self._data.get(key)
+            if slot is None:
+                return
+            self._bytes += int(size) - slot[1]
+            slot[1] = int(size)
+            self._evict()
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            slot = self._data.get(key)
+            if slot is None:
+                return None
+            self._drop(key)
+            self.invalidations += 1
+            return slot[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": float(len(self._data)),
+                "bytes": float(self._bytes),
+                "hits": float(self.hits),
+                "misses": float(self.misses),
+                "evictions": float(self.evictions),
+                "invalidations": float(self.invalidations),
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    # --- internals (lock held) ---
+
+    def _drop(self, key: Hashable) -> None:
+        slot = self._data.pop(key)
+        self._bytes -= slot[1]
+
+    def _evict(self) -> None:
+        while self._data and (
+            len(self._data) > self.max_entries
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            self._drop(key)
+            self.evictions += 1
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.metrics_cfg import metrics_cfg
+
+log = logging.getLogger("metrics")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def exp_bounds(start: float, factor: float, n: int) -> List[float]:
+    """n histogram bucket upper bounds: start, start*factor, start*factor^2, ..."""
+    return [start * factor ** i for i in range(int(n))]
+
+
+LATENCY_MS_BOUNDS = exp_bounds(0.05, 1.5, 32)  # 50us .. ~14 min
+SIZE_BYTES_BOUNDS = exp_bounds(256, 2.0, 18)  # 256B .. 32MB
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Counter:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value += n
+
+
+class Gauge:
+    """A level that goes up and down: set()/inc()/dec(), or read from fn() at collection time."""
+    __slots__ = ("_lock", "value", "fn")
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self.fn = fn
+
+    def set(self, v: float) -> None:
+        with self._lock:
+            self.value = float(v)
+
+    def inc(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value += n
+
+    def dec(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value -= n
+
+    def read(self) -> float:
+        return float(self.fn()) if self.fn is not None else self.value
+
+
+class Histogram:
+    """
+    Bucketed observations. Count and sum are since start; percentiles cover
+    the current and the previous window, so they follow the recent load.
+    A percentile is interpolated within its bucket, so it is accurate to the
+    bucket width (factor 1.5 for the latency bounds).
+    """
+
+    def __init__(self, bounds: Sequence[float], window_sec: float = 60.0):
+        self.bounds = list(bounds)
+        self.window_sec = max(float(window_sec or 0.0), 0.0)
+        self._lock = threading.Lock()
+        self._cur = [0] * (len(self.bounds) + 1)  # last slot: above the last bound
+        self._prev = [0] * (len(self.bounds) + 1)
+        self._rotated_at = time.monotonic()
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, v: float) -> None:
+        i = bisect.bisect_left(self.bounds, v)
+        with self._lock:
+            self._rotate()
+            self._cur[i] += 1
+            self.count += 1
+            self.sum += v
+
+    def percentiles(self, qs: Sequence[float] = QUANTILES) -> List[float]:
+        with self._lock:
+            self._rotate()
+            counts = [a + b for a, b in zip(self._cur, self._prev)]
+        total = sum(counts)
+        out = []
+        for q in qs:
+            if not total:
+                out.append(0.0)
+                continue
+            rank = q * total
+            seen = 0
+            for i, n in enumerate(counts):
+                if n and seen + n >= rank:
+                    lo = self.bounds[i - 1] if i > 0 else 0.0
+                    hi = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                    out.append(lo + (hi - lo) * (rank - seen) / n)
+                    break
+                seen += n
+        return out
+
+    def _rotate(self) -> None:
+        if not self.window_sec:
+            return
+        now = time.monotonic()
+        if now - self._rotated_at < self.window_sec:
+            return
+        # more than one window idle: nothing recent is left
+        self._prev = self._cur if now - self._rotated_at < 2 * self.window_sec else [0] * len(self._cur)
+        self._cur = [0] * len(self._cur)
+        self._rotated_at = now
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def flat_name(name: str, labels: Labels = ()) -> str:
+    """Info.metrics key: name{k=v,...}."""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+_FLAT = re.compile(r"^([^{]+)(?:\{(.*)\})?$")
+
+
+def _split_flat(key: str) -> Tuple[str, Labels]:
+    m = _FLAT.match(key)
+    if m is None or not m.group(2):
+        return key, ()
+    return m.group(1), tuple(tuple(kv.split("=", 1)) for kv in m.group(2).split(",") if "=" in kv)  # type: ignore[misc]
+
+
+class Registry:
+    """
+    Named metrics with optional labels: counters, histograms, gauges, and
+    collectors (functions returning a dict of values, e.g. the existing
+    *_stats() functions) under a family prefix. Metric names are dotted, the
+    first part being the family ("rpc", "kv", ...); selectors filter by
+    name prefix.
+    """
+
+    def __init__(self, window_sec: float = 60.0):
+        self.window_sec = window_sec
+        self._lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, Labels], object] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def counter(self, name: str, **labels: object) -> Counter:
+        return self._get(name, labels, Counter)
+
+    def histogram(self, name: str, bounds: Sequence[float] = LATENCY_MS_BOUNDS, **labels: object) -> Histogram:
+        return self._get(name, labels, lambda: Histogram(bounds, self.window_sec))
+
+    def gauge(self, name: str, fn: Optional[Callable[[], float]] = None, **labels: object) -> Gauge:
+        """With fn, (re)register a gauge read from fn(); without, the settable gauge of that name."""
+        if fn is None:
+            return self._get(name, labels, Gauge)
+        g = Gauge(fn)
+        with self._lock:
+            self._metrics[(name, _labels(labels))] = g
+        return g
+
+    def collector(self, family: str, fn: Callable[[], Dict[str, float]]) -> None:
+        """fn() -> {name: value}, reported as family.name (names may carry {k=v} labels)."""
+        with self._lock:
+            self._collectors[family] = fn
+
+    def _get(self, name: str, labels: Dict[str, object], make: Callable[[], object]):
+        key = (name, _labels(labels))
+        m = self._metrics.get(key)
+        if m is None:
+            with self._lock:
+                m = self._metrics.get(key)
+                if m is None:
+                    m = self._metrics[key] = make()
+        return m
+
+    def _samples(self, selector: str = "") -> Iterator[Tuple[str, Labels, str, str, float]]:
+        """
+        (name, labels, type, kind, value); type "counter", "gauge", "summary"
+        (histograms) or "untyped" (collectors); kind "" or, for histograms,
+        "count"/"sum"/a quantile.
+        """
+        prefixes = [p.strip() for p in (selector or "").split(",") if p.strip()]
+
+        def wanted(name: str) -> bool:
+            return not prefixes or any(name.startswith(p) for p in prefixes)
+
+        with self._lock:
+            metrics = list(self._metrics.items())
+            collectors = list(self._collectors.items())
+        for (name, labels), m in metrics:
+            if not wanted(name):
+                continue
+            if isinstance(m, Counter):
+                yield name, labels, "counter", "", m.value
+            elif isinstance(m, Gauge):
+                try:
+                    yield name, labels, "gauge", "", m.read()
+                except Exception as e:
+                    log.debug("gauge %s failed: %s", name, e)
+            elif isinstance(m, Histogram):
+                yield name, labels, "summary", "count", float(m.count)
+                yield name, labels, "summary", "sum", m.sum
+                for q, v in zip(QUANTILES, m.percentiles(QUANTILES)):
+                    yield name, labels, "summary", str(q), v
+        for family, fn in collectors:
+            if not wanted(family) and not any(p.startswith(family + ".") for p in prefixes):
+                continue
+            try:
+                values = fn() or {}
+            except Exception as e:
+                log.debug("collector %s failed: %s", family, e)
+                continue
+            for key, v in values.items():
+                name, labels = _split_flat(f"{family}.{key}")
+                if wanted(name):
+                    yield name, labels, "untyped", "", float(v)
+
+    def snapshot(self, selector: str = "") -> Dict[str, float]:
+        """Flat {name{labels}: value}; histograms as name.count, name.sum, name.p50, name.p95, name.p99."""
+        out: Dict[str, float] = {}
+        for name, labels, _, kind, v in self._samples(selector):
+            if kind in ("count", "sum"):
+                name = f"{name}.{kind}"
+            elif kind:
+                name = f"{name}.p{int(round(float(kind) * 100))}"
+            out[flat_name(name, labels)] = v
+        return out
+
+    def prometheus(self, prefix: str = "", selector: str = "") -> str:
+        """Prometheus text format; histograms are exported as summaries, collector values untyped."""
+        lines: List[str] = []
+        typed: set = set()
+        for name, labels, typ, kind, v in self._samples(selector):
+            metric = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{name}" if prefix else name)
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {typ}")
+            if kind in ("count", "sum"):
+                metric = f"{metric}_{kind}"
+            elif kind:
+                labels = labels + (("quantile", kind),)
+            if labels:
+                body = ",".join('{}="{}"'.format(k, str(val).replace("\\", "\\\\").replace('"', '\\"')) for k, val in labels)
+                lines.append(f"{metric}{{{body}}} {v!r}")
+            else:
+                lines.append(f"{metric} {v!r}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry, reported by Info.All (srv/info_grpc_srv.py) and serve_prometheus
+metrics = Registry(metrics_cfg.window_sec)
+
+
+def serve_prometheus(registry: Registry, host: str, port: int, prefix: str = "") -> ThreadingHTTPServer:
+    """Serve GET /metrics (?selector=...) from a daemon thread; returns the server (shutdown() stops it)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            path, _, query = self.path.partition("?")
+            if path not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            selector = ""
+            for part in query.split("&"):
+                k, _, v = part.partition("=")
+                if k == "selector":
+                    selector = v
+            body = registry.prometheus(prefix, selector).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt: str, *args) -> None:
+            log.debug(fmt, *args)
+
+    server = ThreadingHTTPServer((host, int(port)), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("prometheus metrics on http://%s:%s/metrics", host, server.server_address[1])
+    return server
+
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+from typing import Union
+
+_PREFIX = "c1."
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    """
+    Where the previous page ended: sort direction, index key of its last item,
+    thread version it was served at. `rank` names the ranked index a cursor
+    belongs to ("" for creation order).
+    """
+    newest_first: bool
+    key: tuple[int, ...]
+    ver: int = 0
+    rank: str = ""
+
+
+def encode_cursor(cur: PageCursor) -> str:
+    d = {"d": 1 if cur.newest_first else 0, "k": list(cur.key), "v": int(cur.ver)}
+    if cur.rank:
+        d["r"] = cur.rank
+    raw = json.dumps(d, separators=(",", ":")).encode()
+    return _PREFIX + base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_page_token(token: str) -> Union[PageCursor, int]:
+    """
+    Cursor token -> PageCursor; legacy numeric token -> offset.
+    Empty or unreadable tokens start from the beginning (offset 0).
+    """
+    token = (token or "").strip()
+    if not token:
+        return 0
+    if not token.startswith(_PREFIX):
+        try:
+            return max(int(token), 0)
+        except Exception:
+            return 0
+    try:
+        body = token[len(_PREFIX):]
+        d = json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+        return PageCursor(
+            newest_first=bool(d["d"]),
+            key=tuple(int(x) for x in d["k"]),
+            ver=int(d.get("v", 0) or 0),
+            rank=str(d.get("r", "") or ""),
+        )
+    except Exception:
+        return 0
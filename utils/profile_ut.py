@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+log = logging.getLogger("profile")
+
+
+# ---------------------------
+# Phase traces: time spent per named phase (db layer, serialization) of the
+# RPC being profiled. Phases may nest, so their times are inclusive.
+# ---------------------------
+
+class Trace:
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases: Dict[str, List[float]] = {}  # name -> [calls, seconds]
+
+    def add(self, name: str, sec: float) -> None:
+        p = self.phases.get(name)
+        if p is None:
+            self.phases[name] = [1, sec]
+        else:
+            p[0] += 1
+            p[1] += sec
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("profile_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def tracing() -> Iterator[Trace]:
+    """Collect the phases timed in this context (and contexts copied from it)."""
+    t = Trace()
+    token = _trace.set(t)
+    try:
+        yield t
+    finally:
+        _trace.reset(token)
+
+
+def traced(name: str, enabled: bool = True) -> Callable[[Callable], Callable]:
+    """
+    Decorator timing calls as phase `name` of the current trace; without a
+    trace it only costs a context variable lookup, with enabled=False nothing.
+    """
+    def deco(fn: Callable) -> Callable:
+        if not enabled:
+            return fn
+
+        @functools.wraps(fn)
+        def run(*args: Any, **kwargs: Any) -> Any:
+            tr = _trace.get()
+            if tr is None:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                tr.add(name, time.perf_counter() - t0)
+
+        return run
+
+    return deco
+
+
+def traced_steps(name: str, enabled: bool = True) -> Callable[[Callable], Callable]:
+    """traced() for generator functions (read steps): times a run from start to return, its I/O included."""
+    def deco(fn: Callable) -> Callable:
+        if not enabled:
+            return fn
+
+        @functools.wraps(fn)
+        def run(*args: Any, **kwargs: Any) -> Any:
+            tr = _trace.get()
+            if tr is None:
+                return (yield from fn(*args, **kwargs))
+            t0 = time.perf_counter()
+            try:
+                return (yield from fn(*args, **kwargs))
+            finally:
+                tr.add(name, time.perf_counter() - t0)
+
+        return run
+
+    return deco
+
+
+# ---------------------------
+# Stack sampling
+# ---------------------------
+
+def collapse_stack(frame: Any, max_depth: int = 64) -> str:
+    """Frame -> "file:function;file:function;..." from the outermost call (flamegraph input)."""
+    parts = []
+    while frame is not None and len(parts) < max_depth:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class StackSampler:
+    """
+    Samples the stacks of watched threads every `interval_sec` from one
+    daemon thread, which only runs while some thread is watched.
+    """
+
+    def __init__(self, interval_sec: float = 0.005, max_stacks: int = 2000):
+        self.interval_sec = max(float(interval_sec or 0.0), 0.001)
+        self.max_stacks = max(int(max_stacks or 0), 1)
+        self._cond = threading.Condition()
+        self._watched: Dict[int, Counter] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, thread_id: int) -> Counter:
+        """Start sampling a thread; the returned Counter fills with collapsed stacks."""
+        stacks: Counter = Counter()
+        with self._cond:
+            self._watched[thread_id] = stacks
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return stacks
+
+    def unwatch(self, thread_id: int) -> None:
+        with self._cond:
+            self._watched.pop(thread_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._watched:
+                    self._cond.wait()
+            time.sleep(self.interval_sec)
+            frames = sys._current_frames()
+            # under the lock: a thread's stacks are final once unwatch() returns
+            with self._cond:
+                for tid, stacks in self._watched.items():
+                    frame = frames.get(tid)
+                    if frame is None:
+                        continue
+                    key = collapse_stack(frame)
+                    if key in stacks or len(stacks) < self.max_stacks:
+                        stacks[key] += 1
+            del frames
+
+
+# ---------------------------
+# Output and runtime settings
+# ---------------------------
+
+class ReportDir:
+    """Writes reports (a few files sharing one name) into a directory, keeping the newest `max_reports`."""
+
+    def __init__(self, path: str, max_reports: int = 200):
+        self.path = path
+        self.max_reports = max(int(max_reports or 0), 1)
+        self._lock = threading.Lock()
+
+    def write(self, name: str, files: Dict[str, Any]) -> str:
+        """files: {suffix: str or bytes, or a callable taking the file path}. Returns the report's base path."""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            base = os.path.join(self.path, name)
+            for suffix, content in files.items():
+                if callable(content):
+                    content(base + suffix)
+                    continue
+                mode = "wb" if isinstance(content, bytes) else "w"
+                with open(base + suffix, mode) as f:
+                    f.write(content)
+            self._rotate()
+            return base
+
+    def _rotate(self) -> None:
+        reports: Dict[str, List[str]] = {}
+        for fn in os.listdir(self.path):
+            if fn.startswith("report-"):
+                reports.setdefault(fn.split(".", 1)[0], []).append(fn)
+        # names start with a sortable timestamp
+        for name in sorted(reports)[:-self.max_reports]:
+            for fn in reports[name]:
+                try:
+                    os.remove(os.path.join(self.path, fn))
+                except OSError:
+                    pass
+
+
+class RuntimeSettings:
+    """
+    Settings from a JSON file, re-read when it changes (checked at most every
+    `check_sec`); keys missing from the file keep their defaults.
+    """
+
+    def __init__(self, path: str, defaults: Dict[str, Any], check_sec: float = 1.0):
+        self.path = path
+        self.defaults = dict(defaults)
+        self.check_sec = check_sec
+        self._values = dict(defaults)
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_sec:
+            return self._values
+        with self._lock:
+            if now - self._checked_at >= self.check_sec:
+                self._checked_at = now
+                self._reload()
+        return self._values
+
+    def _reload(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        values = dict(self.defaults)
+        if mtime is not None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    loaded = json.load(f)
+                values.update({k: type(self.defaults[k])(v) for k, v in loaded.items() if k in self.defaults})
+            except (OSError, ValueError, TypeError) as e:
+                log.warning("ignoring %s: %s", self.path, e)
+                return
+        if values != self._values:
+            log.info("profile settings: %s", values)
+        self._values = values
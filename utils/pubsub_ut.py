@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class Broker:
+    """
+    Carries event batches between publishers and hubs, possibly across
+    processes. publish(topic, events) hands a batch to every hub subscribed to
+    the topic; subscribe(topic, fn) registers fn(events) and returns a callable
+    that unregisters it. A Hub subscribes once per topic, however many local
+    subscribers it has.
+    """
+
+    def publish(self, topic: Hashable, events: List[Any]) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, topic: Hashable, fn: Callable[[List[Any]], None]) -> Callable[[], None]:
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+    """In-process broker: publish calls the subscribed functions on the publisher's thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fns: Dict[Hashable, Tuple[Callable[[List[Any]], None], ...]] = {}
+
+    def publish(self, topic: Hashable, events: List[Any]) -> None:
+        for fn in self._fns.get(topic, ()):
+            fn(events)
+
+    def subscribe(self, topic: Hashable, fn: Callable[[List[Any]], None]) -> Callable[[], None]:
+        with self._lock:
+            self._fns[topic] = self._fns.get(topic, ()) + (fn,)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                fns = tuple(f for f in self._fns.get(topic, ()) if f is not fn)
+                if fns:
+                    self._fns[topic] = fns
+                else:
+                    self._fns.pop(topic, None)
+
+        return unsubscribe
+
+
+class Subscription:
+    """
+    One subscriber's bounded queue. Threads wait with get(), coroutines of the
+    loop passed to Hub.subscribe with aget(). A subscriber whose queue would
+    overflow is dropped: its queue is cleared and it reads as closed with
+    `dropped` set, so it can resynchronise instead of missing events silently.
+    """
+
+    def __init__(self, hub: "Hub", topic: Hashable, maxsize: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.topic = topic
+        self.maxsize = max(int(maxsize or 0), 1)
+        self.closed = False
+        self.dropped = False
+
+        self._hub = hub
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._loop = loop
+        self._wake = asyncio.Event() if loop is not None else None
+        self._waiting = False
+
+    def get(self, timeout: Optional[float] = None) -> Optional[List[Any]]:
+        """All queued events; [] after `timeout` without any, None once closed."""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            return self._take()
+
+    async def aget(self, timeout: Optional[float] = None) -> Optional[List[Any]]:
+        """get() for coroutines on the subscription's loop."""
+        with self._cond:
+            if self._items or self.closed:
+                return self._take()
+            self._wake.clear()
+            self._waiting = True
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._cond:
+            self._waiting = False
+            return self._take()
+
+    def close(self) -> None:
+        self._close(False)
+
+    def _take(self) -> Optional[List[Any]]:
+        if self._items:
+            items = list(self._items)
+            self._items.clear()
+            return items
+        return None if self.closed else []
+
+    def _offer(self, events: List[Any]) -> bool:
+        """Queue a batch; False if it does not fit."""
+        with self._cond:
+            if self.closed:
+                return True
+            if len(self._items) + len(events) > self.maxsize:
+                return False
+            self._items.extend(events)
+            self._cond.notify()
+            wake = self._waiting
+        if wake:
+            self._notify_loop()
+        return True
+
+    def _close(self, dropped: bool) -> None:
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.dropped = dropped
+            if dropped:
+                self._items.clear()
+            self._cond.notify_all()
+        self._notify_loop()
+        self._hub._remove(self)
+
+    def _notify_loop(self) -> None:
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+
+class Hub:
+    """
+    Per-process fan-out of broker topics to subscriptions. Each delivered
+    batch is queued by reference on every subscription of its topic, so one
+    publish serves any number of local subscribers.
+    """
+
+    def __init__(self, broker: Optional[Broker] = None, queue_size: int = 256):
+        self.broker = broker or LocalBroker()
+        self.queue_size = max(int(queue_size or 0), 1)
+
+        self._lock = threading.Lock()
+        self._subs: Dict[Hashable, Tuple[Subscription, ...]] = {}  # replaced on change, read without the lock
+        self._unsub: Dict[Hashable, Callable[[], None]] = {}
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, topic: Hashable, loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        sub = Subscription(self, topic, self.queue_size, loop)
+        with self._lock:
+            subs = self._subs.get(topic)
+            self._subs[topic] = (subs or ()) + (sub,)
+            if subs is None:
+                self._unsub[topic] = self.broker.subscribe(topic, lambda events: self._deliver(topic, events))
+        return sub
+
+    def publish(self, topic: Hashable, events: List[Any]) -> None:
+        if events:
+            self.published += len(events)
+            self.broker.publish(topic, events)
+
+    def set_broker(self, broker: Broker) -> None:
+        """Switch brokers (at startup); topics with subscribers are moved over."""
+        with self._lock:
+            old, self.broker = self._unsub, broker
+            self._unsub = {}
+            for topic in self._subs:
+                self._unsub[topic] = broker.subscribe(topic, lambda events, t=topic: self._deliver(t, events))
+        for unsubscribe in old.values():
+            unsubscribe()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "topics": float(len(self._subs)),
+                "subscribers": float(sum(len(s) for s in self._subs.values())),
+                "published": float(self.published),
+                "delivered": float(self.delivered),
+                "dropped": float(self.dropped),
+            }
+
+    def _deliver(self, topic: Hashable, events: List[Any]) -> None:
+        subs = self._subs.get(topic, ())
+        for sub in subs:
+            if not sub._offer(events):
+                self.dropped += 1
+                sub._close(True)
+        self.delivered += len(events) * len(subs)
+
+    def _remove(self, sub: Subscription) -> None:
+        unsubscribe = None
+        with self._lock:
+            subs = tuple(s for s in self._subs.get(sub.topic, ()) if s is not sub)
+            if subs:
+                self._subs[sub.topic] = subs
+            elif self._subs.pop(sub.topic, None) is not None:
+                unsubscribe = self._unsub.pop(sub.topic, None)
+        if unsubscribe is not None:
+            unsubscribe()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hashlib
+import html
+import re
+from typing import Dict
+from urllib.parse import quote
+
+from config.render_cfg import render_cfg
+from utils.lru_ut import LruCache
+from utils.metrics_ut import metrics
+
+# Bump whenever render() output changes for some input: comments rendered by
+# an older version are re-rendered by tools.rerender_comments.
+RENDERER_VERSION = 1
+
+_TOKEN = re.compile(
+    r"(?P<url>\b(?:https?://|www\.)[^\s<>\"'`]+)"
+    r"|(?P<ts>(?<![\w:.])(?:(?P<h>\d{1,2}):(?=[0-5]\d:))?(?P<m>\d{1,2}):(?P<s>[0-5]\d)(?![\w:]))"
+    r"|(?P<mention>(?<![\w@./])@(?P<name>[A-Za-z0-9_](?:[A-Za-z0-9_.-]{0,28}[A-Za-z0-9_])?))",
+    re.IGNORECASE,
+)
+# everything below a space except tab and newline, plus DEL and bidi overrides
+_CONTROL = re.compile("[\x00-\x08\x0b-\x1f\x7f\u202a-\u202e\u2066-\u2069]")
+_URL_TAIL = ".,;:!?'\""
+
+
+def _trim_url(url: str) -> str:
+    """Drop trailing punctuation, and closing parentheses that were not opened in the url."""
+    while url:
+        if url[-1] in _URL_TAIL:
+            url = url[:-1]
+        elif url[-1] == ")" and url.count(")") > url.count("("):
+            url = url[:-1]
+        else:
+            break
+    return url
+
+
+def _link(href: str, text: str, cls: str, external: bool = False) -> str:
+    attrs = ' rel="nofollow ugc noopener" target="_blank"' if external else ""
+    return f'<a class="{cls}" href="{html.escape(href, quote=True)}"{attrs}>{html.escape(text, quote=False)}</a>'
+
+
+def render(text: str, mention_url: str = "/@{name}") -> str:
+    """
+    Comment text -> content_html. Everything is escaped; the only markup
+    produced is <br> for line breaks and links for:
+      - http(s) urls and www. hosts (class "url", external),
+      - video timestamps m:ss / h:mm:ss (class "ts", href "#t=<seconds>",
+        data-seek="<seconds>"),
+      - @mentions (class "mention", href mention_url with {name} filled in).
+    """
+    text = _CONTROL.sub("", (text or "").replace("\r\n", "\n").replace("\r", "\n"))
+    out = []
+    pos = 0
+    for m in _TOKEN.finditer(text):
+        start, end = m.span()
+        if m.group("url") is not None:
+            url = _trim_url(m.group("url"))
+            end = start + len(url)
+            if "." not in url.split("//", 1)[-1]:
+                continue  # "http://" alone, "www." ...
+            out.append(html.escape(text[pos:start], quote=False))
+            href = url if "://" in url else "https://" + url
+            out.append(_link(href, url, "url", external=True))
+        elif m.group("ts") is not None:
+            sec = int(m.group("h") or 0) * 3600 + int(m.group("m")) * 60 + int(m.group("s"))
+            out.append(html.escape(text[pos:start], quote=False))
+            out.append(
+                f'<a class="ts" href="#t={sec}" data-seek="{sec}">{html.escape(m.group("ts"), quote=False)}</a>'
+            )
+        else:
+            name = m.group("name")
+            out.append(html.escape(text[pos:start], quote=False))
+            out.append(_link(mention_url.replace("{name}", quote(name, safe="")), "@" + name, "mention"))
+        pos = end
+    out.append(html.escape(text[pos:], quote=False))
+    return "".join(out).replace("\n", "<br>")
+
+
+class RenderCache:
+    """
+    render() by content hash: identical texts (reposts, spam floods) are
+    rendered once per process. Entries are keyed by the text's sha1, so the
+    cache holds rendered html only, sized by its length.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, mention_url: str = "/@{name}"):
+        self.mention_url = mention_url
+        self._cache = LruCache(max_entries=max_entries, max_bytes=max_bytes)
+
+    def render(self, text: str) -> str:
+        if not text:
+            return ""
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        out = self._cache.get(key)
+        if out is None:
+            out = render(text, self.mention_url)
+            self._cache.put(key, out, len(out))
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        return self._cache.stats()
+
+
+# Process-wide cache for the text stored with comments
+render_cache = RenderCache(render_cfg.cache_entries, render_cfg.cache_bytes, render_cfg.mention_url)
+metrics.collector("render_cache", render_cache.stats)
+
+
+def render_content(content_raw: str) -> tuple[str, int]:
+    """(content_html, render_ver) stored with a comment's text; ("", 0) with rendering off."""
+    if not render_cfg.enabled:
+        return "", 0
+    return render_cache.render(content_raw), RENDERER_VERSION
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple, Type
+
+
+class RetryExhausted(Exception):
+    """
+    A retried operation kept conflicting. reason is "attempts" (ran out of
+    attempts: the key is contended) or "deadline" (the next backoff would
+    outlive the caller's deadline or the retry budget).
+    """
+
+    def __init__(self, reason: str, attempts: int, key: Hashable = None):
+        super().__init__(f"retry exhausted ({reason}) after {attempts} attempts")
+        self.reason = reason
+        self.attempts = attempts
+        self.key = key
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("retry_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(timeout_sec: Optional[float]) -> Iterator[None]:
+    """Retries in this context give up before `timeout_sec` from now (None: no deadline)."""
+    token = _deadline.set(time.monotonic() + max(float(timeout_sec), 0.0) if timeout_sec is not None else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class ContentionCounters:
+    """
+    Conflict counters per key (e.g. video id) for the `max_keys` most recently
+    contended keys, plus totals over all keys.
+    """
+
+    def __init__(self, max_keys: int = 1024):
+        self.max_keys = max(int(max_keys or 0), 1)
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[Hashable, List[float]]" = OrderedDict()  # key -> [conflicts, exhausted, wait_sec]
+        self._totals = [0.0, 0.0, 0.0]
+
+    def add(self, key: Hashable, conflicts: int = 0, exhausted: int = 0, wait_sec: float = 0.0) -> None:
+        with self._lock:
+            c = self._keys.get(key)
+            if c is None:
+                c = self._keys[key] = [0.0, 0.0, 0.0]
+                while len(self._keys) > self.max_keys:
+                    self._keys.popitem(last=False)
+            else:
+                self._keys.move_to_end(key)
+            for i, v in enumerate((conflicts, exhausted, wait_sec)):
+                c[i] += v
+                self._totals[i] += v
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            conflicts, exhausted, wait_sec = self._totals
+            return {
+                "conflicts": conflicts,
+                "exhausted": exhausted,
+                "wait_ms": wait_sec * 1000.0,
+                "keys": float(len(self._keys)),
+            }
+
+    def top(self, n: int = 10) -> List[Tuple[Hashable, Dict[str, float]]]:
+        """The n keys with the most conflicts, most contended first."""
+        with self._lock:
+            items = sorted(self._keys.items(), key=lambda kv: kv[1][0], reverse=True)[:max(int(n), 0)]
+            return [(k, {"conflicts": c[0], "exhausted": c[1], "wait_ms": c[2] * 1000.0}) for k, c in items]
+
+
+class RetryPolicy:
+    """
+    Retry an operation on conflict with capped exponential backoff and full
+    jitter: the n-th retry sleeps uniform(0, min(max_delay, base_delay * 2^n)),
+    so conflicting writers spread out instead of colliding again at once.
+    Gives up after `max_attempts`, or when the next sleep would pass the
+    deadline: the earlier of `budget_sec` from the first attempt and the
+    deadline_scope() of the caller.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 30,
+        base_delay_sec: float = 0.002,
+        max_delay_sec: float = 0.1,
+        budget_sec: float = 0.0,
+        counters: Optional[ContentionCounters] = None,
+    ):
+        self.max_attempts = max(int(max_attempts or 0), 1)
+        self.base_delay_sec = max(float(base_delay_sec or 0.0), 0.0)
+        self.max_delay_sec = max(float(max_delay_sec or 0.0), self.base_delay_sec)
+        self.budget_sec = max(float(budget_sec or 0.0), 0.0)
+        self.counters = counters
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0.0, min(self.max_delay_sec, self.base_delay_sec * (2 ** min(retry, 30))))
+
+    def run(self, op: Callable[[], Any], retry_on: Tuple[Type[BaseException], ...], key: Hashable = None) -> Any:
+        t0 = time.monotonic()
+        deadline = t0 + self.budget_sec if self.budget_sec else None
+        outer = _deadline.get()
+        if outer is not None:
+            deadline = outer if deadline is None else min(deadline, outer)
+
+        conflicts = 0
+        waited = 0.0
+        reason = ""
+        try:
+            for attempt in range(self.max_attempts):
+                try:
+                    return op()
+                except retry_on as e:
+                    last = e
+                conflicts += 1
+                if attempt + 1 >= self.max_attempts:
+                    reason = "attempts"
+                    break
+                d = self.delay(attempt)
+                if deadline is not None and time.monotonic() + d >= deadline:
+                    reason = "deadline"
+                    break
+                time.sleep(d)
+                waited += d
+            raise RetryExhausted(reason, conflicts, key) from last
+        finally:
+            if conflicts and self.counters is not None:
+                self.counters.add(key, conflicts, int(bool(reason)), waited)